@@ -0,0 +1,35 @@
+"""
+Compare reading the chart up to each time step with focus() and with ChartCursor.
+
+    python -m benchmarks.bench_cursor [steps]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.chart import ChartCursor
+from fxtrade.utils import focus
+
+def main(steps=20000):
+    idx = pd.date_range('2022-01-01', periods=steps, freq='1min')
+    df = pd.DataFrame({'close': np.random.default_rng(0).random(len(idx))}, index=idx)
+    ts = idx.to_pydatetime()
+
+    print(f"steps = {steps}")
+
+    t = time.perf_counter()
+    for x in ts:
+        focus(df, x)['close'].iloc[-1]
+    print(f"{'focus':>12} {(time.perf_counter() - t) * 1e3:9.1f} ms")
+
+    t = time.perf_counter()
+    cursor = ChartCursor(df)
+    for x in ts:
+        cursor.advance(x)
+        cursor.column('close')[-1]
+    print(f"{'cursor':>12} {(time.perf_counter() - t) * 1e3:9.1f} ms")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,51 @@
+"""
+Compare construction time and memory of trade.Trade and fixed.FixedTrade.
+
+    python -m benchmarks.bench_fixed [n]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.fixed import FixedTrade
+from fxtrade.stocks import JPY, BTC
+from fxtrade.trade import Trade
+
+def measure(function):
+    begin = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - begin
+
+    # tracemalloc は遅くなるので時間とは別に測る
+    tracemalloc.start()
+    ret = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return ret, elapsed, size
+
+def main(n=10 ** 5):
+    ts = pd.date_range('2022-04-01', periods=n, freq='1min')
+    jpy = np.arange(n) % 10000 + 20000
+    btc = np.full(n, 0.005)
+    ids = [ f'JOR{i:08d}' for i in range(n) ]
+
+    def trades():
+        return [ Trade(x=JPY(int(x)), y=BTC(float(y)), t=t, id=i) for t, x, y, i in zip(ts, jpy, btc, ids) ]
+
+    def fixed_trades():
+        return FixedTrade.from_arrays(ts, 'JPY', jpy, 'BTC', btc, id=ids)
+
+    _, t_trade, m_trade = measure(trades)
+    _, t_fixed, m_fixed = measure(fixed_trades)
+
+    print(f"n = {n}")
+    print(f"{'':>12} {'time [s]':>10} {'bytes/trade':>12}")
+    print(f"{'Trade':>12} {t_trade:10.4f} {m_trade / n:12.1f}")
+    print(f"{'FixedTrade':>12} {t_fixed:10.4f} {m_fixed / n:12.1f}")
+    print(f"{'ratio':>12} {t_trade / t_fixed:10.1f} {m_trade / m_fixed:12.1f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
@@ -0,0 +1,56 @@
+"""
+Compare fxtrade.rolling with the pandas / scipy versions on 10^6 rows.
+
+    python -m benchmarks.bench_rolling [n]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import laplace
+
+from fxtrade.rolling import LogReturns, laplace_mle, rolling_median, rolling_sum, rolling_var
+
+def bench(function, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+def pandas_probability(xs, window):
+    # 以前の analysis.estimate_probability
+    diff = xs.apply(np.log10).diff()
+    dt = pd.Series(diff.index).diff().value_counts().index[0]
+    b = laplace.fit(diff.dropna())[1] / np.sqrt(dt.total_seconds())
+    ys = diff.rolling(window).sum()
+    return laplace.cdf(-np.abs(ys - ys.median()), loc=0, scale=b * np.sqrt((window * dt).total_seconds())) * 2
+
+def main(n=10 ** 6):
+    rng = np.random.default_rng(0)
+    idx = pd.date_range('2022-02-01', periods=n, freq='1min')
+    xs = pd.Series(3.7e6 * np.exp(np.cumsum(rng.laplace(0, 1e-3, n))), index=idx)
+    diff = xs.apply(np.log10).diff()
+    x = diff.to_numpy()
+
+    cases = [
+        ('sum(3)', lambda: diff.rolling(3).sum(), lambda: rolling_sum(x, 3)),
+        ('sum(1000)', lambda: diff.rolling(1000).sum(), lambda: rolling_sum(x, 1000)),
+        ('var(3)', lambda: diff.rolling(3).var(), lambda: rolling_var(x, 3)),
+        ('var(1000)', lambda: diff.rolling(1000).var(), lambda: rolling_var(x, 1000)),
+        ('median(15)', lambda: diff.rolling(15).median(), lambda: rolling_median(x, 15)),
+        ('laplace fit', lambda: laplace.fit(diff.dropna()), lambda: laplace_mle(x)),
+        ('probability(3)', lambda: pandas_probability(xs, 3), lambda: LogReturns(xs).probability(3)),
+    ]
+
+    print(f"n = {n}")
+    print(f"{'':>16} {'pandas':>10} {'numpy':>10} {'speedup':>8}")
+    for name, f_pandas, f_numpy in cases:
+        t_pandas = bench(f_pandas)
+        t_numpy = bench(f_numpy)
+        print(f"{name:>16} {t_pandas:10.4f} {t_numpy:10.4f} {t_pandas / t_numpy:8.1f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
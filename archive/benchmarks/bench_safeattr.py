@@ -0,0 +1,49 @@
+"""
+Compare attribute access of SafeAttrABC with a plain class.
+
+    python -m benchmarks.bench_safeattr [n]
+"""
+import sys
+import timeit
+
+from fxtrade.safeattr import SafeAttrABC, immutable, protected, typed
+
+class Plain:
+    def __init__(self):
+        self.x = 1
+        self._y = 2
+        self.z = 3
+
+    def method(self):
+        return self._y
+
+class Managed(SafeAttrABC):
+    def __init__(self):
+        self.x = immutable(1, int)
+        self.y = protected(2, int)
+        self.z = typed(3, int)
+
+    def method(self):
+        return self._y
+
+def main(n=10 ** 6):
+    plain = Plain()
+    managed = Managed()
+
+    cases = [
+        ('read x', lambda: plain.x, lambda: managed.x),
+        ('read _y', lambda: plain._y, lambda: managed._y),
+        ('call method', lambda: plain.method(), lambda: managed.method()),
+        ('write _y', lambda: setattr(plain, '_y', 2), lambda: setattr(managed, '_y', 2)),
+        ('write z', lambda: setattr(plain, 'z', 3), lambda: setattr(managed, 'z', 3)),
+    ]
+
+    print(f"n = {n}")
+    print(f"{'':>12} {'plain [ns]':>11} {'safeattr [ns]':>14}")
+    for name, f_plain, f_managed in cases:
+        t_plain = min(timeit.repeat(f_plain, number=n, repeat=3)) / n * 1e9
+        t_managed = min(timeit.repeat(f_managed, number=n, repeat=3)) / n * 1e9
+        print(f"{name:>12} {t_plain:11.1f} {t_managed:14.1f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
@@ -0,0 +1,37 @@
+"""
+Compare splitting a frame into the saved sections with focus() per section
+and with split_sections() on the sorted index.
+
+    python -m benchmarks.bench_save [days]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.timeseries import day_sections, section_bounds, split_sections
+from fxtrade.utils import focus
+
+def split_focus(df):
+    return [ focus(df, (b, e), include_end=False) for b, e in day_sections(df.index[0], df.index[-1]) ]
+
+def split_slices(df):
+    values = df.index.values
+    begins, ends = section_bounds(day_sections, df.index[0], df.index[-1])
+    los, his = split_sections(values, begins, ends)
+    return [ df.iloc[lo:hi] for lo, hi in zip(los, his) ]
+
+def main(days=90):
+    idx = pd.date_range('2022-01-01', periods=days * 24 * 60, freq='1min')
+    df = pd.DataFrame({'close': np.random.default_rng(0).random(len(idx))}, index=idx)
+
+    print(f"days = {days}, rows = {len(df)}")
+    for name, f in [('focus', split_focus), ('searchsorted', split_slices)]:
+        t = time.perf_counter()
+        parts = f(df)
+        t = time.perf_counter() - t
+        print(f"{name:>12} {t * 1e3:9.1f} ms  ({len(parts)} sections)")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 90)
@@ -1,40 +1,77 @@
 import math
+import os
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from fractions import Fraction
 
 from ..fx import FX
-from ..analysis import analyze, estimate_probability, emaverage, infinite_trade_result, sell_buy_timing_ratio, switch_count
+from ..analysis import analyze, emaverage, emaverages, infinite_trade_result, sell_buy_timing_ratio, switch_count, \
+    timing_metrics
+from ..rolling import LogReturns, rolling_sum
 from ..stock import Rate
+from ..stream import Pipeline, Apply, Diff, EMA, LaplaceProbability, LastTrue, Log10, RollingSum
 from ..trade import Trade
 
-def calc_zpc(xs, dt, alphas=None):
+# 一度に計算する (行数 x alpha の数) の上限
+SWEEP_CHUNK_ELEMENTS = 1 << 22
+
+def _zpc_chunk(xs, x, dt, alphas):
+    """
+    Return z, p and c for each alpha, evaluating the sell/buy masks only once.
+    """
+    gmeans = emaverages(xs, alphas, dt).to_numpy()
+    xs = x[:, None]
+
+    metrics = timing_metrics(x, x, xs > gmeans, xs < gmeans)
+    zs, ps, cs = metrics.profit, metrics.timing_ratio, metrics.switch_count
+
+    return zs, ps, cs
+
+def calc_zpc(xs, dt, alphas=None, n_jobs=1):
+    """
+    Sweep alphas and return z (infinite_trade_result), p (sell_buy_timing_ratio)
+    and c (switch_count) of xs against its EMA for each alpha.
+    The alphas are evaluated in chunks as 2-D arrays, in parallel threads if n_jobs > 1
+    (n_jobs=-1 uses all cores).
+    """
     if alphas is None:
         alphas = np.linspace(0.1, 1, 91)
-    zs = []
-    ps = []
-    cs = []
-    for a in alphas:
-        gmeans = emaverage(xs, alpha=a, dt=dt)
-
-        zs.append(infinite_trade_result(xs, gmeans))
-        ps.append(sell_buy_timing_ratio(xs, gmeans))
-        cs.append(switch_count(xs, gmeans))
-
-    zs = np.array(zs)
-    ps = np.array(ps)
-    cs = np.array(cs)
+    alphas = np.asarray(list(alphas), dtype=float)
+
+    xs = xs.dropna()
+    x = xs.to_numpy(dtype=float)
+
+    size = max(1, SWEEP_CHUNK_ELEMENTS // max(len(x), 1))
+    chunks = [ alphas[i:i+size] for i in range(0, len(alphas), size) ]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if (n_jobs is None) or (n_jobs <= 1) or (len(chunks) == 1 and n_jobs <= 1):
+        results = [ _zpc_chunk(xs, x, dt, chunk) for chunk in chunks ]
+    else:
+        # 大きな配列の演算は GIL を解放するのでスレッドで十分速くなる
+        if len(chunks) < n_jobs:
+            size = max(1, -(-len(alphas) // n_jobs))
+            chunks = [ alphas[i:i+size] for i in range(0, len(alphas), size) ]
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(lambda chunk: _zpc_chunk(xs, x, dt, chunk), chunks))
+
+    zs = np.concatenate([ r[0] for r in results ])
+    ps = np.concatenate([ r[1] for r in results ])
+    cs = np.concatenate([ r[2] for r in results ])
     
     zpc = pd.DataFrame([alphas, zs, ps, cs, zs * ps, zs * ps / cs]).T
     zpc.columns = ['alpha', 'z', 'p', 'c', 'zp', 'zp/c']
     
     return zpc
 
-def calc_best_alpha(xs, dt, alphas=None):
-    zpc = calc_zpc(xs, dt, alphas=None)
+def calc_best_alpha(xs, dt, alphas=None, n_jobs=1):
+    zpc = calc_zpc(xs, dt, alphas=alphas, n_jobs=n_jobs)
     zpc_sorted = zpc[(zpc['p'] > 0.9) & (zpc['p'] < 1.4)].sort_values('zp', ascending=False)
 
     return zpc_sorted.iloc[0]
@@ -51,13 +88,18 @@ class Tenet:
         self.gmeans = None
         self.rise = None
         self.fall = None
+
+        # __call__ で使う逐次計算の状態
+        self.pipeline = None
         
     def analyze(self, fx: FX, t=None):
-        df = analyze(fx.chart[self.crange_interval]['low'])
+        low = LogReturns(fx.chart[self.crange_interval]['low'])
+        df = low.frame()
         df_high = analyze(fx.chart[self.crange_interval]['high'])
         
-        dif = df['diff'].rolling(self.window).sum()
-        prob = estimate_probability(df['diff'], self.window)
+        # 対数と差分は frame と共有する
+        dif = pd.Series(rolling_sum(low.diff, self.window), index=df.index)
+        prob = pd.Series(low.probability(self.window), index=df.index)
         
         rise = prob[(dif > 0) & (prob < 0.4)]
         fall = prob[(dif < 0) & (prob < 0.2)]
@@ -81,6 +123,63 @@ class Tenet:
         
         return df
     
+    def make_pipeline(self, low: pd.Series) -> Pipeline:
+        """
+        Return the incremental version of analyze warmed up with low,
+        so that only new bars need to be fed afterwards.
+        """
+        diff = low.apply(np.log10).diff()
+
+        pipeline = Pipeline([
+            ('log', Log10(), 'x'),
+            ('diff', Diff(), 'log'),
+            ('dif', RollingSum(self.window), 'diff'),
+            ('prob', LaplaceProbability.fit(diff, self.window), 'dif'),
+            ('gmeans', EMA(self.alpha, self.dt), 'log'),
+            ('gdiff', Diff(), 'gmeans'),
+            ('trend', EMA(self.alpha, self.dt), 'gdiff'),
+            ('is_rise', Apply(lambda d, p: (d > 0) and (p < 0.4)), ('dif', 'prob')),
+            ('is_fall', Apply(lambda d, p: (d < 0) and (p < 0.2)), ('dif', 'prob')),
+            ('rise', LastTrue(), 'is_rise'),
+            ('fall', LastTrue(), 'is_fall'),
+            ('is_up', Apply(lambda x: np.nan if np.isnan(x) else float(x > 0)), 'trend'),
+            ('turn', Diff(), 'is_up'),
+            ('uptrend', LastTrue(lambda x: x > 0), 'turn'),
+            ('downtrend', LastTrue(lambda x: x < 0), 'turn'),
+        ])
+        pipeline.run(low)
+
+        return pipeline
+
+    def update(self, fx: FX, t=None) -> Pipeline:
+        """
+        Feed the bars newer than the last one into the pipeline.
+        The pipeline is warmed up with the whole history at the first call.
+        """
+        low = fx.chart[self.crange_interval]['low']
+        if self.pipeline is None:
+            self.pipeline = self.make_pipeline(low)
+        else:
+            self.pipeline.run(low)
+        return self.pipeline
+
+    def latest(self) -> dict:
+        """
+        State of the last bar in the pipeline: the time of the bar (now), the last times of
+        rise, fall, uptrend and downtrend (None if never), gmeans and log of low.
+        Same as the last values of analyze.
+        """
+        pipeline = self.pipeline
+        return {
+            'now': pipeline.last,
+            'rise': pipeline['rise'].value,
+            'fall': pipeline['fall'].value,
+            'uptrend': pipeline['uptrend'].value,
+            'downtrend': pipeline['downtrend'].value,
+            'gmeans': pipeline['gmeans'].value,
+            'log': pipeline['log'].value,
+        }
+
     def decide_to_buy(self, fx):
         last_trade = fx.get_last_trade()
         
@@ -98,22 +197,31 @@ class Tenet:
         return fx.get_max_salable()
         
     def __call__(self, fx: FX, t=None):
-        self.analyze(fx, t)
+        # 履歴全体を解析し直さずに新しい足だけを流し込む
+        self.update(fx, t)
+        state = self.latest()
+
+        # 一度も起きていないものは最も古い時刻として扱う
+        never = pd.Timestamp.min
+        rise = state['rise'] if state['rise'] is not None else never
+        fall = state['fall'] if state['fall'] is not None else never
+        uptrend = state['uptrend'] if state['uptrend'] is not None else never
+        downtrend = state['downtrend'] if state['downtrend'] is not None else never
         
-        now = self.df_low.index[-1]
+        now = state['now']
         print('now:', now)
         
-        is_rising = self.rise.index[-1] == now
-        is_falling = self.fall.index[-1] == now
+        is_rising = rise == now
+        is_falling = fall == now
         
-        is_after_falling = self.fall.index[-1] > self.rise.index[-1]
-        is_after_rising = self.rise.index[-1] > self.fall.index[-1]
+        is_after_falling = fall > rise
+        is_after_rising = rise > fall
         
-        is_uptrend = self.uptrend.index[-1] > self.downtrend.index[-1]
-        is_downtrend = self.uptrend.index[-1] < self.downtrend.index[-1]
+        is_uptrend = uptrend > downtrend
+        is_downtrend = uptrend < downtrend
         
-        is_over_gmeans = self.gmeans.iloc[-1] < self.df_low['log'].iloc[-1]
-        is_under_gmeans = self.gmeans.iloc[-1] > self.df_low['log'].iloc[-1]
+        is_over_gmeans = state['gmeans'] < state['log']
+        is_under_gmeans = state['gmeans'] > state['log']
         
         ### 買い時
         # アップトレンドかつ平均より下かつ暴落ではない
@@ -7,19 +7,18 @@ import warnings
 
 import plotly.graph_objects as go
 from matplotlib import pyplot as plt
+from scipy.signal import lfilter
 from scipy.stats import laplace
 
-from typing import Callable, Optional, Tuple, Iterable
+from typing import Callable, List, NamedTuple, Optional, Tuple, Iterable, Union
+
+from .rolling import LogReturns, index_step, laplace_mle, laplace_probability, rolling_sum
 
 def delta(ts: Iterable) -> pd.Timedelta:
     """
     Given an equally spaced time index, return the interval.
     """
-    dts = pd.Series(ts).diff().value_counts()
-    if len(dts) != 1:
-        raise ValueError("all timedelta must be the same")
-    
-    return dts.index[0]
+    return index_step(ts)
 
 # def log10(df: pd.DataFrame, copy=True) -> pd.DataFrame:
 #     """Return a dataframe which is applied numpy.log10 on columns ['open', 'close', 'high', 'low', 'volume'].
@@ -37,6 +36,118 @@ def delta(ts: Iterable) -> pd.Timedelta:
 #     """
 #     return xs.diff().dropna()
 
+# exp(EMA_BLOCK_LOG) が double で安全に扱える範囲に収まるようにブロックを区切る
+EMA_BLOCK_LOG = 300.0
+
+def _ema_loop(x: np.ndarray, t: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Reference implementation of the time-decayed EMA (used when alpha <= 0).
+    """
+    ema = np.empty(len(x))
+    molecule = 0.0
+    denominator = 0.0
+    for i in range(len(x)):
+        beta = alpha ** t[i] if i > 0 else 0.0
+        molecule = molecule * beta + x[i]
+        denominator = denominator * beta + 1
+        ema[i] = molecule / denominator
+    return ema
+
+# 等間隔の区間の平均長がこれ以上なら線形フィルタを使う
+EMA_LFILTER_RUN = 256
+
+def _ema_lfilter(x: np.ndarray, t: np.ndarray, alphas: np.ndarray, bounds: List[int]) -> np.ndarray:
+    """
+    Time-decayed EMA by a first order IIR filter on each equally spaced run.
+    bounds are the starts of the runs; t is constant inside a run except for its first element.
+    """
+    n = len(x)
+    ret = np.empty((n, len(alphas)))
+    xs = np.stack([x, np.ones(n)], axis=1)
+
+    for j, alpha in enumerate(alphas):
+        state = np.zeros(2)
+        for begin, end in zip(bounds, bounds[1:]):
+            beta = alpha ** t[begin + 1] if end - begin > 1 else 0.0
+            # 区間の先頭は直前の区間からの減衰を初期値に入れる
+            zi = (state * alpha ** t[begin])[None, :]
+            y, _ = lfilter([1.0], [1.0, -beta], xs[begin:end], axis=0, zi=zi)
+            ret[begin:end, j] = y[:, 0] / y[:, 1]
+            state = y[-1]
+
+    return ret
+
+def _ema_kernel(x: np.ndarray, t: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    Return the time-decayed EMA of x for each alpha as an array of shape (len(x), len(alphas)).
+
+    The recurrence m[i] = m[i-1] * alpha ** t[i] + x[i] is solved in closed form
+    by cumulative sums of x[j] / P[j], where P is the cumulative decay.
+    The data is split into blocks so that P within a block stays in exp(+-EMA_BLOCK_LOG),
+    and the state is carried between blocks.
+    """
+    n, k = len(x), len(alphas)
+    ret = np.empty((n, k))
+    if n == 0:
+        return ret
+
+    positive = alphas > 0
+    for j in np.flatnonzero(~positive):
+        ret[:, j] = _ema_loop(x, t, alphas[j])
+    if not positive.any():
+        return ret
+
+    t = t.copy()
+    t[0] = 0.0
+
+    # 等間隔の区間がまとまっていれば線形フィルタで一気に計算する
+    irregular = np.flatnonzero(t[1:] != np.median(t[1:])) + 1 if n > 1 else np.array([], dtype=int)
+    if len(irregular) <= n // EMA_LFILTER_RUN:
+        ret[:, positive] = _ema_lfilter(x, t, alphas[positive], [0] + list(irregular) + [n])
+        return ret
+
+    log_alphas = np.log(alphas[positive])
+    scale = np.abs(log_alphas).max()
+
+    ct = np.cumsum(t)
+
+    # 全ての alpha で共通のブロック境界
+    if scale == 0:
+        bounds = [0, n]
+    else:
+        block = np.floor(ct * scale / EMA_BLOCK_LOG)
+        bounds = [0] + list(np.flatnonzero(np.diff(block)) + 1) + [n]
+
+    molecule = np.zeros(len(log_alphas))
+    denominator = np.zeros(len(log_alphas))
+    out = np.empty((n, len(log_alphas)))
+    for begin, end in zip(bounds, bounds[1:]):
+        # ブロックに入る直前の減衰を状態に掛けておく
+        beta = np.exp(t[begin] * log_alphas)
+        molecule *= beta
+        denominator *= beta
+
+        decay = np.exp(np.outer(ct[begin:end] - ct[begin], log_alphas))
+        inv = 1 / decay
+
+        m = decay * (molecule + np.cumsum(x[begin:end, None] * inv, axis=0))
+        d = decay * (denominator + np.cumsum(inv, axis=0))
+
+        out[begin:end] = m / d
+        molecule, denominator = m[-1], d[-1]
+
+    ret[:, positive] = out
+    return ret
+
+def _ema_inputs(xs: pd.Series, dt: pd.Timedelta) -> Tuple[pd.Series, np.ndarray]:
+    xs = xs.dropna()
+    ns = xs.index.values.astype('datetime64[ns]').view('int64')
+    t = np.empty(len(xs))
+    if len(xs) > 0:
+        t[0] = 0.0
+        t[1:] = np.diff(ns) / (dt.total_seconds() * 1e9)
+    return xs, t
+
 def emaverage(xs: pd.Series, alpha: float, dt: pd.Timedelta) -> pd.Series:
     """
     Return exponential moving average of xs.
@@ -50,30 +161,36 @@ def emaverage(xs: pd.Series, alpha: float, dt: pd.Timedelta) -> pd.Series:
     dt : pandas.Timedelta
         Unit time. Weights decrease exponentially at a rate of alpha per unit time.
     """
-    xs = xs.dropna()
+    xs, t = _ema_inputs(xs, dt)
     if len(xs) == 0:
         return xs
-    
-    ts = pd.Series(xs.index, index=xs.index).diff().apply(lambda x: x.total_seconds())
-    ts /= dt.total_seconds()
 
-    Xt = pd.DataFrame([xs, ts]).T.reset_index(drop=True)
-    
-    molecule = Xt.iloc[0, 0]
-    denominator = 1.0
-    
-    ema = np.empty(len(xs))
-    ema[0] = molecule
-    
-    for i, x, t in Xt.iloc[1:].itertuples():
-        beta = alpha ** t
-        molecule = molecule * beta + x
-        denominator = denominator * beta + 1
-        
-        ema[i] = molecule / denominator
+    x = xs.to_numpy(dtype=float)
+    ema = _ema_kernel(x, t, np.array([alpha], dtype=float))[:, 0]
     
     return pd.Series(ema, index=xs.index)
 
+def emaverages(xs: pd.Series, alphas: Iterable[float], dt: pd.Timedelta) -> pd.DataFrame:
+    """
+    Return exponential moving averages of xs for many alphas at once.
+    Each column is the same as emaverage(xs, alpha, dt).
+
+    Parameters
+    ----------
+    xs : pandas.Series
+        Contains data which should be calculated EMA. Its index must be type of pandas.DatetimeIndex.
+    alphas : Iterable[float]
+        The degrees of weighting decrease.
+    dt : pandas.Timedelta
+        Unit time. Weights decrease exponentially at a rate of alpha per unit time.
+    """
+    alphas = np.asarray(list(alphas), dtype=float)
+    xs, t = _ema_inputs(xs, dt)
+
+    ema = _ema_kernel(xs.to_numpy(dtype=float), t, alphas)
+
+    return pd.DataFrame(ema, index=xs.index, columns=pd.Index(alphas, name='alpha'))
+
 # def emvariances(xs: pd.Series, alpha: float, dt: pd.Timedelta):
 #     """
 #     Return exponential moving average of (xs - ema) ** 2.
@@ -141,6 +258,117 @@ def emaverage(xs: pd.Series, alpha: float, dt: pd.Timedelta) -> pd.Series:
 
 #     return fall
 
+class SignalMetrics(NamedTuple):
+    """
+    Metrics of sell/buy timings. Each field is a scalar for 1-D inputs,
+    or an array with one value per column for 2-D inputs.
+    """
+    profit: Union[float, np.ndarray]
+    timing_ratio: Union[float, np.ndarray]
+    switch_count: Union[int, np.ndarray]
+    switch_ratio: Union[float, np.ndarray]
+    overlap: Union[int, np.ndarray]
+
+def _masked_sum(x: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    if (x.ndim == 1) and (mask.ndim == 2):
+        # 同じ価格を全ての列で使うなら行列積で一度に足す
+        return np.nan_to_num(x) @ mask
+    return np.where(mask, x, 0.0).sum(axis=0)
+
+def _switch_count(sell: np.ndarray, buy: np.ndarray) -> np.ndarray:
+    """
+    Count sign changes of the timings (buy: 1, sell: -1, sell first) ignoring the rows of neither.
+    sell and buy are 2-D boolean arrays.
+    """
+    timings = buy.view(np.int8).copy()
+    timings[sell] = -1
+
+    n = len(timings)
+    zero_rows = np.flatnonzero((timings == 0).any(axis=1))
+    if len(zero_rows) <= n // 16:
+        # 0 になるのは先頭など僅かな行だけなので行ごとに直前の値で埋める
+        for i in zero_rows[zero_rows > 0]:
+            timings[i] = np.where(timings[i] == 0, timings[i - 1], timings[i])
+    else:
+        pos = np.where(timings != 0, np.arange(n)[:, None], 0)
+        pos = np.maximum.accumulate(pos, axis=0)
+        timings = np.take_along_axis(timings, pos, axis=0)
+
+    return ((timings[1:] != timings[:-1]) & (timings[:-1] != 0)).sum(axis=0)
+
+def timing_metrics(low, high, time_to_sell, time_to_buy) -> SignalMetrics:
+    """
+    signal_metrics with the sell/buy timings already computed.
+    time_to_sell and time_to_buy are boolean arrays of shape (n, ) or (n, k),
+    low and high are of shape (n, ) or the same as the timings.
+    """
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    sell = np.asarray(time_to_sell, dtype=bool)
+    buy = np.asarray(time_to_buy, dtype=bool)
+
+    is_1d = (sell.ndim == 1) and (buy.ndim == 1)
+    sell, buy = np.broadcast_arrays(sell.reshape(len(sell), -1), buy.reshape(len(buy), -1))
+    sell, buy = np.ascontiguousarray(sell), np.ascontiguousarray(buy)
+
+    profit = _masked_sum(low, sell) - _masked_sum(high, buy)
+
+    n_sell = sell.sum(axis=0)
+    n_buy = buy.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        timing_ratio = np.where(n_buy == 0, np.nan, n_sell / n_buy)
+
+    count = _switch_count(sell, buy)
+    ratio = count / (len(sell) - 1) if len(sell) > 1 else np.full(count.shape, np.nan)
+
+    overlap = (sell & buy).sum(axis=0)
+
+    if is_1d:
+        return SignalMetrics(float(profit[0]), float(timing_ratio[0]), int(count[0]), float(ratio[0]), int(overlap[0]))
+    return SignalMetrics(profit, timing_ratio, count, ratio, overlap)
+
+def signal_metrics(
+        low,
+        low_base,
+        high=None,
+        high_base=None,
+        f_time_to_sell: Optional[Callable]=None,
+        f_time_to_buy: Optional[Callable]=None
+    ) -> SignalMetrics:
+    """
+    Return infinite_trade_result (profit), sell_buy_timing_ratio (timing_ratio),
+    switch_count, switch_ratio and the number of rows which are both sell and buy timings (overlap)
+    at once with boolean array operations.
+
+    The inputs may be pandas.Series or numpy arrays of shape (n, ). The bases may also be 2-D arrays
+    (or DataFrame) of shape (n, k) to evaluate k strategies at once, e.g. EMAs with different alphas.
+    f_time_to_sell and f_time_to_buy are the same as infinite_trade_result.
+    """
+    high = high if high is not None else low
+    high_base = high_base if high_base is not None else low_base
+
+    if f_time_to_sell is not None:
+        time_to_sell = np.asarray(f_time_to_sell(low, low_base))
+    else:
+        time_to_sell = _column(low, low_base) > np.asarray(low_base, dtype=float)
+
+    if f_time_to_buy is not None:
+        time_to_buy = np.asarray(f_time_to_buy(high, high_base))
+    else:
+        time_to_buy = _column(high, high_base) < np.asarray(high_base, dtype=float)
+
+    return timing_metrics(low, high, time_to_sell, time_to_buy)
+
+def _column(x, base) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    if (x.ndim == 1) and (np.ndim(base) == 2):
+        return x[:, None]
+    return x
+
+def _warn_overlap(metrics: SignalMetrics):
+    if np.any(metrics.overlap != 0):
+        warnings.warn(UserWarning(f"duplication detected on sell timings and buy timings"))
+
 def infinite_trade_result(
         low: pd.Series,
         low_base: pd.Series,
@@ -171,28 +399,11 @@ def infinite_trade_result(
         Be called as f_time_to_buy(high, high_base) and returns when you should buy.
     """
 
-    high = high if high is not None else low
-    high_base = high_base if high_base is not None else low_base
-    
-    # default: low price is bigger than expected
-    f_time_to_sell = f_time_to_sell if f_time_to_sell is not None else (lambda low, low_base: low > low_base)
-    # default: high price is smaller than expected
-    f_time_to_buy = f_time_to_buy if f_time_to_buy is not None else (lambda high, high_base: high < high_base)
-
-    time_to_sell = f_time_to_sell(low, low_base)
-    time_to_buy = f_time_to_buy(high, high_base)
+    metrics = signal_metrics(low, low_base, high, high_base, f_time_to_sell, f_time_to_buy)
+    _warn_overlap(metrics)
 
-    duplication = set(low[time_to_sell].index) & set(high[time_to_buy].index)
-    if len(duplication) != 0:
-        warnings.warn(UserWarning(f"duplication detected on sell timings and buy timings"))
-
-    # you sell a fixed amount when you should sell.
-    sell = low[time_to_sell].sum()
-    
-    # you buy a fixed amount when you should buy.
-    buy = high[time_to_buy].sum()
-    
-    return sell - buy
+    # you sell a fixed amount when you should sell and buy a fixed amount when you should buy.
+    return metrics.profit
 
 def sell_buy_timing_ratio(
         low: pd.Series,
@@ -224,26 +435,10 @@ def sell_buy_timing_ratio(
     f_time_to_buy : Optional[Callable[[pd.Series, pd.Series], pd.Series]], default (lambda high, high_base: high < high_base)
         Be called as f_time_to_buy(high, high_base) and returns when you should buy.
     """
-    high = high if high is not None else low
-    high_base = high_base if high_base is not None else low_base
-    
-    # default: low price is bigger than expected
-    f_time_to_sell = f_time_to_sell if f_time_to_sell is not None else (lambda low, low_base: low > low_base)
-    # default: high price is smaller than expected
-    f_time_to_buy = f_time_to_buy if f_time_to_buy is not None else (lambda high, high_base: high < high_base)
-
-    time_to_sell = f_time_to_sell(low, low_base)
-    time_to_buy = f_time_to_buy(high, high_base)
+    metrics = signal_metrics(low, low_base, high, high_base, f_time_to_sell, f_time_to_buy)
+    _warn_overlap(metrics)
 
-    duplication = set(low[time_to_sell].index) & set(high[time_to_buy].index)
-    if len(duplication) != 0:
-        warnings.warn(UserWarning(f"duplication detected on sell timings and buy timings"))
-    
-    sell_timing_count = time_to_sell.sum()
-    buy_timing_count = time_to_buy.sum()
-    if buy_timing_count == 0:
-        return np.nan
-    return sell_timing_count / buy_timing_count
+    return metrics.timing_ratio
 
 def switch_count(
         low: pd.Series,
@@ -272,31 +467,11 @@ def switch_count(
     f_time_to_buy : Optional[Callable[[pd.Series, pd.Series], pd.Series]], default (lambda high, high_base: high < high_base)
         Be called as f_time_to_buy(high, high_base) and returns when you should buy.
     """
-    high = high if high is not None else low
-    high_base = high_base if high_base is not None else low_base
-    
-    # default: low price is bigger than expected
-    f_time_to_sell = f_time_to_sell if f_time_to_sell is not None else (lambda low, low_base: low > low_base)
-    # default: high price is smaller than expected
-    f_time_to_buy = f_time_to_buy if f_time_to_buy is not None else (lambda high, high_base: high < high_base)
+    metrics = signal_metrics(low, low_base, high, high_base, f_time_to_sell, f_time_to_buy)
+    _warn_overlap(metrics)
 
-    time_to_sell = f_time_to_sell(low, low_base)
-    time_to_buy = f_time_to_buy(high, high_base)
-    
-    duplication = set(low[time_to_sell].index) & set(high[time_to_buy].index)
-    if len(duplication) != 0:
-        warnings.warn(UserWarning(f"duplication detected on sell timings and buy timings"))
-    
-    timings = pd.Series(np.zeros(len(low)), index=low.index, dtype=int)
-    
     # sell timing may be a priority because you lose a lot of money if you miss the crash of the price
-    timings[time_to_buy] = 1
-    timings[time_to_sell] = -1
-    timings = timings[timings != 0]
-    
-    count = np.sum(np.diff(timings > 0))
-    
-    return count
+    return metrics.switch_count
 
 def switch_ratio(
         low: pd.Series,
@@ -326,10 +501,10 @@ def switch_ratio(
     f_time_to_buy : Optional[Callable[[pd.Series, pd.Series], pd.Series]], default (lambda high, high_base: high < high_base)
         Be called as f_time_to_buy(high, high_base) and returns when you should buy.
     """
-    N = len(low) - 1
-    if N <= 0:
-        return np.nan
-    return switch_count(low, low_base, high, high_base, f_time_to_sell, f_time_to_buy) / N
+    metrics = signal_metrics(low, low_base, high, high_base, f_time_to_sell, f_time_to_buy)
+    _warn_overlap(metrics)
+
+    return metrics.switch_ratio
 
 def estimate_laplace_param(xs: pd.Series) -> Tuple[float, float]:
     """
@@ -343,10 +518,7 @@ def estimate_laplace_param(xs: pd.Series) -> Tuple[float, float]:
     xs : pandas.Series
         Contains any real-valued data considered to follow the Laplace distribution.
     """
-    loc = xs.median()    
-    scale = np.abs(xs - loc).mean()
-    
-    return loc, scale
+    return laplace_mle(xs)
 
 def estimate_brown_param(xs: pd.Series) -> float:
     """
@@ -401,15 +573,17 @@ def estimate_probability(
     scale : float, optional
         Scale parameter of Laplace distribution.
     """
-    dt = window * delta(xs.index)
-    b = estimate_brown_param(xs)
-    
-    ys = xs.rolling(window).sum()
+    x = xs.to_numpy(dtype=float)
+    ys = rolling_sum(x, window)
     
-    loc = loc if loc is not None else ys.median()
-    scale = scale if scale is not None else calc_brown_param(b, dt)
+    loc = loc if loc is not None else np.nanmedian(ys)
+    if scale is None:
+        # delta は一度だけ計算する
+        step = delta(xs.index)
+        b = laplace_mle(x)[1] / np.sqrt(step.total_seconds())
+        scale = calc_brown_param(b, window * step)
     
-    ps = laplace.cdf(-np.abs(ys-loc), loc=0, scale=scale) * 2
+    ps = laplace_probability(ys, loc, scale)
     
     return pd.Series(ps, index=xs.index)
 
@@ -424,16 +598,7 @@ def analyze(xs: pd.Series) -> pd.DataFrame:
     xs : pandas.Series
         Contains historical price of the stock.
     """
-    df = pd.DataFrame(index=xs.index)
-    df['dt'] = df.index - df.index[0]
-    
-    df[xs.name] = xs
-    
-    df['log'] = xs.apply(np.log10)
-    df['diff'] = df['log'].diff()
-    df['prob'] = estimate_probability(df['diff'])
-    
-    return df
+    return LogReturns(xs).frame()
 
 # def plot_laplace(xs: pd.Series):
 #     """
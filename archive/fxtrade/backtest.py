@@ -0,0 +1,228 @@
+"""
+Vectorized backtesting.
+
+A strategy emits a signal array over the whole history at once, and the
+positions, cash, fees and equity are simulated in one pass over preallocated arrays.
+"""
+import numpy as np
+import pandas as pd
+
+from io import StringIO
+from typing import Optional, Union
+
+MODES = ('fraction', 'units')
+
+RESULT_COLUMNS = ['price', 'target', 'units', 'cash', 'fee', 'equity']
+
+METRIC_COLUMNS = ['total_return', 'cagr', 'volatility', 'sharpe', 'max_drawdown',
+                  'n_trades', 'fees', 'exposure', 'final_equity']
+
+def signals_to_target(signal: Union[pd.Series, np.ndarray], initial: float=0.0) -> np.ndarray:
+    """
+    Convert buy/sell events (1: buy, -1: sell, 0 or NaN: hold) into the target position
+    (1 after buying until selling, 0 otherwise).
+    """
+    signal = np.asarray(signal, dtype=float)
+
+    target = np.where(signal > 0, 1.0, np.where(signal < 0, 0.0, np.nan))
+    target = pd.Series(target).ffill().fillna(initial).to_numpy()
+
+    return target
+
+def _shift(xs: np.ndarray, lag: int, fill: float) -> np.ndarray:
+    if lag == 0:
+        return xs
+    ret = np.empty_like(xs)
+    ret[:lag] = fill
+    ret[lag:] = xs[:-lag]
+    return ret
+
+def _simulate_units(price, target, capital, commission):
+    """
+    target is the number of units to hold. Fully vectorized.
+    """
+    units = target
+    trade = np.diff(units, prepend=0.0)
+    fee = np.abs(trade) * price * commission
+    cash = capital - np.cumsum(trade * price + fee)
+    return units, cash, fee
+
+def _simulate_fraction(price, target, capital, commission):
+    """
+    target is the fraction of equity to hold. The equity depends on the path,
+    so it loops over the bars where the target changes only.
+    """
+    n = len(price)
+    changes = np.flatnonzero(np.diff(target, prepend=0.0) != 0)
+
+    units_at = np.empty(len(changes))
+    cash_at = np.empty(len(changes))
+    fee = np.zeros(n)
+
+    units, cash = 0.0, capital
+    for k, i in enumerate(changes):
+        p = price[i]
+        f = target[i]
+        equity = cash + units * p
+        value = units * p
+
+        # 手数料を払った後の評価額に対して目標の比率になるように売買する
+        new_value = f * (equity + commission * value) / (1 + f * commission)
+        if new_value < value:
+            new_value = f * (equity - commission * value) / (1 - f * commission)
+        new_units = max(new_value, 0.0) / p
+
+        fee[i] = abs(new_units - units) * p * commission
+        cash -= (new_units - units) * p + fee[i]
+        units = new_units
+        units_at[k], cash_at[k] = units, cash
+
+    # 変化点の間は保有量と現金が一定
+    units_arr = np.zeros(n)
+    cash_arr = np.full(n, float(capital))
+    if len(changes) > 0:
+        segment = np.searchsorted(changes, np.arange(n), side='right') - 1
+        after = segment >= 0
+        units_arr[after] = units_at[segment[after]]
+        cash_arr[after] = cash_at[segment[after]]
+
+    return units_arr, cash_arr, fee
+
+def _periods_per_year(index) -> Optional[float]:
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return None
+    step = np.median(np.diff(index.values).astype('timedelta64[ns]').astype(float))
+    if step <= 0:
+        return None
+    return pd.Timedelta(days=365).value / step
+
+def calc_metrics(df: pd.DataFrame, capital: float) -> pd.Series:
+    """
+    Return standard metrics of the equity curve.
+    """
+    equity = df['equity'].to_numpy()
+    returns = np.diff(equity, prepend=capital) / np.r_[capital, equity[:-1]]
+
+    periods = _periods_per_year(df.index)
+
+    total_return = equity[-1] / capital - 1 if len(equity) > 0 else 0.0
+    volatility = returns.std(ddof=1) if len(returns) > 1 else np.nan
+    mean = returns.mean() if len(returns) > 0 else np.nan
+
+    if periods is not None:
+        years = (df.index[-1] - df.index[0]) / pd.Timedelta(days=365)
+        with np.errstate(over='ignore'):
+            # 短い期間で大きく増えると年率換算は inf になる
+            cagr = (equity[-1] / capital) ** (1 / years) - 1 if years > 0 and equity[-1] > 0 else np.nan
+        annual_volatility = volatility * np.sqrt(periods)
+        sharpe = mean / volatility * np.sqrt(periods) if volatility > 0 else np.nan
+    else:
+        cagr, annual_volatility, sharpe = np.nan, np.nan, np.nan
+
+    peak = np.maximum.accumulate(np.r_[capital, equity])[1:]
+    drawdown = equity / peak - 1
+
+    units = df['units'].to_numpy()
+    trades = np.diff(units, prepend=0.0) != 0
+
+    return pd.Series({
+        'total_return': total_return,
+        'cagr': cagr,
+        'volatility': annual_volatility,
+        'sharpe': sharpe,
+        'max_drawdown': drawdown.min() if len(drawdown) > 0 else 0.0,
+        'n_trades': int(trades.sum()),
+        'fees': df['fee'].sum(),
+        'exposure': float((units != 0).mean()) if len(units) > 0 else 0.0,
+        'final_equity': equity[-1] if len(equity) > 0 else capital,
+    })
+
+class BacktestResult:
+    def __init__(self, df: pd.DataFrame, metrics: pd.Series):
+        self._df = df
+        self._metrics = metrics
+
+    def __repr__(self):
+        return self.dumps()
+
+    def dump(self, f, indent=4):
+        tab = " " * indent
+        f.write("BacktestResult(\n")
+        for key, value in self._metrics.items():
+            f.write(f"{tab}{key}={value},\n")
+        f.write(")")
+
+    def dumps(self, indent=4):
+        with StringIO() as f:
+            self.dump(f, indent=indent)
+            ret = f.getvalue()
+        return ret
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @property
+    def metrics(self) -> pd.Series:
+        return self._metrics
+
+    @property
+    def equity(self) -> pd.Series:
+        return self._df['equity']
+
+def backtest(price: pd.Series,
+             target: Union[pd.Series, np.ndarray],
+             capital: float=1.0,
+             commission: float=0.0,
+             lag: int=1,
+             mode: str='fraction') -> BacktestResult:
+    """
+    Simulate holding target over price.
+
+    Parameters
+    ----------
+    price : pandas.Series
+        Execution price of each bar.
+    target : pandas.Series or numpy.ndarray
+        Target position of each bar. The fraction of the equity if mode is 'fraction'
+        (0: all cash, 1: all-in), the number of units if mode is 'units'.
+        Use signals_to_target to convert buy/sell events.
+    capital : float, default 1.0
+        Initial cash.
+    commission : float, default 0.0
+        Commission rate applied to the traded value.
+    lag : int, default 1
+        Number of bars between the signal and the execution.
+        1 means the signal computed with a bar is executed at the next bar.
+    mode : str, default 'fraction'
+        'fraction' or 'units'.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES} but actual '{mode}'.")
+    if lag < 0:
+        raise ValueError(f"lag must be non-negative but actual {lag}.")
+
+    if isinstance(target, pd.Series):
+        target = target.reindex(price.index)
+    target = np.nan_to_num(np.asarray(target, dtype=float), nan=0.0)
+    if len(target) != len(price):
+        raise ValueError(f"length of target {len(target)} is not equal to length of price {len(price)}.")
+
+    p = price.to_numpy(dtype=float)
+    target = _shift(target, lag, 0.0)
+
+    if mode == 'units':
+        units, cash, fee = _simulate_units(p, target, capital, commission)
+    else:
+        units, cash, fee = _simulate_fraction(p, target, capital, commission)
+
+    df = pd.DataFrame({
+        'price': p,
+        'target': target,
+        'units': units,
+        'cash': cash,
+        'fee': fee,
+        'equity': cash + units * p,
+    }, index=price.index, columns=RESULT_COLUMNS)
+
+    return BacktestResult(df, calc_metrics(df, capital))
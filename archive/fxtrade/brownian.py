@@ -4,7 +4,7 @@ import pandas as pd
 from datetime import timedelta
 from scipy.stats import laplace
 
-from typing import Callable, Optional, Tuple, Iterable
+from typing import Callable, Iterator, List, Optional, Tuple, Iterable
 
 from .core import type_checked
 from .utils import standardize
@@ -69,6 +69,54 @@ def calc_brown_param(scale: float, dt: pd.Timedelta) -> float:
 def brownianize(xs):
     return np.log10(xs).diff().dropna()
 
+DISTRIBUTIONS = ('laplace', 'gaussian')
+
+# 一度に生成する (パス数 x ステップ数) の上限
+PATH_CHUNK_ELEMENTS = 1 << 22
+
+def path_chunks(n_paths: int, n_steps: int, seed=None, chunk_size: Optional[int]=None) -> List[Tuple[int, np.random.SeedSequence]]:
+    """
+    Return (number of paths, seed) of each chunk.
+    The chunks have independent seeds spawned from seed, so that they can be generated in any process.
+    """
+    if chunk_size is None:
+        chunk_size = max(1, PATH_CHUNK_ELEMENTS // (n_steps + 1))
+    n_chunks = -(-n_paths // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    return [ (min(chunk_size, n_paths - i * chunk_size), s) for i, s in enumerate(seeds) ]
+
+def simulate_chunk(loc: float, scale: float, n_paths: int, n_steps: int, x0: float=0.0,
+                   distribution: str='laplace', seed=None) -> np.ndarray:
+    """
+    Return n_paths paths of the random walk starting from x0 as an array of shape (n_paths, n_steps + 1).
+    Each increment follows Laplace(loc, scale), or the gaussian with the same mean and variance.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"distribution must be one of {DISTRIBUTIONS} but actual '{distribution}'.")
+
+    rng = np.random.default_rng(seed)
+    if distribution == 'laplace':
+        dx = rng.laplace(loc, scale, size=(n_paths, n_steps))
+    else:
+        # ラプラス分布の分散は 2 * scale^2
+        dx = rng.normal(loc, np.sqrt(2) * scale, size=(n_paths, n_steps))
+
+    ret = np.empty((n_paths, n_steps + 1))
+    ret[:, 0] = x0
+    np.cumsum(dx, axis=1, out=ret[:, 1:])
+    ret[:, 1:] += x0
+
+    return ret
+
+def simulate_paths(loc: float, scale: float, n_paths: int, n_steps: int, x0: float=0.0,
+                   distribution: str='laplace', seed=None, chunk_size: Optional[int]=None) -> Iterator[np.ndarray]:
+    """
+    Yield the paths of simulate_chunk in chunks of at most chunk_size paths to bound the memory.
+    loc and scale are per step. The result depends only on seed and chunk_size.
+    """
+    for n, s in path_chunks(n_paths, n_steps, seed=seed, chunk_size=chunk_size):
+        yield simulate_chunk(loc, scale, n, n_steps, x0=x0, distribution=distribution, seed=s)
+
 class Brownian:
     def __init__(self, ohlc: pd.DataFrame, dt: Optional[timedelta]=None):
         self._data = standardize(ohlc)
@@ -81,6 +129,17 @@ class Brownian:
     def __repr__(self):
         return f"Brownian(dt={self._dt}, loc={self._loc}, scale={self._scale})"
     
+    @property
+    def dt(self):
+        return self._dt
+
+    @property
+    def x0(self) -> float:
+        """
+        log10 of the last close, the default starting point of simulate.
+        """
+        return np.log10(self._data['close'].dropna().iloc[-1])
+
     @property
     def begin(self):
         return self._data.index.min()
@@ -121,6 +180,36 @@ class Brownian:
 
         return self
     
+    def params(self, dt: Optional[timedelta]=None) -> Tuple[float, float]:
+        """
+        Return loc and scale of the increment of log10 price at dt (default: the fitted dt).
+        The drift grows linearly and the scale with the square root of time.
+        """
+        if self._scale is None:
+            raise RuntimeError("call fit before simulating.")
+        dt = self._dt if dt is None else pd.Timedelta(dt)
+
+        return self._loc * (dt / self._dt), calc_brown_param(self._scale, dt)
+
+    def simulate(self,
+                 n_paths: int,
+                 n_steps: int,
+                 dt: Optional[timedelta]=None,
+                 x0: Optional[float]=None,
+                 distribution: str='laplace',
+                 seed=None,
+                 chunk_size: Optional[int]=None) -> Iterator[np.ndarray]:
+        """
+        Yield synthetic log10 price paths with the fitted parameters in chunks
+        of shape (n, n_steps + 1). x0 defaults to log10 of the last close.
+        """
+        loc, scale = self.params(dt)
+        if x0 is None:
+            x0 = self.x0
+
+        return simulate_paths(loc, scale, n_paths, n_steps, x0=x0,
+                              distribution=distribution, seed=seed, chunk_size=chunk_size)
+
     def transform(self):
         self._data = normalize_time_index(self._data, self.begin, self.end, self._dt)
 
@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 
 from copy import deepcopy
+from functools import partial
 from datetime import datetime, timedelta
 from io import StringIO
 from glob import glob
@@ -14,11 +15,14 @@ from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, Iter
 # from .analysis import log10
 from .api import CodePair, CRangePeriod, ChartAPI
 from .core import type_checked, type_checked_copy, is_instance_list, is_instance_dict
+from .parallel import RateLimiter, count_rows, run_tasks, raise_first_error
+from .partition import Manifest
 from .period import Period
 
 from .timeseries import year_sections, month_sections, day_sections
-from .utils import focus, standardize, \
-    default_timestamp_filter, default_save_fstring, default_save_iterator, \
+from .utils import focus, time_slice, standardize, find_gaps, regularize, \
+    default_read_function, default_timestamp_filter, default_save_fstring, default_save_iterator, \
+    DEFAULT_SAVE_FSTRINGS, \
     default_glob_function, default_save_function, \
     default_restore_function, default_merge_function
 
@@ -45,6 +49,7 @@ class Board(SafeAttrABC):
                  save_function=default_save_function,
                  restore_function=default_restore_function,
                  merge_function=default_merge_function,
+                 rate_limiter: Optional[RateLimiter]=None,
                  ):
         self.name = immutable(name, (str, CRangePeriod), optional=True)
         self.api = immutable(api, ChartAPI, optional=True)
@@ -65,7 +70,10 @@ class Board(SafeAttrABC):
         self.restore_function = immutable(restore_function)
         self.merge_function = immutable(merge_function)
 
-        if self.period not in { Period('1d'), Period('15m'), Period('1m') }:
+        # 複数のボードで共有するのでコピーせずに持つ
+        self.rate_limiter = rate_limiter
+
+        if self.period not in DEFAULT_SAVE_FSTRINGS:
             if timestamp_filter is None:
                 raise KeyError(f"{self.period} not in table.")
             if save_fstring is None:
@@ -173,12 +181,51 @@ class Board(SafeAttrABC):
         self._df = self.api.empty
         return self
 
+    def find_gaps(self, t=None):
+        """
+        Return the missing bars of the board as a list of (first, last) ranges.
+        """
+        df = focus(self.df, t, copy=False)
+        if len(df) == 0:
+            return []
+        return find_gaps(df.index, self.period)
+
+    def regularize(self, policy='ffill'):
+        """
+        Reindex the board onto the grid of the period and fill the missing bars.
+        """
+        if len(self.df) != 0:
+            self._df = regularize(self.df, self.period, policy=policy)
+        return self.df
+
+    def gaps(self, t=None, data_dir=None):
+        """
+        Return the missing spans recorded in the saved data.
+        """
+        data_dir = self.arg_data_dir(data_dir)
+        return Manifest.load(data_dir).gaps(t)
+
+    def _update_gaps(self, data_dir, prev_bounds):
+        manifest = Manifest.load(data_dir)
+
+        begin, end = self.first_updated, self.last_updated
+        if (prev_bounds is not None) and (prev_bounds[1] < begin):
+            # 保存済みの末尾から今回の先頭までも欠損として扱う
+            begin = prev_bounds[1] + self.period.timedelta
+
+        # self.df に無くてもファイルには存在することがあるが、
+        # 欠損を多めに見積もっても再取得されるだけなので問題ない
+        manifest.update_gaps(begin, end, find_gaps(self.df.index, self.period, begin=begin, end=end))
+        manifest.save()
+
     def save(self, data_dir=None, save_function=None):
         data_dir = self.arg_data_dir(data_dir)
         
         save_function = self.arg_save_function(save_function)
 
-        return save_function(
+        prev_bounds = Manifest.load(data_dir).bounds
+
+        ret = save_function(
             df=self.df,
             dir_path=data_dir,
             save_iterator=self.save_iterator,
@@ -186,12 +233,17 @@ class Board(SafeAttrABC):
             timestamp_filter=self.timestamp_filter
         )
 
+        self._update_gaps(data_dir, prev_bounds)
+
+        return ret
+
     def read(self,
              t=None,
              data_dir=None,
              save_fstring=None,
              glob_function=None,
-             restore_function=None):
+             restore_function=None,
+             use_manifest=True):
         data_dir = self.arg_data_dir(data_dir)
 
         save_fstring = self.arg_save_fstring(save_fstring)
@@ -206,13 +258,25 @@ class Board(SafeAttrABC):
         if len(paths) == 0:
             raise FileNotFoundError(f"No file to read in '{read_dir}'")
 
-        paths = focus(paths, t, fstring=save_fstring, include_end=True)
+        if use_manifest:
+            # 範囲が重なるパーティションだけを開く
+            manifest = Manifest.load(read_dir)
+            if manifest.refresh(paths, read_function=default_read_function):
+                try:
+                    manifest.save()
+                except OSError:
+                    # 書き込めないディレクトリでも読み込みは続ける
+                    pass
+            paths = manifest.select(paths, t)
+        else:
+            paths = focus(paths, t, fstring=save_fstring, include_end=True)
+
         if len(paths) == 0:
             raise FileNotFoundError(f"No files remained after applying filter.")
 
         df = standardize(restore_function(paths))
         
-        return focus(df, t)
+        return time_slice(df, t)
     
     def load(self,
              t=None,
@@ -235,10 +299,15 @@ class Board(SafeAttrABC):
         return df
 
     def download(self, t=None):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
         df = self.api.download(code_pair=self.code_pair,
                                crange_period=self.crange_period,
                                t=t)
-        return focus(standardize(df), t)
+        # standardize は新しいデータフレームか、整形済みならそのもの（エミュレータのカーソルのビュー）を返す
+        # どちらも呼び出し元のためにコピーする必要はない
+        return focus(standardize(df), t, copy=False)
     
     def update(self, t=None, interval=None, force=False, merge_function=None):
         merge_function = self.arg_merge_function(merge_function)
@@ -248,12 +317,90 @@ class Board(SafeAttrABC):
             return None
 
         df = self.download(t)
-        df = focus(merge_function(self.df, df), t)
+        if isinstance(self.api, ChartEmulatorAPI) and self.api.on_memory \
+                and isinstance(t, (datetime, np.datetime64)):
+            # t までの全履歴のビューが返るので、結合して作り直さずにそのまま持つ
+            self._df = df
+            return df
+
+        df = focus(merge_function(self.df, df), t, copy=False)
 
         self._df = df
 
         return df
 
+    def _missing_spans(self, manifest, t=None):
+        """
+        Return the spans to be downloaded: known gaps and the tail after the last stored bar.
+        """
+        step = self.period.timedelta
+        last = manifest.bounds[1]
+
+        end = None
+        if isinstance(t, (datetime, np.datetime64)):
+            end = pd.Timestamp(t)
+        elif is_instance_list(t, (datetime, np.datetime64), n=2):
+            end = pd.Timestamp(t[1])
+
+        spans = manifest.gaps(t)
+        if (end is None) or (last + step <= end):
+            spans.append((last + step, end))
+
+        return spans
+
+    def _sync_incremental(self, t, data_dir, interval, force, save_function, merge_function, manifest):
+        bounds = manifest.bounds
+        interval = self.arg_interval(interval)
+
+        if (not force) and (interval is not None) \
+                and (pd.Timestamp.now() - bounds[1]) <= interval:
+            return None
+
+        spans = self._missing_spans(manifest, t)
+        if len(spans) == 0:
+            return None
+        n_gaps = len(manifest.gaps(t))
+
+        # 欠損と末尾を別々にリクエストする（古い欠損から末尾までをまとめて取り直さない）
+        parts, filled, resolved = [], [], []
+        for i, (b, e) in enumerate(spans):
+            span = (b,) if e is None else (b, e)
+            df = focus(self.download(t=span), span, copy=False)
+            if len(df) != 0:
+                parts.append(df)
+                filled.append((b, e if e is not None else df.index[-1], df.index))
+            elif i < n_gaps:
+                # 取引所が埋めない欠損（メンテナンスや取引なし）は二度とリクエストしない
+                resolved.append((b, e))
+
+        if len(parts) != 0:
+            df_new = pd.concat(parts).sort_index()
+            df_new = df_new.loc[~df_new.index.duplicated(keep='last')]
+
+            # 新しい行だけを保存するので、触れるのは末尾 (と欠損) のパーティションだけになる
+            save_function(
+                df=df_new,
+                dir_path=data_dir,
+                save_iterator=self.save_iterator,
+                save_fstring=self.save_fstring,
+                timestamp_filter=self.timestamp_filter
+            )
+
+        manifest = Manifest.load(data_dir)
+        for b, e, index in filled:
+            manifest.update_gaps(b, e, find_gaps(index, self.period, begin=b, end=e))
+        for b, e in resolved:
+            manifest.resolve(b, e)
+        manifest.save()
+
+        if len(parts) == 0:
+            return None
+
+        if len(self.df) != 0:
+            self._df = focus(merge_function(self.df, df_new), t, copy=False)
+
+        return df_new
+
     def sync(self,
              t=None,
              data_dir=None,
@@ -263,7 +410,17 @@ class Board(SafeAttrABC):
              glob_function=None,
              save_function=None,
              restore_function=None,
-             merge_function=None):
+             merge_function=None,
+             incremental=True):
+        """
+        Download the bars which are not saved yet and save them.
+
+        If incremental is True and the data directory already has a manifest,
+        only the bars after the last stored one and the known gaps are requested,
+        and only the new rows are saved. Returns the new rows or None.
+        Otherwise the whole board is loaded, updated and saved,
+        and the updated board is returned.
+        """
         data_dir = self.arg_data_dir(data_dir)
 
         glob_function = self.arg_glob_function(glob_function)
@@ -271,6 +428,34 @@ class Board(SafeAttrABC):
         restore_function = self.arg_restore_function(restore_function)
         merge_function = self.arg_merge_function(merge_function)
 
+        if incremental:
+            manifest = Manifest.load(data_dir)
+            paths = glob_function(data_dir) if Path(data_dir).exists() else []
+            if manifest.refresh(paths, read_function=default_read_function):
+                manifest.save()
+
+            if manifest.bounds is not None:
+                return self._sync_incremental(
+                    t=t,
+                    data_dir=data_dir,
+                    interval=interval,
+                    force=force,
+                    save_function=save_function,
+                    merge_function=merge_function,
+                    manifest=manifest
+                )
+
+            # まだ何も保存されていない
+            df_updated = self.update(
+                t=t,
+                interval=interval,
+                force=True,
+                merge_function=merge_function
+            )
+            if len(self.df) != 0:
+                self.save(data_dir=data_dir, save_function=save_function)
+            return df_updated
+
         self.load(
             t=t,
             data_dir=data_dir,
@@ -356,11 +541,13 @@ class Chart(SafeAttrABC):
                  code_pair: CodePair,
                  api: Type[ChartAPI]=None,
                  data_dir: Union[str, Path]=None,
-                 crange_period: Union[CRangePeriod, Iterable[CRangePeriod]]=None
+                 crange_period: Union[CRangePeriod, Iterable[CRangePeriod]]=None,
+                 rate_limiter: Optional[RateLimiter]=None
                 ):
         self.code_pair = self._to_code_pair(code_pair)
         self.api = immutable(api, ChartAPI, optional=True)
         self.data_dir = immutable(data_dir, Path, f=Path, optional=True)
+        self.rate_limiter = rate_limiter
         self.board = {}
 
         if crange_period is None:
@@ -445,11 +632,60 @@ class Chart(SafeAttrABC):
                 code_pair=self.code_pair,
                 crange_period=crange_period,
                 data_dir=data_dir,
-                interval=interval
+                interval=interval,
+                rate_limiter=self.rate_limiter
             )
         
         return self
 
+    def set_rate_limiter(self, rate_limiter: Optional[RateLimiter]):
+        """
+        Share rate_limiter among all boards of the chart.
+        """
+        self.rate_limiter = rate_limiter
+        for board in self.board.values():
+            board.rate_limiter = rate_limiter
+        return self
+
+    def _keys(self, crange_period):
+        if crange_period is None:
+            return list(self.board.keys())
+        return self._make_crange_period_list(crange_period)
+
+    def _board_dir(self, board, data_dir):
+        if data_dir is None:
+            return None
+        return Path(data_dir) / board.code_pair.short / board.crange_period.short
+
+    def download_tasks(self, t=None, crange_period=None):
+        def task(board):
+            df = board.download(t=t)
+            # ダウンロードはボードに結合しないので、結合したら増える行（ボードにない時刻）を数える
+            return UpdateResult(df, 0 if df is None else len(df.index.difference(board.df.index)))
+
+        return [ (key, partial(task, self.board[key]))
+                 for key in self._keys(crange_period) ]
+
+    def update_tasks(self, t=None, crange_period=None, interval=None, force=False):
+        def task(board):
+            n = len(board.df)
+            df = board.update(t=t, interval=interval, force=force)
+            return UpdateResult(df, 0 if df is None else len(df) - n)
+
+        return [ (key, partial(task, self.board[key]))
+                 for key in self._keys(crange_period) ]
+
+    def sync_tasks(self, t=None, crange_period=None, data_dir=None, interval=None, force=False):
+        tasks = []
+        for key in self._keys(crange_period):
+            board = self.board[key]
+            sync_dir = self._board_dir(board, data_dir)
+            if sync_dir is None:
+                tasks.append((key, partial(board.sync, t=t, interval=interval, force=force)))
+            else:
+                tasks.append((key, partial(board.sync, t=t, data_dir=sync_dir, interval=interval, force=force)))
+        return tasks
+
 #     def copy(self, api=None, data_dir=None):
 #         if api is None:
 #             api = self.api
@@ -530,46 +766,50 @@ class Chart(SafeAttrABC):
 
         return ret
 
-    def download(self, t=None, crange_period: Union[str, Iterable[str]]=None):
-        if crange_period is None:
-            crange_period = list(self.board.keys())
-        else:
-            crange_period = self._make_crange_period_list(crange_period)
-
-        ret = {}
-        for key in crange_period:
-            ret[key] = self.board[key].download(t=t)
-        
-        return ret
+    def download(self, t=None, crange_period: Union[str, Iterable[str]]=None,
+                 max_workers: Optional[int]=None, return_summary: bool=False):
+        return run_board_tasks(self.download_tasks(t=t, crange_period=crange_period),
+                               max_workers=max_workers, return_summary=return_summary)
     
-    def update(self, t=None, crange_period=None, interval=None, force=False):
-        if crange_period is None:
-            crange_period = list(self.board.keys())
-        else:
-            crange_period = self._make_crange_period_list(crange_period)
-        
-        ret = {}
-        for key in crange_period:
-            ret[key] = self.board[key].update(t=t, interval=interval, force=force)
-        
-        return ret
-
-    def sync(self, t=None, crange_period=None, data_dir=None, interval=None, force=False):
-        if crange_period is None:
-            crange_period = list(self.board.keys())
-        else:
-            crange_period = self._make_crange_period_list(crange_period)
-        
-        ret = {}
-        for key in crange_period:
-            board = self.board[key]
-            if data_dir is None:
-                ret[key] = board.sync(t=t, interval=interval, force=force)
-            else:
-                sync_dir = Path(data_dir) / board.code_pair.short / board.crange_period.short
-                ret[key] = board.sync(t=t, data_dir=sync_dir, interval=interval, force=force)
-        
-        return ret
+    def update(self, t=None, crange_period=None, interval=None, force=False,
+               max_workers: Optional[int]=None, return_summary: bool=False):
+        return run_board_tasks(self.update_tasks(t=t, crange_period=crange_period, interval=interval, force=force),
+                               max_workers=max_workers, return_summary=return_summary)
+
+    def sync(self, t=None, crange_period=None, data_dir=None, interval=None, force=False,
+             max_workers: Optional[int]=None, return_summary: bool=False):
+        return run_board_tasks(self.sync_tasks(t=t, crange_period=crange_period, data_dir=data_dir, interval=interval, force=force),
+                               max_workers=max_workers, return_summary=return_summary)
+
+class UpdateResult:
+    """
+    Result of a board operation with the number of rows it adds to the board.
+    """
+    def __init__(self, df, rows):
+        self.df = df
+        self.rows = rows
+
+def run_board_tasks(tasks, max_workers=None, return_summary=False):
+    """
+    Run board operations concurrently.
+
+    Return the results keyed as the tasks. If return_summary is True,
+    also return the summary of rows added, elapsed seconds and error per board
+    instead of raising the first error.
+    """
+    def rows(x):
+        if isinstance(x, UpdateResult):
+            return x.rows
+        return count_rows(x)
+
+    ret, summary = run_tasks(tasks, max_workers=max_workers, rows=rows)
+    ret = { key: x.df if isinstance(x, UpdateResult) else x for key, x in ret.items() }
+
+    if return_summary:
+        return ret, summary
+    
+    raise_first_error(summary)
+    return ret
 
 class ChartDummyAPI(ChartAPI):
     def __init__(self):
@@ -605,14 +845,104 @@ class ChartDummyAPI(ChartAPI):
             CRangePeriod('max', '1m'),
         ]
     
+    VALID_CRANGE_PERIODS = frozenset([
+        CRangePeriod('max', '1d'),
+        CRangePeriod('max', '15m'),
+        CRangePeriod('max', '1m'),
+    ])
+
     def is_valid_crange_period(self, crange_period: str) -> bool:
-        table = {
-            CRangePeriod('max', '1d'),
-            CRangePeriod('max', '15m'),
-            CRangePeriod('max', '1m'),
-        }
-        
-        return crange_period in table
+        return crange_period in self.VALID_CRANGE_PERIODS
+
+class ChartCursor:
+    """
+    Point-in-time view of a frame sorted by time for backtests.
+
+    The right edge only moves forward by advance(t), and frame is the prefix of the rows
+    whose index is <= t as a view of the original frame (no copy).
+    Each step costs one binary search over the int64 time index, independent of the length of the prefix.
+    """
+    def __init__(self, df: pd.DataFrame, t=None):
+        index = pd.DatetimeIndex(df.index)
+        if not index.is_monotonic_increasing:
+            raise ValueError("index of df must be sorted.")
+
+        self._df = df
+        self._tz = index.tz
+        # UTC のナノ秒で二分探索する
+        self._values = index.as_unit('ns').asi8
+        self._columns = {}
+        self._pos = 0
+        self._t = None
+        self._frame = None
+
+        if t is not None:
+            self.advance(t)
+
+    def __repr__(self):
+        return f"ChartCursor(t={self._t}, position={self._pos}, length={len(self._values)})"
+
+    def __len__(self):
+        return self._pos
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @property
+    def t(self):
+        return self._t
+
+    @property
+    def position(self) -> int:
+        return self._pos
+
+    def _ns(self, t: pd.Timestamp) -> int:
+        if (t.tz is None) != (self._tz is None):
+            raise TypeError(f"cannot compare tz-naive and tz-aware timestamps: t={t}, tz={self._tz}.")
+        return t.value
+
+    def advance(self, t) -> 'ChartCursor':
+        """
+        Move the right edge to t and return self.
+        Raise ValueError if t is before the current edge.
+        """
+        t = pd.Timestamp(t)
+        if (self._t is not None) and (t < self._t):
+            raise ValueError(f"cursor cannot move backward: {t} < {self._t}.")
+
+        # 前回の位置より右だけを探す
+        pos = self._pos + int(np.searchsorted(self._values[self._pos:], self._ns(t), side='right'))
+        if pos != self._pos:
+            self._pos = pos
+            self._frame = None
+        self._t = t
+
+        return self
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """
+        Rows up to the current edge as a view (the same object until the edge moves).
+        """
+        if self._frame is None:
+            self._frame = self._df.iloc[:self._pos]
+        return self._frame
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Values of the column up to the current edge as a view of numpy array.
+        """
+        values = self._columns.get(name)
+        if values is None:
+            values = self._columns[name] = self._df[name].to_numpy()
+        return values[:self._pos]
+
+    def window(self, n: int) -> pd.DataFrame:
+        """
+        Last n rows up to the current edge as a view.
+        """
+        return self._df.iloc[max(0, self._pos - n):self._pos]
 
 class ChartEmulatorAPI(SafeAttrABC, ChartAPI):
     def __init__(self,
@@ -625,6 +955,7 @@ class ChartEmulatorAPI(SafeAttrABC, ChartAPI):
         self.on_memory = immutable(on_memory, bool)
 
         self.board = {}
+        self.cursors = {}
     
     def __repr__(self):
         return f"ChartEmulatorAPI(api={self._api.__class__.__name__}, source_dir='{self._source_dir}')"
@@ -689,10 +1020,7 @@ class ChartEmulatorAPI(SafeAttrABC, ChartAPI):
             
 #         return df.copy()
 
-    def download(self, code_pair, crange_period=None, t=None, as_dataframe=True):
-        """
-        t ... ignored if as_dataframe is False
-        """
+    def _board(self, code_pair, crange_period=None):
         if code_pair not in self.code_pairs:
             raise ValueError(f"ticker '{code_pair}' not in {self.code_pairs}")
 
@@ -716,7 +1044,40 @@ class ChartEmulatorAPI(SafeAttrABC, ChartAPI):
             if self.on_memory:
                 self.board[name].load()
 
+        return name, self.board[name]
+
+    def cursor(self, code_pair, crange_period=None, t=None) -> ChartCursor:
+        """
+        Point-in-time view of the on-memory board, shared with download(t=datetime).
+        The cursor is made again when the board is reloaded.
+        """
+        if not self.on_memory:
+            raise RuntimeError("cursor is available only when on_memory is True.")
+
+        name, board = self._board(code_pair, crange_period)
+
+        cursor = self.cursors.get(name)
+        if (cursor is None) or (cursor.df is not board.df):
+            cursor = self.cursors[name] = ChartCursor(board.df)
+
+        if t is not None:
+            cursor.advance(t)
+        return cursor
+
+    def download(self, code_pair, crange_period=None, t=None, as_dataframe=True):
+        """
+        t ... ignored if as_dataframe is False
+        """
+        name, board = self._board(code_pair, crange_period)
+
         if self.on_memory:
-            return focus(self.board[name].df, t)
+            if isinstance(t, (datetime, np.datetime64)):
+                # 時刻が進むだけなら切り出し直さずにカーソルを進める
+                cursor = self.cursor(code_pair, crange_period)
+                if (cursor.t is None) or (cursor.t <= t):
+                    return cursor.advance(t).frame
+
+            # 呼び出し側 (Board.download) で standardize されるのでビューを返す
+            return focus(board.df, t, copy=False)
         
-        return self.board[name].read(t=t)
\ No newline at end of file
+        return board.read(t=t)
\ No newline at end of file
@@ -0,0 +1,412 @@
+""" Compact immutable value types with integer fixed-point quantities.
+
+FixedStock, FixedRate and FixedTrade are slotted counterparts of
+stock.Stock, stock.Rate and trade.Trade. Quantities are integers in units of
+10^-DIGITS (rates in units of 10^-RATE_DIGITS) and codes are interned, so
+thousands of trades can be built from arrays at once.
+"""
+import gc
+import sys
+
+import numpy as np
+import pandas as pd
+
+from decimal import Decimal
+from fractions import Fraction
+from typing import Any, Iterable, List, Optional
+
+from .stock import Numeric, Stock, Rate
+from .trade import Trade
+
+# 数量は 10^-8 単位（1 satoshi）の整数で持つ
+DIGITS = 8
+SCALE = 10 ** DIGITS
+
+# レートは 10^-12 単位の整数で持つ（丸めは偶数丸め）
+RATE_DIGITS = 12
+RATE_SCALE = 10 ** RATE_DIGITS
+
+_CODES = {}
+
+def intern_code(code: str) -> str:
+    """
+    Return the shared instance of the code string.
+    """
+    ret = _CODES.get(code)
+    if ret is None:
+        if not isinstance(code, str):
+            raise TypeError("code must be type of str")
+        ret = _CODES.setdefault(code, sys.intern(code))
+    return ret
+
+def to_units(q: Numeric, scale: int=SCALE) -> int:
+    """
+    Convert a quantity to an integer in units of 1 / scale.
+    Raise ValueError if the quantity cannot be represented exactly.
+    """
+    if isinstance(q, (int, np.integer)):
+        return int(q) * scale
+    if isinstance(q, (float, np.floating)):
+        # float は表示通りの十進数とみなす（stock.as_numeric と同じ）
+        q = Decimal(repr(float(q)))
+    units = Fraction(q) * scale
+    if units.denominator != 1:
+        raise ValueError(f"{q} cannot be represented in units of 1/{scale}.")
+    return units.numerator
+
+def to_units_array(q: Any, scale: int=SCALE) -> np.ndarray:
+    """
+    Vectorized to_units. Floats are rounded to the nearest unit.
+    """
+    q = np.asarray(q)
+    if q.dtype.kind in 'iu':
+        return q.astype(np.int64) * scale
+    if q.dtype.kind == 'f':
+        return np.rint(q * scale).astype(np.int64)
+    return np.array([ to_units(x, scale) for x in q.ravel() ], dtype=np.int64).reshape(q.shape)
+
+def _round_div(a: int, b: int) -> int:
+    # 偶数丸めの整数除算
+    return round(Fraction(a, b))
+
+class FixedStock:
+    """
+    Immutable stock with an interned code and an integer quantity in units of 10^-DIGITS.
+    """
+    __slots__ = ('code', 'units')
+
+    @classmethod
+    def from_units(cls, code: str, units: int):
+        ret = object.__new__(cls)
+        _stock_code(ret, intern_code(code))
+        _stock_units(ret, int(units))
+        return ret
+
+    @classmethod
+    def from_stock(cls, stock: Stock):
+        return cls(stock.code, stock.q)
+
+    @classmethod
+    def from_arrays(cls, code: Any, q: Any) -> List['FixedStock']:
+        """
+        Build stocks from a code (or an array of codes) and an array of quantities.
+        """
+        units = to_units_array(q).tolist()
+        codes = _codes_of(code, len(units))
+        new = object.__new__
+        ret = []
+        for c, u in zip(codes, units):
+            x = new(cls)
+            _stock_code(x, c)
+            _stock_units(x, u)
+            ret.append(x)
+        return ret
+
+    def __init__(self, code: str, q: Numeric):
+        """
+        Parameters
+        ----------
+        code : str
+            Product code or name of the stock.
+        q : Numeric
+            Quantity of the stock. Must be a multiple of 10^-DIGITS.
+        """
+        _stock_code(self, intern_code(code))
+        _stock_units(self, to_units(q))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __reduce__(self):
+        return (FixedStock.from_units, (self.code, self.units))
+
+    @property
+    def q(self) -> Fraction:
+        """
+        Return its quantity.
+        """
+        return Fraction(self.units, SCALE)
+
+    def to_stock(self) -> Stock:
+        return Stock(self.code, self.q)
+
+    def __repr__(self):
+        return f"FixedStock({self.code}, {self.units / SCALE})"
+
+    def __hash__(self):
+        return hash((self.code, self.units))
+
+    def _units_of(self, other) -> int:
+        if isinstance(other, FixedStock):
+            if self.code != other.code:
+                raise TypeError(f"operation undefined between {self.code} and {other.code}")
+            return other.units
+        return to_units(other)
+
+    def __eq__(self, other):
+        return self.units == self._units_of(other)
+
+    def __ne__(self, other):
+        return self.units != self._units_of(other)
+
+    def __lt__(self, other):
+        return self.units < self._units_of(other)
+
+    def __le__(self, other):
+        return self.units <= self._units_of(other)
+
+    def __gt__(self, other):
+        return self.units > self._units_of(other)
+
+    def __ge__(self, other):
+        return self.units >= self._units_of(other)
+
+    def __neg__(self):
+        return FixedStock.from_units(self.code, -self.units)
+
+    def __abs__(self):
+        return FixedStock.from_units(self.code, abs(self.units))
+
+    def __add__(self, other):
+        return FixedStock.from_units(self.code, self.units + self._units_of(other))
+
+    def __sub__(self, other):
+        return FixedStock.from_units(self.code, self.units - self._units_of(other))
+
+    def __mul__(self, other):
+        """
+        Convert with the rate if the other is FixedRate, else multiply the quantity (rounded to the unit).
+        """
+        if isinstance(other, FixedRate):
+            return other * self
+        if isinstance(other, (int, np.integer)):
+            return FixedStock.from_units(self.code, self.units * int(other))
+        return FixedStock.from_units(self.code, round(self.units * Fraction(other)))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, FixedRate):
+            return ~other * self
+        return FixedStock.from_units(self.code, round(self.units / Fraction(other)))
+
+_stock_code = FixedStock.code.__set__
+_stock_units = FixedStock.units.__set__
+
+class FixedRate:
+    """
+    Immutable rate with interned codes and an integer rate in units of 10^-RATE_DIGITS.
+    """
+    __slots__ = ('from_code', 'to_code', 'units')
+
+    @classmethod
+    def from_units(cls, from_code: str, to_code: str, units: int):
+        ret = object.__new__(cls)
+        _rate_from(ret, intern_code(from_code))
+        _rate_to(ret, intern_code(to_code))
+        _rate_units(ret, int(units))
+        return ret
+
+    @classmethod
+    def from_stocks(cls, before: FixedStock, after: FixedStock):
+        """
+        Return the rate at which before is converted to after.
+        """
+        return cls.from_units(before.code, after.code, _round_div(after.units * RATE_SCALE, before.units))
+
+    @classmethod
+    def from_rate(cls, rate: Rate):
+        return cls.from_units(rate.from_code, rate.to_code, round(rate.r * RATE_SCALE))
+
+    def __init__(self, from_code: str, to_code: str, r: Numeric):
+        """
+        Parameters
+        ----------
+        from_code : str
+            Product code before conversion.
+        to_code : str
+            Product code after conversion.
+        r : Numeric
+            Conversion rate, rounded to 10^-RATE_DIGITS.
+        """
+        if isinstance(r, (float, np.floating)):
+            r = Decimal(repr(float(r)))
+        _rate_from(self, intern_code(from_code))
+        _rate_to(self, intern_code(to_code))
+        _rate_units(self, round(Fraction(r) * RATE_SCALE))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __reduce__(self):
+        return (FixedRate.from_units, (self.from_code, self.to_code, self.units))
+
+    @property
+    def r(self) -> Fraction:
+        """Conversion rate.
+        """
+        return Fraction(self.units, RATE_SCALE)
+
+    def to_rate(self) -> Rate:
+        return Rate(self.from_code, self.to_code, self.r)
+
+    def __repr__(self):
+        return f"FixedRate({self.from_code}->{self.to_code}: {self.units / RATE_SCALE})"
+
+    def __hash__(self):
+        return hash((self.from_code, self.to_code, self.units))
+
+    def __eq__(self, other):
+        """True iff from_code, to_code, and r are all the same.
+        """
+        if not isinstance(other, FixedRate):
+            raise TypeError(f"comparison undefined between FixedRate and {type(other)}")
+        return (self.from_code == other.from_code) and (self.to_code == other.to_code) and (self.units == other.units)
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __invert__(self):
+        """
+        Swap from_code and to_code, and take the reciprocal for r.
+        """
+        return FixedRate.from_units(self.to_code, self.from_code, _round_div(RATE_SCALE * RATE_SCALE, self.units))
+
+    def __mul__(self, other):
+        """Try to chain the other if it is FixedRate, or convert the other if it is FixedStock.
+        """
+        if isinstance(other, FixedRate):
+            if self.to_code != other.from_code:
+                raise TypeError(f"cannot be chained {self} and {other}")
+            return FixedRate.from_units(self.from_code, other.to_code, _round_div(self.units * other.units, RATE_SCALE))
+        if isinstance(other, FixedStock):
+            if self.from_code != other.code:
+                raise TypeError(f"cannot be chained {self} and {other}")
+            return FixedStock.from_units(self.to_code, _round_div(self.units * other.units, RATE_SCALE))
+        return NotImplemented
+
+_rate_from = FixedRate.from_code.__set__
+_rate_to = FixedRate.to_code.__set__
+_rate_units = FixedRate.units.__set__
+
+class FixedTrade:
+    """
+    Immutable trade of FixedStock. t is the time in nanoseconds since the epoch (UTC)
+    and must be given explicitly. Unlike Trade, it has no additional infomation.
+    """
+    __slots__ = ('t', 'id', 'x', 'y')
+
+    @classmethod
+    def from_trade(cls, trade: Trade):
+        return cls(FixedStock.from_stock(trade.x), FixedStock.from_stock(trade.y), trade.t, trade.id)
+
+    @classmethod
+    def from_arrays(cls,
+                    t: Any,
+                    code_x: Any,
+                    q_x: Any,
+                    code_y: Any,
+                    q_y: Any,
+                    id: Optional[Iterable]=None) -> List['FixedTrade']:
+        """
+        Build trades from arrays (or scalar codes) at once.
+        t is anything accepted by pandas.DatetimeIndex, q_x and q_y are arrays of quantities.
+        """
+        ts = pd.DatetimeIndex(t).as_unit('ns').asi8.tolist()
+        n = len(ts)
+        units_x = to_units_array(q_x).tolist()
+        units_y = to_units_array(q_y).tolist()
+        ids = [None] * n if id is None else list(id)
+        if not (len(units_x) == len(units_y) == len(ids) == n):
+            raise ValueError("all arrays must have the same length.")
+        codes_x = _codes_of(code_x, n)
+        codes_y = _codes_of(code_y, n)
+
+        # 1 回のループで FixedStock と FixedTrade をまとめて作る
+        # 循環参照はできないので、大量に作る間は GC を止めておく
+        new = object.__new__
+        ret = []
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for t_, cx, ux, cy, uy, id_ in zip(ts, codes_x, units_x, codes_y, units_y, ids):
+                x = new(FixedStock)
+                _stock_code(x, cx)
+                _stock_units(x, ux)
+                y = new(FixedStock)
+                _stock_code(y, cy)
+                _stock_units(y, uy)
+                trade = new(cls)
+                _trade_t(trade, t_)
+                _trade_id(trade, id_)
+                _trade_x(trade, x)
+                _trade_y(trade, y)
+                ret.append(trade)
+        finally:
+            if enabled:
+                gc.enable()
+        return ret
+
+    def __init__(self, x: FixedStock, y: FixedStock, t, id: Optional[str]=None):
+        """
+        Parameters
+        ----------
+        x : FixedStock
+            The stock before the transaction.
+        y : FixedStock
+            The stock after the transaction.
+        t : int or pandas.Timestamp
+            The time at which the transaction took place (nanoseconds since the epoch if int).
+        id : str, optional
+            ID to distinguish that transaction from others.
+        """
+        if t is None:
+            raise TypeError("t must be given explicitly.")
+        _trade_t(self, int(t) if isinstance(t, (int, np.integer)) else pd.Timestamp(t).value)
+        _trade_id(self, id)
+        _trade_x(self, x)
+        _trade_y(self, y)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __reduce__(self):
+        return (FixedTrade, (self.x, self.y, self.t, self.id))
+
+    @property
+    def timestamp(self) -> pd.Timestamp:
+        return pd.Timestamp(self.t)
+
+    @property
+    def rate(self) -> FixedRate:
+        """The rate at the transaction.
+        """
+        return FixedRate.from_stocks(self.x, self.y)
+
+    def to_trade(self) -> Trade:
+        return Trade(x=self.x.to_stock(), y=self.y.to_stock(), t=self.timestamp, id=self.id)
+
+    def __repr__(self):
+        return f"FixedTrade({self.id} | {self.timestamp} | "\
+               f"X(t): {self.x.units / SCALE}{self.x.code} -> Y(t+dt): {self.y.units / SCALE}{self.y.code})"
+
+_trade_t = FixedTrade.t.__set__
+_trade_id = FixedTrade.id.__set__
+_trade_x = FixedTrade.x.__set__
+_trade_y = FixedTrade.y.__set__
+
+def _codes_of(code: Any, n: int) -> List[str]:
+    if isinstance(code, str):
+        return [intern_code(code)] * n
+    codes, uniques = pd.factorize(np.asarray(code, dtype=object))
+    uniques = [ intern_code(c) for c in uniques ]
+    return [ uniques[i] for i in codes.tolist() ]
@@ -15,7 +15,10 @@ from .api import CodePair, ChartAPI, TraderAPI
 from .stock import Numeric, Stock, Rate
 from .trade import Trade
 from .history import History
-from .chart import Chart, ChartEmulatorAPI
+from .chart import Chart, ChartEmulatorAPI, run_board_tasks
+from .backtest import backtest
+from .parallel import raise_first_error
+from .utils import focus
 from .trader import Trader, TraderEmulatorAPI
 from .wallet import Wallet
 from .logger import Logger, is_logger
@@ -323,24 +326,46 @@ class FX(SafeAttrABC):
             ret[name] = trader.load_chart(t=t, crange_period=crange_period, data_dir=data_dir)
         return ret
 
-    def download_chart(self, t=None, crange_period: Union[str, Iterable[str]]=None):
-        ret = {}
+    def _run_chart_tasks(self, make_tasks, max_workers=None, return_summary=False):
+        # 全ての取引所・ボードをまとめて一つのプールで実行する
+        tasks = []
         for name, trader in self._market.items():
-            ret[name] = trader.download_chart(t=t, crange_period=crange_period)
-        return ret
+            for key, task in make_tasks(trader.chart):
+                tasks.append(((name, key), task))
 
-    def update_chart(self, t=None, crange_period=None, interval=None, force=False):
-        ret = {}
-        for name, trader in self._market.items():
-            ret[name] = trader.update_chart(t=t, crange_period=crange_period, interval=interval, force=force)
-        return ret
+        results, summary = run_board_tasks(tasks, max_workers=max_workers, return_summary=True)
 
-    def sync_chart(self, t=None, crange_period=None, data_dir=None, interval=None, force=False):
-        ret = {}
-        for name, trader in self._market.items():
-            ret[name] = trader.sync_chart(t=t, crange_period=crange_period, data_dir=data_dir, interval=interval, force=force)
+        ret = { name: {} for name in self._market.keys() }
+        for (name, key), x in results.items():
+            ret[name][key] = x
+
+        if len(summary) > 0:
+            summary.index = pd.MultiIndex.from_tuples(summary.index)
+
+        if return_summary:
+            return ret, summary
+
+        raise_first_error(summary)
         return ret
 
+    def download_chart(self, t=None, crange_period: Union[str, Iterable[str]]=None,
+                       max_workers: Optional[int]=None, return_summary: bool=False):
+        return self._run_chart_tasks(
+            lambda chart: chart.download_tasks(t=t, crange_period=crange_period),
+            max_workers=max_workers, return_summary=return_summary)
+
+    def update_chart(self, t=None, crange_period=None, interval=None, force=False,
+                     max_workers: Optional[int]=None, return_summary: bool=False):
+        return self._run_chart_tasks(
+            lambda chart: chart.update_tasks(t=t, crange_period=crange_period, interval=interval, force=force),
+            max_workers=max_workers, return_summary=return_summary)
+
+    def sync_chart(self, t=None, crange_period=None, data_dir=None, interval=None, force=False,
+                   max_workers: Optional[int]=None, return_summary: bool=False):
+        return self._run_chart_tasks(
+            lambda chart: chart.sync_tasks(t=t, crange_period=crange_period, data_dir=data_dir, interval=interval, force=force),
+            max_workers=max_workers, return_summary=return_summary)
+
     def save(self):
         pass
 
@@ -361,7 +386,9 @@ class FX(SafeAttrABC):
 
         ts = np.arange(begin, end+dt, dt).astype(datetime)
 
-        wallet_hist = pd.DataFrame(columns=['JPY', 'BTC', 'r'])
+        # 一行ずつ DataFrame に追加すると毎回確保し直すのでリストに溜める
+        rows = []
+        index = []
         
         for t in ts:
             trade = self.apply(function, t)
@@ -370,25 +397,51 @@ class FX(SafeAttrABC):
                 print(trade)
                 if trade.x.code == 'JPY':
                     self['BTC'].buy(trade, t=t, permit=True)
-
-                    wallet_hist.loc[t] = (
-                        float(self.wallet['JPY'].q),
-                        float(self.wallet['BTC'].q),
-                        1 / float(trade.rate.r)
-                    )
+                    r = 1 / float(trade.rate.r)
                 else:
                     self['BTC'].sell(trade, t=t, permit=True)
-
-                    wallet_hist.loc[t] = (
-                        float(self.wallet['JPY'].q),
-                        float(self.wallet['BTC'].q),
-                        float(trade.rate.r)
-                    )
+                    r = float(trade.rate.r)
+
+                index.append(t)
+                rows.append((
+                    float(self.wallet['JPY'].q),
+                    float(self.wallet['BTC'].q),
+                    r
+                ))
                 print(self.wallet)
-                
+
+        wallet_hist = pd.DataFrame(rows, index=index, columns=['JPY', 'BTC', 'r'])
 
         return self.history, wallet_hist
 
+    def back_test_vectorized(self,
+                             function,
+                             t=None,
+                             key: str='BTC',
+                             crange_period=None,
+                             column: str='close',
+                             capital: Optional[float]=None,
+                             commission: float=0.0,
+                             lag: int=1,
+                             mode: str='fraction'):
+        """
+        Backtest a strategy which returns the target position over the whole chart at once.
+        function is called as function(df) with the chart of self[key] and must return
+        an array of the same length (see backtest.backtest for the meaning of the values).
+        The initial capital is the amount of the origin currency in the wallet if not given.
+        """
+        trader = self[key]
+        if crange_period is None:
+            crange_period = trader.chart.crange_period[0]
+
+        df = focus(trader.chart[crange_period].df, t)
+        target = function(df)
+
+        if capital is None:
+            capital = float(self.wallet[self.origin].q)
+
+        return backtest(df[column], target, capital=capital, commission=commission, lag=lag, mode=mode)
+
     # def execute(self, function):
     #     t = datetime.now()
         
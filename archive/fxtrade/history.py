@@ -9,11 +9,235 @@ from typing import Optional, Union, Iterable, List
 from io import StringIO
 
 from .core import is_instance_list
+from .matching import LotMatcher
+from .stock import Stock
 from .trade import Trade, TradePair
 from .safeattr import SafeAttrABC, immutable, protected
 from .timeseries import month_sections
 from .utils import focus, default_read_function, default_write_function, default_save_function
 
+class TradeLedger:
+    """
+    Append-only columnar buffer of normalized trades.
+
+    Each column is a growable numpy array whose capacity doubles, so adding a trade
+    is amortized O(1) and only the added rows are normalized.
+    The DataFrame (sorted by 't', same as History.normalize) is built lazily
+    and cached until the next change.
+    """
+    def __init__(self, capacity: int=16):
+        self._n = 0
+        self._capacity = capacity
+        # 't' は UTC の ns で持つ（tz-aware なら self._tz で戻す）
+        self._t = np.empty(capacity, dtype=np.int64)
+        self._tz = None
+        self._label = np.empty(capacity, dtype=np.int64)
+        self._objects = { col: np.empty(capacity, dtype=object) for col in Trade.columns if col != 't' }
+
+        # 物理的な並びが 't' で整列済みか、ラベルが 0, 1, ... と連番か
+        self._sorted = True
+        self._contiguous = True
+        self._frame = None
+
+    def __repr__(self):
+        return f"TradeLedger(n_trades={self._n}, capacity={self._capacity})"
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(['t'] + list(self._objects.keys()))
+
+    def _reserve(self, m: int):
+        if self._n + m <= self._capacity:
+            return
+        capacity = max(2 * self._capacity, self._n + m)
+
+        def grow(x, fill=None):
+            y = np.empty(capacity, dtype=x.dtype)
+            y[:self._n] = x[:self._n]
+            if fill is not None:
+                y[self._n:] = fill
+            return y
+
+        self._t = grow(self._t)
+        self._label = grow(self._label)
+        self._objects = { col: grow(x) for col, x in self._objects.items() }
+        self._capacity = capacity
+
+    def _order(self):
+        if self._sorted:
+            return slice(0, self._n)
+        return np.argsort(self._t[:self._n], kind='stable')
+
+    def _settle(self):
+        """
+        Rearrange the rows in the order of the frame and renumber the labels
+        before adding rows, same as pd.concat(...).reset_index(drop=True).
+        """
+        n = self._n
+        if not self._sorted:
+            perm = self._order()
+            self._t[:n] = self._t[:n][perm]
+            for x in self._objects.values():
+                x[:n] = x[:n][perm]
+            self._sorted = True
+            self._contiguous = False
+        if not self._contiguous:
+            self._label[:n] = np.arange(n)
+            self._contiguous = True
+
+    def _timestamps(self, ns: np.ndarray) -> pd.DatetimeIndex:
+        t = pd.DatetimeIndex(ns.view('datetime64[ns]'))
+        if self._tz is not None:
+            t = t.tz_localize('UTC').tz_convert(self._tz)
+        return t
+
+    def _append(self, t: pd.DatetimeIndex, values: dict):
+        m = len(t)
+        if m == 0:
+            return self
+
+        if self._n == 0 and self._tz is None:
+            self._tz = t.tz
+        elif (t.tz is None) != (self._tz is None):
+            raise TypeError("cannot mix tz-naive and tz-aware timestamps in a history.")
+        elif t.tz is not None:
+            t = t.tz_convert(self._tz)
+        ns = t.as_unit('ns').asi8
+
+        self._settle()
+        self._reserve(m)
+
+        n = self._n
+        if self._sorted:
+            self._sorted = ((n == 0) or (ns[0] >= self._t[n - 1])) and bool((ns[1:] >= ns[:-1]).all())
+
+        self._t[n:n + m] = ns
+        self._label[n:n + m] = np.arange(n, n + m)
+        for col in values:
+            if col not in self._objects:
+                # 追加情報の列は既存の行を NaN で埋める
+                x = np.empty(self._capacity, dtype=object)
+                x[:n] = np.nan
+                self._objects[col] = x
+        for col, x in self._objects.items():
+            x[n:n + m] = values[col] if col in values else np.nan
+
+        self._n = n + m
+        self._frame = None
+        return self
+
+    def append_frame(self, df: pd.DataFrame):
+        """
+        Append the rows of a normalized dataframe (see History.normalize).
+        """
+        t = pd.DatetimeIndex(df['t'])
+        values = { col: df[col].to_numpy(dtype=object) for col in df.columns if col != 't' }
+        return self._append(t, values)
+
+    def append_trades(self, trades: Iterable[Trade]):
+        """
+        Append trades without building a dataframe. The values are normalized
+        in the same way as History.normalize.
+        """
+        trades = list(trades)
+        values = {
+            'id': [ str(x.id) for x in trades ],
+            'from': [ str(x.x.code) for x in trades ],
+            'X(t)': [ Fraction(x.x.q) for x in trades ],
+            'to': [ str(x.y.code) for x in trades ],
+            'Y(t+dt)': [ Fraction(x.y.q) for x in trades ],
+            'R(yt/xt)': [ Fraction(x.rate.r) for x in trades ],
+        }
+        for i, x in enumerate(trades):
+            for k, v in x.info.items():
+                if k not in values:
+                    values[k] = [np.nan] * len(trades)
+                values[k][i] = v
+
+        t = pd.DatetimeIndex([ pd.Timestamp(x.t) for x in trades ])
+        values = { col: np.fromiter(v, dtype=object, count=len(v)) for col, v in values.items() }
+        return self._append(t, values)
+
+    def extend(self, other: TradeLedger):
+        """
+        Append all rows of other (already normalized) in the order of its frame.
+        """
+        perm = other._order()
+        values = { col: x[:other._n][perm] for col, x in other._objects.items() }
+        return self._append(other._timestamps(other._t[:other._n][perm]), values)
+
+    def drop(self, labels):
+        """
+        Drop the rows by label, same as DataFrame.drop.
+        """
+        n = self._n
+        labels = np.atleast_1d(np.asarray(labels, dtype=np.int64))
+        missing = np.setdiff1d(labels, self._label[:n])
+        if len(missing) != 0:
+            raise KeyError(f"{list(missing)} not found in axis")
+
+        keep = ~np.isin(self._label[:n], labels)
+        k = int(keep.sum())
+        self._t[:k] = self._t[:n][keep]
+        self._label[:k] = self._label[:n][keep]
+        for x in self._objects.values():
+            x[:k] = x[:n][keep]
+            x[k:n] = None
+
+        self._n = k
+        self._contiguous = False
+        self._frame = None
+        return self
+
+    def trades(self) -> List[Trade]:
+        """
+        Return the trades in the order of the frame without building a dataframe,
+        same as [ Trade.from_series(x) for _, x in frame().iterrows() ].
+        """
+        n = self._n
+        perm = self._order()
+        ts = self._timestamps(self._t[:n][perm])
+        columns = { col: x[:n][perm] for col, x in self._objects.items() }
+        info_columns = [ col for col in columns if col not in set(Trade.columns) ]
+
+        ret = []
+        for i, t in enumerate(ts):
+            info = { col: columns[col][i] for col in info_columns }
+            x = Stock(columns['from'][i], columns['X(t)'][i])
+            y = Stock(columns['to'][i], columns['Y(t+dt)'][i])
+            ret.append(Trade(x=x, y=y, t=t, id=columns['id'][i], **info))
+        return ret
+
+    def first_timestamp(self):
+        if self._n == 0:
+            return np.nan
+        return self._timestamps(self._t[:self._n].min(keepdims=True))[0]
+
+    def last_timestamp(self):
+        if self._n == 0:
+            return np.nan
+        return self._timestamps(self._t[:self._n].max(keepdims=True))[0]
+
+    def frame(self) -> pd.DataFrame:
+        if self._frame is not None:
+            return self._frame
+
+        if self._n == 0:
+            self._frame = pd.DataFrame([], columns=self.columns)
+            return self._frame
+
+        n = self._n
+        perm = self._order()
+        data = { 't': self._timestamps(self._t[:n][perm]) }
+        for col, x in self._objects.items():
+            data[col] = x[:n][perm]
+
+        self._frame = pd.DataFrame(data, index=pd.Index(self._label[:n][perm]))
+        return self._frame
+
 class History(SafeAttrABC):
     """
     Keep all transactions in a dataframe.
@@ -39,7 +263,7 @@ class History(SafeAttrABC):
         return Trade.string_columns
 
     @classmethod
-    def normalize(cls, df: pd.DataFrame) -> pd.DataFrame:
+    def normalize(cls, df: pd.DataFrame, sort: bool=True) -> pd.DataFrame:
         df = df.copy()
 
         columns = set(df.columns)
@@ -54,6 +278,8 @@ class History(SafeAttrABC):
         for col in cls.string_columns:
             df[col] = df[col].apply(str)
         
+        if not sort:
+            return df
         return df.sort_values('t')
     
     @classmethod
@@ -77,10 +303,7 @@ class History(SafeAttrABC):
         trade : Union[Trade, Iterable[Trade]], optional
             A trade or a list of trades.
         """
-        self.df = protected(
-            self.empty(),
-            type_=pd.DataFrame
-        )
+        self._ledger = TradeLedger()
 
         if trade is not None:
             self.add(trade)
@@ -106,6 +329,18 @@ class History(SafeAttrABC):
             ret = f.getvalue()
         return ret
 
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._ledger.frame()
+
+    @property
+    def _df(self) -> pd.DataFrame:
+        return self._ledger.frame()
+
+    @_df.setter
+    def _df(self, df: pd.DataFrame):
+        self._ledger = TradeLedger().append_frame(df)
+
     @property
     def df_float(self):
         df = self.df.copy()
@@ -116,18 +351,18 @@ class History(SafeAttrABC):
 
     @property
     def n_trades(self):
-        return len(self.df)
+        return len(self._ledger)
 
     @property
     def first_timestamp(self):
-        return self.df['t'].min()
+        return self._ledger.first_timestamp()
     
     @property
     def last_timestamp(self):
-        return self.df['t'].max()
+        return self._ledger.last_timestamp()
 
     def clear(self):
-        self._df = self.empty()
+        self._ledger = TradeLedger()
 
     def focus(self, t) -> History:
         return History(focus(self._df, t, column='t'))
@@ -148,24 +383,22 @@ class History(SafeAttrABC):
     def add(self, trade: Optional[Union[Trade, Iterable[Trade], pd.DataFrame, History]]) -> History:
         """
         Add a trade or a list of trades to the history.
+        Only the added trades are normalized and appended to the columnar buffer.
         """
         if trade is None:
             return self
         elif isinstance(trade, History):
-            df = trade.df
+            self._ledger.extend(trade._ledger)
         elif isinstance(trade, pd.DataFrame):
-            df = trade
+            self._ledger.append_frame(self.normalize(trade, sort=False))
         elif isinstance(trade, pd.Series):
-            df = pd.DataFrame([ trade ])
+            self._ledger.append_frame(self.normalize(pd.DataFrame([ trade ]), sort=False))
         elif isinstance(trade, Trade):
-            df = pd.DataFrame([ trade.as_series() ])
+            self._ledger.append_trades([ trade ])
         elif is_instance_list(trade, Trade):
-            df = pd.DataFrame([ t.as_series() for t in trade ])
+            self._ledger.append_trades(trade)
         else:
             raise TypeError("trade must be type of Trade or Iterable[Trade]")
-            
-        df = pd.concat([self._df, df]).reset_index(drop=True)
-        self._df = self.normalize(df)
 
         return self
     
@@ -173,7 +406,7 @@ class History(SafeAttrABC):
         """
         Drop the records which specified by idx.
         """
-        self._df = self.df.drop(idx)
+        self._ledger.drop(idx)
 
     def save(self, data_dir: Union[str, Path], save_function=None, save_fstring=None, save_iterator=None):
         if save_function is None:
@@ -221,22 +454,18 @@ class History(SafeAttrABC):
         """
         Return the index of previous trades that should be paired with given trade.
         """
-        df = self._df[(self._df['from'] == trade.y.code) & (self._df['to'] == trade.x.code)]
-        df = df[df['t'] <= trade.t].sort_values(by='R(yt/xt)', ascending=ascending)
+        df = self._df
+        df = df[(df['from'] == trade.y.code) & (df['to'] == trade.x.code) & (df['t'] <= trade.t)]
+        df = df.sort_values(by='R(yt/xt)', ascending=ascending, kind='stable')
         
         if len(df) == 0:
             return pd.Index([])
         
-        amount = trade.x
-        idx = []
-        for i, row in df.iterrows():
-            idx.append(i)
-            Yt = row['Y(t+dt)']
-            if Yt >= amount:
-                break
-            amount -= Yt
+        # 直前までの累計で trade.x に届いていない取引を全て使う
+        covered = np.cumsum(df['Y(t+dt)'].to_numpy(dtype=object)) >= trade.x.q
+        n = int(np.argmax(covered)) + 1 if covered.any() else len(df)
         
-        return df.loc[idx].index
+        return df.index[:n]
     
     def settle(self, trade: Trade, ascending: bool=True, copy: bool=True):
         pair_idx = self.get_pair_trade_index(trade, ascending)
@@ -244,43 +473,39 @@ class History(SafeAttrABC):
         if len(pair_idx) == 0:
             return self, None
         
-        report = Report()
+        matcher = LotMatcher(method='rate', ascending=ascending)
         for idx in pair_idx:
-            pair, trade = self[idx].settle(trade)
-            report.add(pair)
+            matcher.push(Trade.from_series(self._df.loc[idx]))
+        pairs, trade = matcher.settle(trade)
         
         hist = self if not copy else self.copy()
+        if copy:
+            # copy はラベルを振り直すので位置で対応させる
+            pair_idx = hist._df.index[self._df.index.get_indexer(pair_idx)]
         hist.drop(pair_idx)
+        hist.add(matcher.lots())
         hist.add(trade)
         
-        return hist, report
+        return hist, Report.from_pairs(pairs)
     
-    def close(self):
+    def close(self, method: str='rate', ascending: bool=True):
         """
         Divide trades to date into those with confirmed
         profits or losses and those that have yet to be confirmed.
+        The trades are matched in order of time with LotMatcher (see it for method and ascending).
         """
-        trade_list = self.as_trade_list(sort_by='t', ascending=True)
-        
-        hist = History()
+        matcher = LotMatcher(method=method, ascending=ascending)
+        pairs = matcher.match(self._ledger.trades())
         
-        hist.add(trade_list.pop(0))
-        
-        report = Report()
-        for trade in trade_list:
-            hist, settled = hist.settle(trade)
-            if settled is None:
-                hist.add(trade)
-            else:
-                report.add(settled)
+        hist = History(matcher.lots())
+        report = Report.from_pairs(pairs)
         
         return hist, report
     
     def group_by_code(self):
         df = self._df
         
-        group = [ '-'.join([row['from'], row['to']]) for _, row in df.iterrows() ]
-        group = pd.Series(group, index=df.index)
+        group = df['from'].astype(str) + '-' + df['to'].astype(str)
         
         return df.groupby(group)
     
@@ -289,73 +514,40 @@ class History(SafeAttrABC):
         
         df = df[(df['from'] == code_from) & (df['to'] == code_to)]
         
-        rate_mean = np.nan
-        if df['X(t)'].sum() != 0:
-            rate_mean = df['Y(t+dt)'].sum() / df['X(t)'].sum()
-
-        vmin = df['R(yt/xt)'].min()
-        mins = df[df['R(yt/xt)'] == vmin]
-
-        vmax = df['R(yt/xt)'].max()
-        maxs = df[df['R(yt/xt)'] == vmax]
-
-        return pd.Series([
-            code_from,
-            code_to,
-            Fraction(0),
-            Fraction(0),
-            df['X(t)'].sum(),
-            df['Y(t+dt)'].sum(),
-            rate_mean,
-            mins['X(t)'].sum(),
-            mins['Y(t+dt)'].sum(),
-            vmin,
-            maxs['X(t)'].sum(),
-            maxs['Y(t+dt)'].sum(),
-            vmax,
-        ], index=TradeSummary.columns)
+        table = summary_table(df)
+        if len(table) == 0:
+            return empty_summary(code_from, code_to)
+        return table.iloc[0]
     
     def summarize(self, origin: Optional[str]=None):
         hist, report = self.close()
         
+        # 未決済のポジションを (from, to) ごとに一度に集計しておく
+        table = summary_table(hist._df).set_index(['capital', 'via'], drop=False)
+        
         ret = []
         if len(report._df) != 0:
-            idx_dict = report.group_by_code().indices
-            for idx in idx_dict.values():
-                rep = report.df.loc[idx]
-
-                code_X = rep.iloc[0]['code_X']
-                code_Y = rep.iloc[0]['code_Y']
-
-                pos_idx = (hist._df['from'] == code_X) & (hist._df['to'] == code_Y)
-                pos = History(hist._df[pos_idx])
-                
-                desc = pos.describe(code_X, code_Y)
-                desc['used'] = float(rep['X(s)'].sum())
-                desc['earned'] = float(rep['Z(t+dt)'].sum())
-
+            rep = report._df
+            keys = ['code_X', 'code_Y', 'code_Z']
+            used = rep.groupby(keys, sort=True)['X(s)'].sum()
+            earned = rep.groupby(keys, sort=True)['Z(t+dt)'].sum()
+
+            for (code_X, code_Y, _), x, z in zip(used.index, used.to_numpy(), earned.to_numpy()):
+                if (code_X, code_Y) in table.index:
+                    desc = table.loc[(code_X, code_Y)].copy()
+                else:
+                    desc = empty_summary(code_X, code_Y)
+                desc['used'] = float(x)
+                desc['earned'] = float(z)
                 ret.append(desc)
         
         df = pd.DataFrame(ret, columns=TradeSummary.columns)
         
-        if len(hist._df) != 0:
-            ret = []
-            idx_dict = hist.group_by_code().indices
-            for idx in idx_dict.values():
-                rec = hist._df.loc[idx]
-
-                code_X = rec.iloc[0]['from']
-                code_Y = rec.iloc[0]['to']
-            
-                pos = df[(df['capital'] == code_X) & (df['via'] == code_Y)]
-                
-                if len(pos) != 0:
-                    break
-                
-                desc = History(rec).describe(code_X, code_Y)
-                ret.append(desc)
-            
-            df = pd.concat([df, pd.DataFrame(ret)], axis=0)
+        if len(table) != 0:
+            # 決済済みの行がないポジションだけを追加する
+            settled = set(zip(df['capital'], df['via']))
+            rest = [ key not in settled for key in table.index ]
+            df = pd.concat([df, table[rest]], axis=0)
         
         if origin is None:
             df = df.sort_values(by=['capital', 'via'])
@@ -380,6 +572,62 @@ class TradeSummary:
             'position_min', 'hold_min', 'rate_min', 'position_max', 'hold_max', 'rate_max',
         ])
 
+def empty_summary(code_from: str, code_to: str) -> pd.Series:
+    """
+    Summary of a pair of codes which has no trades.
+    """
+    return pd.Series([
+        code_from, code_to, Fraction(0), Fraction(0),
+        Fraction(0), Fraction(0), np.nan,
+        Fraction(0), Fraction(0), np.nan,
+        Fraction(0), Fraction(0), np.nan,
+    ], index=TradeSummary.columns)
+
+def summary_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize trades (columns of History) for each pair of codes (from, to) at once.
+    Return a dataframe of TradeSummary.columns with one row per pair, sorted by (capital, via).
+    'position' and 'hold' are the totals of X(t) and Y(t+dt), and '*_min' and '*_max'
+    are the totals of the trades at the minimum and maximum rate R(yt/xt) of the pair.
+    """
+    if len(df) == 0:
+        return pd.DataFrame([], columns=TradeSummary.columns)
+
+    # (from, to) を一度だけ分類してから数値の列を集計する
+    keys = pd.MultiIndex.from_arrays([df['from'].to_numpy(), df['to'].to_numpy()], names=['capital', 'via'])
+    codes, pairs = keys.factorize(sort=True)
+
+    x = pd.Series(df['X(t)'].to_numpy(dtype=object))
+    y = pd.Series(df['Y(t+dt)'].to_numpy(dtype=object))
+    r = pd.Series(df['R(yt/xt)'].to_numpy(dtype=object))
+
+    position = x.groupby(codes).sum()
+    hold = y.groupby(codes).sum()
+    rate_min = r.groupby(codes).min()
+    rate_max = r.groupby(codes).max()
+
+    is_min = (r.to_numpy() == rate_min.to_numpy()[codes])
+    is_max = (r.to_numpy() == rate_max.to_numpy()[codes])
+    zero = Fraction(0)
+
+    ret = pd.DataFrame({
+        'capital': pairs.get_level_values(0),
+        'via': pairs.get_level_values(1),
+        'used': zero,
+        'earned': zero,
+        'position': position.to_numpy(),
+        'hold': hold.to_numpy(),
+        'rate_mean': [ (h / p) if p != 0 else np.nan for p, h in zip(position, hold) ],
+        'position_min': x.where(is_min, zero).groupby(codes).sum().to_numpy(),
+        'hold_min': y.where(is_min, zero).groupby(codes).sum().to_numpy(),
+        'rate_min': rate_min.to_numpy(),
+        'position_max': x.where(is_max, zero).groupby(codes).sum().to_numpy(),
+        'hold_max': y.where(is_max, zero).groupby(codes).sum().to_numpy(),
+        'rate_max': rate_max.to_numpy(),
+    }, columns=TradeSummary.columns)
+
+    return ret
+
 class Report:
     @staticmethod
     def from_dataframe(df):
@@ -387,6 +635,15 @@ class Report:
         ret._df = df.copy()
         return ret
     
+    @staticmethod
+    def from_pairs(trade_pairs: Iterable[TradePair]):
+        """
+        Build a report from many trade pairs at once.
+        """
+        ret = Report()
+        ret._df = pd.DataFrame([ tp.as_list() for tp in trade_pairs ], columns=TradePair.columns)
+        return ret
+    
     def __init__(self, trade_pair: Optional[Union[TradePair, Iterable[TradePair]]]=None):
         self._df = pd.DataFrame([], columns=TradePair.columns)
         
@@ -427,7 +684,6 @@ class Report:
     def group_by_code(self):
         df = self._df
         
-        group = [ '-'.join([row['code_X'], row['code_Y'], row['code_Z']]) for _, row in df.iterrows() ]
-        group = pd.Series(group, index=df.index)
+        group = df['code_X'].astype(str) + '-' + df['code_Y'].astype(str) + '-' + df['code_Z'].astype(str)
         
         return df.groupby(group)
\ No newline at end of file
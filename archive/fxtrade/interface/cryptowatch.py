@@ -10,7 +10,7 @@ from ..api import CodePair, CRangePeriod, ChartAPI
 from ..timeseries import year_sections, month_sections, day_sections
 from ..utils import focus
 
-def get_chart(api_key, market, code_pair, chart_range, period):
+def get_chart(api_key, market, code_pair, chart_range, period, after=None, before=None):
     headers = {
         "X-CW-API-KEY": api_key,
     }
@@ -19,10 +19,20 @@ def get_chart(api_key, market, code_pair, chart_range, period):
         "periods": period,
     }
 
+    # 指定した時刻 (UNIX time) 以降/以前のローソク足だけを返してもらう
+    if after is not None:
+        query["after"] = int(after)
+    if before is not None:
+        query["before"] = int(before)
+
     url = f"https://api.cryptowat.ch/markets/{market}/{code_pair}/ohlc"
 
     return requests.request("GET", url, headers=headers, params=query)
 
+def to_unixtime(t):
+    # インデックスは datetime.fromtimestamp で作っているのでローカル時刻として変換する
+    return pd.Timestamp(t).to_pydatetime().timestamp()
+
 def response_to_dataframe(response):
     columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'quotevolume']
     new_columns = ['timestamp', 'open', 'close', 'high', 'low', 'volume']
@@ -122,12 +132,22 @@ class CryptowatchAPI(ChartAPI):
         if str(crange_period.period) not in self.periods:
             raise ValueError(f"interval '{crange_period.period}' not in {self.periods}")
 
+        after, before = None, None
+        if isinstance(t, datetime):
+            before = to_unixtime(t)
+        elif isinstance(t, (tuple, list)) and len(t) in (1, 2):
+            after = to_unixtime(t[0])
+            if len(t) == 2:
+                before = to_unixtime(t[1])
+
         response = get_chart(
             api_key=self.api_key,
             market='bitflyer',
             code_pair=code_pair,
             chart_range=crange_period.crange.s,
-            period=crange_period.period.seconds
+            period=crange_period.period.seconds,
+            after=after,
+            before=before
         )
 
         response.raise_for_status()
@@ -136,4 +156,4 @@ class CryptowatchAPI(ChartAPI):
             return response
         
         df = response_to_dataframe(response)
-        return focus(df, t)
\ No newline at end of file
+        return focus(df, t, copy=False)
\ No newline at end of file
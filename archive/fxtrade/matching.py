@@ -0,0 +1,104 @@
+"""
+Matching of open lots (positions) with the trades that close them.
+"""
+import heapq
+import itertools
+
+import pandas as pd
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .trade import Trade, TradePair
+
+METHODS = ('rate', 'fifo', 'lifo')
+
+class LotMatcher:
+    """
+    Keep open lots in a heap for each pair of codes (from, to) and settle trades against them.
+
+    A trade from code A to code B closes the lots from B to A. The lots are consumed in the order of
+    - 'rate': R(yt/xt) of the lot (ascending or descending, same as History.get_pair_trade_index)
+    - 'fifo': the oldest lot first
+    - 'lifo': the newest lot first
+    and ties are broken by the order in which the lots were added.
+    Settling a trade which consumes k lots takes O(k log n).
+    """
+    def __init__(self, method: str='rate', ascending: bool=True):
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS} but actual '{method}'.")
+
+        self._method = method
+        self._ascending = ascending
+        self._heaps: Dict[Tuple[str, str], list] = {}
+        self._counter = itertools.count()
+
+    def __repr__(self):
+        return f"LotMatcher(method='{self._method}', ascending={self._ascending}, n_lots={self.n_lots})"
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def n_lots(self) -> int:
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def _priority(self, lot: Trade):
+        if self._method == 'rate':
+            r = lot.rate.r
+            return r if self._ascending else -r
+        t = pd.Timestamp(lot.t).value
+        return t if self._method == 'fifo' else -t
+
+    def push(self, lot: Trade):
+        """
+        Add an open lot.
+        """
+        heap = self._heaps.setdefault((lot.x.code, lot.y.code), [])
+        seq = next(self._counter)
+        heapq.heappush(heap, (self._priority(lot), seq, lot))
+
+    def settle(self, trade: Trade) -> Tuple[List[TradePair], Optional[Trade]]:
+        """
+        Close the lots with trade and return the settled pairs and the unsettled rest of trade
+        (None if trade is fully settled). The rest is not added as a lot.
+        Same as Trade.settle applied repeatedly to the lots in order.
+        """
+        heap = self._heaps.get((trade.y.code, trade.x.code))
+
+        pairs = []
+        while heap and (trade is not None):
+            priority, seq, lot = heap[0]
+            if lot.y > trade.x:
+                # ロットの一部だけを決済して残りは同じ順位のまま戻す
+                settled, unsettled = lot.split(trade.x)
+                pairs.append(TradePair(settled, trade))
+                heap[0] = (priority, seq, unsettled)
+                return pairs, None
+
+            heapq.heappop(heap)
+            pair, trade = lot.settle(trade)
+            pairs.append(pair)
+
+        return pairs, trade
+
+    def match(self, trades: Iterable[Trade]) -> List[TradePair]:
+        """
+        Process trades in the given order (they should be sorted by time).
+        Each trade closes the open lots, and the unsettled rest becomes a new lot.
+        Return all settled pairs, same as History.close.
+        """
+        ret = []
+        for trade in trades:
+            pairs, rest = self.settle(trade)
+            ret.extend(pairs)
+            if rest is not None:
+                self.push(rest)
+        return ret
+
+    def lots(self) -> List[Trade]:
+        """
+        Return the open lots in the order in which they were added.
+        """
+        entries = sorted(itertools.chain.from_iterable(self._heaps.values()), key=lambda x: x[1])
+        return [ lot for _, _, lot in entries ]
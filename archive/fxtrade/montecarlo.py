@@ -0,0 +1,70 @@
+"""
+Monte Carlo estimation of the distribution of strategy P&L over synthetic price paths.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from .backtest import backtest, METRIC_COLUMNS
+from .brownian import Brownian, path_chunks, simulate_chunk
+
+def _run_chunk(strategy, loc, scale, n, n_steps, x0, distribution, seed, index, settings):
+    paths = simulate_chunk(loc, scale, n, n_steps, x0=x0, distribution=distribution, seed=seed)
+
+    rows = np.empty((n, len(METRIC_COLUMNS)))
+    for i, path in enumerate(paths):
+        df = pd.DataFrame({'close': np.power(10.0, path)}, index=index)
+        result = backtest(df['close'], strategy(df), **settings)
+        rows[i] = result.metrics[METRIC_COLUMNS].to_numpy(dtype=float)
+
+    return rows
+
+def monte_carlo(strategy: Callable[[pd.DataFrame], Any],
+                brownian: Brownian,
+                n_paths: int,
+                n_steps: int,
+                dt: Optional[timedelta]=None,
+                x0: Optional[float]=None,
+                begin: Optional[datetime]=None,
+                distribution: str='laplace',
+                seed=None,
+                chunk_size: Optional[int]=None,
+                n_jobs: int=1,
+                **kwargs) -> pd.DataFrame:
+    """
+    Backtest strategy over n_paths paths simulated with the fitted brownian
+    and return the metrics of each path.
+
+    strategy is called with a DataFrame which has only 'close' column of a path
+    and returns the target position (see backtest.backtest).
+    Each chunk of paths is generated in the worker process from its own seed,
+    so only the parameters are sent and the result does not depend on n_jobs.
+    strategy must be picklable to use n_jobs > 1.
+    kwargs are passed to backtest (capital, commission, lag, mode).
+    """
+    loc, scale = brownian.params(dt)
+    dt = brownian.dt if dt is None else pd.Timedelta(dt)
+    if x0 is None:
+        x0 = brownian.x0
+    if begin is None:
+        begin = brownian.end
+
+    index = pd.date_range(begin, periods=n_steps + 1, freq=dt)
+    chunks = path_chunks(n_paths, n_steps, seed=seed, chunk_size=chunk_size)
+    tasks = [ (strategy, loc, scale, n, n_steps, x0, distribution, s, index, kwargs) for n, s in chunks ]
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if (n_jobs is None) or (n_jobs <= 1) or (len(tasks) <= 1):
+        results = [ _run_chunk(*task) for task in tasks ]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_run_chunk, *zip(*tasks)))
+
+    ret = pd.DataFrame(np.concatenate(results), columns=METRIC_COLUMNS)
+    ret.index.name = 'path'
+    return ret
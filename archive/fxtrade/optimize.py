@@ -0,0 +1,254 @@
+"""
+Parameter search of strategies over a process pool.
+
+A strategy factory is called with a parameter set and returns a function
+which maps a chart DataFrame to the target position (see backtest.backtest).
+The chart is published once into shared memory which the worker processes
+attach to, and the results are yielded as soon as each backtest completes.
+"""
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .backtest import backtest, METRIC_COLUMNS
+from .sharedmem import SharedArrays
+
+# (train_begin, train_end, test_begin, test_end) の行番号（半開区間）
+Split = Tuple[int, int, int, int]
+
+def grid(space: Mapping[str, Iterable]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield all combinations of the parameters.
+    """
+    keys = list(space.keys())
+    for values in itertools.product(*[ list(space[key]) for key in keys ]):
+        yield dict(zip(keys, values))
+
+def _sample(rng: np.random.Generator, spec):
+    if callable(spec):
+        return spec(rng)
+    if isinstance(spec, tuple) and len(spec) in (2, 3):
+        low, high = spec[0], spec[1]
+        scale = spec[2] if len(spec) == 3 else 'linear'
+        if scale == 'log':
+            return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        if isinstance(low, (int, np.integer)) and isinstance(high, (int, np.integer)):
+            return int(rng.integers(low, high, endpoint=True))
+        return float(rng.uniform(low, high))
+    if isinstance(spec, (list, np.ndarray, pd.Index)):
+        return spec[rng.integers(len(spec))]
+    raise TypeError(f"unsupported search space '{spec}'.")
+
+def random_search(space: Mapping[str, Any], n_iter: int, seed: Optional[int]=None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield n_iter parameter sets sampled from space.
+
+    Each value of space is one of
+        - list: choose one of the values uniformly.
+        - (low, high): uniform on [low, high], integers if both are int.
+        - (low, high, 'log'): log-uniform on [low, high].
+        - callable: called with numpy.random.Generator.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(n_iter):
+        yield { key: _sample(rng, spec) for key, spec in space.items() }
+
+def walk_forward_splits(n: int, train: int, test: int, step: Optional[int]=None, anchored: bool=True) -> List[Split]:
+    """
+    Split n rows into consecutive (train, test) windows.
+    anchored=True grows the training window from the first row (walk-forward),
+    anchored=False keeps its length (rolling window).
+    step is the shift of each window and defaults to test.
+    """
+    if (train < 0) or (test <= 0):
+        raise ValueError(f"train must be non-negative and test must be positive but actual train={train}, test={test}.")
+    step = test if step is None else step
+    if step <= 0:
+        raise ValueError(f"step must be positive but actual {step}.")
+
+    ret = []
+    test_begin = train
+    while test_begin + test <= n:
+        train_begin = 0 if anchored else test_begin - train
+        ret.append((train_begin, test_begin, test_begin, test_begin + test))
+        test_begin += step
+    return ret
+
+def rolling_splits(n: int, train: int, test: int, step: Optional[int]=None) -> List[Split]:
+    return walk_forward_splits(n, train, test, step=step, anchored=False)
+
+def evaluate(factory: Callable[..., Callable[[pd.DataFrame], Any]],
+             df: pd.DataFrame,
+             params: Mapping[str, Any],
+             split: Optional[Split]=None,
+             column: str='close',
+             **kwargs) -> pd.Series:
+    """
+    Backtest factory(**params) on the test window of split and return the metrics.
+
+    The strategy is called with the train and test windows together so that
+    its indicators are warmed up, and fit(train) is called first if it has one.
+    Only the test window is traded.
+    """
+    if split is None:
+        split = (0, 0, 0, len(df))
+    train_begin, train_end, test_begin, test_end = split
+
+    strategy = factory(**params)
+    if hasattr(strategy, 'fit'):
+        strategy.fit(df.iloc[train_begin:train_end])
+
+    window = df.iloc[train_begin:test_end]
+    target = strategy(window)
+    if isinstance(target, pd.Series):
+        target = target.reindex(window.index)
+    target = np.asarray(target, dtype=float)[test_begin - train_begin:]
+
+    result = backtest(window[column].iloc[test_begin - train_begin:], target, **kwargs)
+    return result.metrics
+
+# ワーカープロセスごとに一度だけ受け取るデータ
+_worker_state = {}
+
+def _init_worker(factory, df, settings):
+    _worker_state['factory'] = factory
+    _worker_state['df'] = df
+    _worker_state['settings'] = settings
+
+def _attach_worker(factory, descriptor, settings):
+    # 共有メモリを参照するだけなので、ワーカーを増やしてもチャートは複製されない
+    shared = SharedArrays.attach(descriptor)
+    _worker_state['shared'] = shared
+    _init_worker(factory, shared.to_frame(), settings)
+
+def _run_task(params, split):
+    begin = time.perf_counter()
+    try:
+        metrics = evaluate(_worker_state['factory'], _worker_state['df'], params, split,
+                           **_worker_state['settings'])
+        error = None
+    except Exception as e:
+        metrics, error = None, repr(e)
+    return params, split, metrics, time.perf_counter() - begin, error
+
+class Optimizer:
+    """
+    Run backtests of the parameter sets over the splits in parallel.
+
+    Parameters
+    ----------
+    factory : callable
+        factory(**params) returns a strategy, which is a function of the chart
+        returning the target position. Must be picklable to use n_jobs > 1
+        (defined at the top level of a module).
+    df : pandas.DataFrame
+        Chart shared by all backtests.
+    splits : list of (train_begin, train_end, test_begin, test_end), optional
+        Made by walk_forward_splits or rolling_splits. The whole chart if None.
+    objective : str, default 'sharpe'
+        Metric to be maximized by best.
+    n_jobs : int, default 1
+        Number of worker processes, -1 for all cores.
+    shared : bool, default True
+        Publish the chart into shared memory which the workers attach to.
+        Needs numeric columns; if False, the chart is pickled once per worker.
+    **kwargs
+        Passed to evaluate (column) and backtest (capital, commission, lag, mode).
+    """
+    def __init__(self,
+                 factory: Callable[..., Callable[[pd.DataFrame], Any]],
+                 df: pd.DataFrame,
+                 splits: Optional[List[Split]]=None,
+                 objective: str='sharpe',
+                 n_jobs: int=1,
+                 shared: bool=True,
+                 **kwargs):
+        self.factory = factory
+        self.df = df
+        self.splits = [ (0, 0, 0, len(df)) ] if splits is None else list(splits)
+        self.objective = objective
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.shared = shared
+        self.settings = kwargs
+
+    def __repr__(self):
+        return f"Optimizer(factory={getattr(self.factory, '__name__', self.factory)}, n_splits={len(self.splits)}, objective='{self.objective}', n_jobs={self.n_jobs})"
+
+    def _row(self, params, split_id, split, metrics, elapsed, error):
+        row = dict(params)
+        row['split'] = split_id
+        row['test_begin'] = self.df.index[split[2]]
+        row['test_end'] = self.df.index[split[3] - 1]
+        # 失敗しても列が揃うようにする
+        row.update(metrics.to_dict() if metrics is not None else dict.fromkeys(METRIC_COLUMNS, np.nan))
+        row['elapsed'] = elapsed
+        row['error'] = error
+        return row
+
+    def imap(self, params: Iterable[Mapping[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield a result row for each (params, split) in the order of completion.
+        """
+        tasks = [ (dict(p), i, split) for p in params for i, split in enumerate(self.splits) ]
+
+        if (self.n_jobs is None) or (self.n_jobs <= 1):
+            _init_worker(self.factory, self.df, self.settings)
+            try:
+                for p, i, split in tasks:
+                    _, _, metrics, elapsed, error = _run_task(p, split)
+                    yield self._row(p, i, split, metrics, elapsed, error)
+            finally:
+                _worker_state.clear()
+            return
+
+        shared = SharedArrays.from_frame(self.df) if self.shared else None
+        if shared is not None:
+            initializer, initargs = _attach_worker, (self.factory, shared.descriptor, self.settings)
+        else:
+            initializer, initargs = _init_worker, (self.factory, self.df, self.settings)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=initializer, initargs=initargs) as executor:
+                futures = { executor.submit(_run_task, p, split): i for p, i, split in tasks }
+                for future in as_completed(futures):
+                    p, split, metrics, elapsed, error = future.result()
+                    yield self._row(p, futures[future], split, metrics, elapsed, error)
+        finally:
+            if shared is not None:
+                shared.close()
+
+    def run(self,
+            params: Iterable[Mapping[str, Any]],
+            path: Optional[Union[str, Path]]=None,
+            callback: Optional[Callable[[Dict[str, Any]], None]]=None) -> pd.DataFrame:
+        """
+        Run all and return the results table.
+        Each row is appended to the csv file of path and passed to callback as soon as it completes.
+        """
+        rows = []
+        for row in self.imap(params):
+            rows.append(row)
+            if path is not None:
+                path = Path(path)
+                pd.DataFrame([row]).to_csv(path, mode='a', header=not path.exists(), index=False)
+            if callback is not None:
+                callback(row)
+
+        return pd.DataFrame(rows)
+
+    def best(self, results: pd.DataFrame, keys: Optional[List[str]]=None) -> pd.DataFrame:
+        """
+        Average the objective over the splits for each parameter set and sort in descending order.
+        """
+        if keys is None:
+            # パラメータは split より前の列
+            keys = list(results.columns[:results.columns.get_loc('split')])
+        ok = results[results['error'].isna()]
+        return ok.groupby(keys)[self.objective].agg(['mean', 'std', 'count']).sort_values('mean', ascending=False)
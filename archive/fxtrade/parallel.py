@@ -0,0 +1,115 @@
+"""
+Utilities to run board operations concurrently.
+"""
+import threading
+import time
+
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+SUMMARY_COLUMNS = ['rows', 'elapsed', 'error']
+
+class RateLimiter:
+    """
+    Allow at most `calls` calls in every `period` seconds.
+    One instance can be shared between boards and threads.
+    """
+    def __init__(self, calls: int=1, period: float=1.0):
+        if calls <= 0:
+            raise ValueError(f"calls must be positive but actual {calls}.")
+        if period < 0:
+            raise ValueError(f"period must be non-negative but actual {period}.")
+
+        self._calls = calls
+        self._period = period
+        self._lock = threading.Lock()
+        self._history = []
+
+    def __repr__(self):
+        return f"RateLimiter(calls={self._calls}, period={self._period})"
+
+    @property
+    def calls(self):
+        return self._calls
+
+    @property
+    def period(self):
+        return self._period
+
+    def acquire(self):
+        """
+        Block until a call is allowed.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._history = [ t for t in self._history if now - t < self._period ]
+                if len(self._history) < self._calls:
+                    self._history.append(now)
+                    return
+                wait = self._period - (now - self._history[0])
+            time.sleep(max(wait, 0))
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+def count_rows(x) -> int:
+    """
+    Number of rows in the result of a board operation.
+    """
+    if x is None:
+        return 0
+    return len(x)
+
+def run_tasks(tasks: Iterable[Tuple[Hashable, Callable[[], Any]]],
+              max_workers: Optional[int]=None,
+              rows: Callable[[Any], int]=count_rows) -> Tuple[Dict[Hashable, Any], pd.DataFrame]:
+    """
+    Run (key, function) pairs with a bounded thread pool.
+
+    Return the results and the summary indexed by key,
+    which has rows, elapsed seconds and the error raised (or None).
+    A board which raised has no entry in the results.
+    """
+    tasks = list(tasks)
+
+    def timed(function):
+        begin = time.perf_counter()
+        try:
+            ret = function()
+        except Exception as e:
+            return None, time.perf_counter() - begin, e
+        return ret, time.perf_counter() - begin, None
+
+    if (max_workers == 1) or (len(tasks) <= 1):
+        outcomes = [ timed(function) for _, function in tasks ]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [ executor.submit(timed, function) for _, function in tasks ]
+            outcomes = [ future.result() for future in futures ]
+
+    ret = {}
+    summary = []
+    for (key, _), (x, elapsed, error) in zip(tasks, outcomes):
+        if error is None:
+            ret[key] = x
+        summary.append([rows(x) if error is None else 0, elapsed, error])
+
+    summary = pd.DataFrame(summary, columns=SUMMARY_COLUMNS,
+                           index=pd.Index([ key for key, _ in tasks ], tupleize_cols=False))
+
+    return ret, summary
+
+def raise_first_error(summary: pd.DataFrame):
+    """
+    Raise the first error collected in the summary if any.
+    """
+    errors = summary['error'].dropna()
+    if len(errors) > 0:
+        raise errors.iloc[0]
@@ -0,0 +1,284 @@
+"""
+Manifest of the partition files which a board saves into its data directory.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+MANIFEST_NAME = 'manifest.json'
+
+def checksum(path: Union[str, Path], chunk_size: int=1 << 20) -> str:
+    """
+    Return sha1 hex digest of the file.
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _parse_range(t) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """
+    Interpret t as same as utils.focus and return (begin, end).
+    """
+    if isinstance(t, (datetime, np.datetime64)):
+        return None, pd.Timestamp(t)
+    elif isinstance(t, (tuple, list)) and len(t) == 1:
+        return pd.Timestamp(t[0]), None
+    elif isinstance(t, (tuple, list)) and len(t) == 2:
+        return pd.Timestamp(t[0]), pd.Timestamp(t[1])
+    raise TypeError(f"t must be instance of datetime or Tuple[datetime, datetime] but actual type '{type(t)}'.")
+
+class Manifest:
+    """
+    Keep path, min/max timestamp, row count and checksum of each partition
+    so that a time range query can open only the overlapping partitions.
+    """
+    @classmethod
+    def path_of(cls, dir_path: Union[str, Path]) -> Path:
+        return Path(dir_path) / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, dir_path: Union[str, Path]) -> 'Manifest':
+        """
+        Return the manifest saved in dir_path, or an empty one if not exists or broken.
+        """
+        path = cls.path_of(dir_path)
+
+        entries, gaps, resolved = {}, [], []
+        if path.exists():
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                entries = data['partitions']
+                gaps = data.get('gaps', [])
+                resolved = data.get('resolved', [])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # 壊れている場合は作り直す
+                entries, gaps, resolved = {}, [], []
+
+        return Manifest(dir_path, entries, gaps, resolved)
+
+    def __init__(self,
+                 dir_path: Union[str, Path],
+                 entries: Optional[dict]=None,
+                 gaps: Optional[Iterable[Tuple[str, str]]]=None,
+                 resolved: Optional[Iterable[Tuple[str, str]]]=None):
+        self._dir_path = Path(dir_path)
+        self._entries = {}
+        self._bounds = {}
+        self._gaps = []
+        self._resolved = []
+
+        if entries is not None:
+            for name, entry in entries.items():
+                self._set(name, entry)
+        if gaps is not None:
+            self._gaps = [ (pd.Timestamp(b), pd.Timestamp(e)) for b, e in gaps ]
+        if resolved is not None:
+            self._resolved = [ (pd.Timestamp(b), pd.Timestamp(e)) for b, e in resolved ]
+
+    def __repr__(self):
+        return f"Manifest(dir_path='{self._dir_path}', n_partitions={len(self)})"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        return self._entries[name]
+
+    @property
+    def dir_path(self):
+        return self._dir_path
+
+    @property
+    def names(self):
+        return sorted(self._entries.keys())
+
+    @property
+    def bounds(self) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        Minimum and maximum timestamp over all partitions.
+        """
+        if len(self._bounds) == 0:
+            return None
+        return (min(b[0] for b in self._bounds.values()),
+                max(b[1] for b in self._bounds.values()))
+
+    def gaps(self, t=None) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        Return the known missing spans which overlap with t.
+        """
+        if t is None:
+            return list(self._gaps)
+
+        begin, end = _parse_range(t)
+        return [ (b, e) for b, e in self._gaps
+                 if ((begin is None) or (e >= begin)) and ((end is None) or (b <= end)) ]
+
+    def update_gaps(self, begin, end, gaps: Iterable[Tuple[datetime, datetime]]):
+        """
+        Replace the missing spans in [begin, end] with gaps.
+        The spans sticking out of [begin, end] are clipped.
+        """
+        begin, end = pd.Timestamp(begin), pd.Timestamp(end)
+
+        ret = []
+        for b, e in self._gaps:
+            if b < begin:
+                ret.append((b, min(e, begin - pd.Timedelta(1))))
+            if e > end:
+                ret.append((max(b, end + pd.Timedelta(1)), e))
+        ret.extend((pd.Timestamp(b), pd.Timestamp(e)) for b, e in gaps
+                   if not self.is_resolved(b, e))
+
+        self._gaps = sorted(ret)
+        return self
+
+    @property
+    def resolved(self) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        Missing spans for which the server returned nothing.
+        """
+        return list(self._resolved)
+
+    def is_resolved(self, begin, end) -> bool:
+        begin, end = pd.Timestamp(begin), pd.Timestamp(end)
+        return any(b <= begin and end <= e for b, e in self._resolved)
+
+    def resolve(self, begin, end):
+        """
+        Record [begin, end] as a span which the server does not fill (maintenance, no trades, ...)
+        and remove it from the missing spans so that it is not requested again.
+        """
+        begin, end = pd.Timestamp(begin), pd.Timestamp(end)
+        self.update_gaps(begin, end, [])
+        if not self.is_resolved(begin, end):
+            self._resolved = sorted(self._resolved + [(begin, end)])
+        return self
+
+    def _set(self, name, entry):
+        self._entries[name] = entry
+        if entry.get('min') is None:
+            self._bounds.pop(name, None)
+        else:
+            self._bounds[name] = (pd.Timestamp(entry['min']), pd.Timestamp(entry['max']))
+
+    def _drop(self, name):
+        del self._entries[name]
+        self._bounds.pop(name, None)
+
+    def save(self) -> Path:
+        path = self.path_of(self._dir_path)
+        tmp_path = path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'partitions': self._entries,
+                'gaps': [ [b.isoformat(), e.isoformat()] for b, e in self._gaps ],
+                'resolved': [ [b.isoformat(), e.isoformat()] for b, e in self._resolved ],
+            }, f, indent=2, sort_keys=True)
+        tmp_path.replace(path)
+
+        return path
+
+    def update(self, path: Union[str, Path], df: pd.DataFrame):
+        """
+        Register the partition which has just been written from df.
+        """
+        path = Path(path)
+        stat = path.stat()
+        idx = df.index
+
+        # 空のパーティションも記録しておく（範囲を持たないので select では選ばれない）
+        self._set(path.name, {
+            'min': pd.Timestamp(idx.min()).isoformat() if len(df) != 0 else None,
+            'max': pd.Timestamp(idx.max()).isoformat() if len(df) != 0 else None,
+            'rows': int(len(df)),
+            'checksum': checksum(path),
+            'size': int(stat.st_size),
+            'mtime_ns': int(stat.st_mtime_ns),
+        })
+
+        return self
+
+    def is_fresh(self, path: Union[str, Path]) -> bool:
+        """
+        Whether the entry of path still describes the file on disk.
+        """
+        path = Path(path)
+        entry = self._entries.get(path.name)
+        if entry is None:
+            return False
+
+        stat = path.stat()
+        return (entry['size'] == stat.st_size) and (entry['mtime_ns'] == stat.st_mtime_ns)
+
+    def verify(self, path: Union[str, Path]) -> bool:
+        """
+        Whether the content of path matches with the checksum recorded.
+        """
+        path = Path(path)
+        entry = self._entries.get(path.name)
+        if entry is None:
+            return False
+        return entry['checksum'] == checksum(path)
+
+    def refresh(self,
+                paths: Iterable[Union[str, Path]],
+                read_function: Callable[[Path], pd.DataFrame]) -> bool:
+        """
+        Drop entries of removed files and index new or modified files.
+        Return True if the manifest has been changed.
+        """
+        paths = [ Path(path) for path in paths ]
+        names = { path.name for path in paths }
+
+        changed = False
+        for name in list(self._entries.keys()):
+            if name not in names:
+                self._drop(name)
+                changed = True
+
+        for path in paths:
+            if self.is_fresh(path):
+                continue
+            self.update(path, read_function(path))
+            changed = True
+
+        return changed
+
+    def select(self, paths: Iterable[Union[str, Path]], t=None) -> List[Path]:
+        """
+        Return the partitions which overlap with t.
+        t is interpreted as same as utils.focus.
+        """
+        paths = [ Path(path) for path in paths ]
+
+        if t is None:
+            return [ path for path in paths if path.name in self._bounds ]
+
+        begin, end = _parse_range(t)
+
+        ret = []
+        for path in paths:
+            bounds = self._bounds.get(path.name)
+            if bounds is None:
+                continue
+            vmin, vmax = bounds
+            if (begin is not None) and (vmax < begin):
+                continue
+            if (end is not None) and (vmin > end):
+                continue
+            ret.append(path)
+
+        return ret
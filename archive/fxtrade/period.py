@@ -1,10 +1,15 @@
 import re
 
+import numpy as np
+import pandas as pd
+
 from datetime import timedelta
 from typing import Union
 
 from .core import type_checked
 
+NS = 1_000_000_000
+
 UNITS = {
     's': 1,
     'm': 60,
@@ -86,6 +91,24 @@ DIVISORS = [
         '60S', '30S', '20S', '15S', '10S', '5S', '1S',
     ]
 
+def to_ns(x) -> np.ndarray:
+    """
+    Convert timestamps (datetime64 array, DatetimeIndex, Timestamp or int64 nanoseconds)
+    to int64 nanoseconds since Unix epoch. Time zone aware timestamps are converted as UTC.
+    """
+    if isinstance(x, pd.DatetimeIndex):
+        x = x.as_unit('ns') if x.tz is None else x.tz_convert(None).as_unit('ns')
+        return x.asi8
+    if isinstance(x, (pd.Series, pd.Index)):
+        return to_ns(pd.DatetimeIndex(x))
+
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        return x.astype('datetime64[ns]').view('int64')
+    if x.dtype.kind == 'O':
+        return to_ns(pd.DatetimeIndex(np.atleast_1d(x))).reshape(x.shape)
+    return x.astype('int64', copy=False)
+
 def is_divisor(s):
     if s in DIVISORS:
         return True
@@ -93,13 +116,51 @@ def is_divisor(s):
     return False
 
 class Period:
-    def __init__(self, s: str):
+    """
+    Interned immutable period such as '1h' or 'max'.
+
+    Period(s) returns the same object for the same s, and the parsed quantity, unit,
+    the width in seconds and nanoseconds and the hash are computed once.
+    Regular periods define a grid of width ns from origin (Unix epoch),
+    and floor, ceil, bucket_id and is_aligned work on datetime64 (or int64 nanoseconds) arrays.
+    """
+    __slots__ = ('_s', '_t', '_u', '_seconds', '_ns', '_origin', '_hash')
+
+    _cache = {}
+
+    def __new__(cls, s: str):
         if isinstance(s, Period):
             s = s.s
-        
-        self._s = type_checked(s, str)
-        self._t, self._u = parse(self._s)
-        self._seconds = to_seconds(self._s)
+
+        key = (cls, s)
+        self = cls._cache.get(key)
+        if self is not None:
+            return self
+
+        s = type_checked(s, str)
+        t, u = parse(s)
+        seconds = to_seconds(s)
+
+        self = object.__new__(cls)
+        object.__setattr__(self, '_s', s)
+        object.__setattr__(self, '_t', t)
+        object.__setattr__(self, '_u', u)
+        object.__setattr__(self, '_seconds', seconds)
+        object.__setattr__(self, '_ns', seconds * NS if seconds > 0 else -1)
+        object.__setattr__(self, '_origin', 0)
+        # 同じ長さの周期（'1d' と '24h'）は等しいので hash も長さで揃える
+        object.__setattr__(self, '_hash', hash(seconds) if seconds >= 0 else hash(s))
+
+        return cls._cache.setdefault(key, self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __reduce__(self):
+        return (self.__class__, (self._s,))
     
     @property
     def s(self):
@@ -116,23 +177,80 @@ class Period:
     @property
     def seconds(self):
         return self._seconds
+
+    @property
+    def ns(self) -> int:
+        """
+        Width of the period in nanoseconds (-1 if not regular).
+        """
+        return self._ns
+
+    @property
+    def origin(self) -> int:
+        """
+        Origin of the grid in nanoseconds since Unix epoch.
+        """
+        return self._origin
+
+    @property
+    def timedelta(self) -> pd.Timedelta:
+        return pd.Timedelta(self._grid_ns(), unit='ns')
     
     def __repr__(self):
-        return f"Period('{self.s}')"
+        return f"{self.__class__.__name__}('{self.s}')"
     
     def __str__(self):
         return self.s
 
     def copy(self):
-        return Period(self.s)
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def is_regular(self):
         return self.seconds >= 0
 
+    def _grid_ns(self) -> int:
+        if self._ns <= 0:
+            raise ValueError(f"period must be regular but actual '{self}'.")
+        return self._ns
+
+    def bucket_id(self, x) -> np.ndarray:
+        """
+        Index of the grid cell which contains each timestamp, as int64 array.
+        """
+        return (to_ns(x) - self._origin) // self._grid_ns()
+
+    def floor(self, x) -> np.ndarray:
+        """
+        Floor each timestamp onto the grid, as datetime64[ns] array.
+        """
+        ns = self._grid_ns()
+        return (((to_ns(x) - self._origin) // ns) * ns + self._origin).view('datetime64[ns]')
+
+    def ceil(self, x) -> np.ndarray:
+        """
+        Ceil each timestamp onto the grid, as datetime64[ns] array.
+        """
+        ns = self._grid_ns()
+        return ((-((self._origin - to_ns(x)) // ns)) * ns + self._origin).view('datetime64[ns]')
+
+    def is_aligned(self, x) -> np.ndarray:
+        """
+        Boolean array which is True where the timestamp is on the grid.
+        """
+        return (to_ns(x) - self._origin) % self._grid_ns() == 0
+
     def __hash__(self):
-        return hash(self.s)
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, int):
             return self.seconds == other
         elif isinstance(other, Period):
@@ -159,19 +277,43 @@ class Period:
         raise TypeError(f"comparing is not supported between {self.__class__.__name__} and {type(other)}.")
     
 class CRange(Period):
-    def __init__(self, s: str):
-        super().__init__(s)
-    
-    def __repr__(self):
-        return f"CRange('{self.s}')"
+    __slots__ = ()
 
 class CRangePeriod:
-    def __init__(self, crange: str, period: str):
-        self._crange = CRange(crange)
-        self._period = Period(period)
+    """
+    Interned immutable pair of CRange and Period.
+    """
+    __slots__ = ('_crange', '_period', '_short', '_hash')
 
-        if self._period.seconds == -1:
-            raise ValueError(f"unrecognized period '{self._period}'.")
+    _cache = {}
+
+    def __new__(cls, crange: str, period: str):
+        key = tuple(x.s if isinstance(x, Period) else x for x in (crange, period))
+        self = cls._cache.get(key)
+        if self is not None:
+            return self
+
+        crange, period = CRange(crange), Period(period)
+        if period.seconds == -1:
+            raise ValueError(f"unrecognized period '{period}'.")
+
+        self = object.__new__(cls)
+        object.__setattr__(self, '_crange', crange)
+        object.__setattr__(self, '_period', period)
+        object.__setattr__(self, '_short', '-'.join([crange.s, period.s]))
+        # 文字列とも比較できるように short の hash を使う
+        object.__setattr__(self, '_hash', hash(self._short))
+
+        return cls._cache.setdefault(key, self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __reduce__(self):
+        return (self.__class__, (self._crange.s, self._period.s))
     
     @property
     def crange(self):
@@ -188,16 +330,24 @@ class CRangePeriod:
         return f"CRangePeriod(crange='{self.crange.s}', period='{self.period.s}')"
     
     def copy(self):
-        return CRangePeriod(self.crange, self.period)
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
     
     @property
     def short(self):
-        return '-'.join([self.crange.s, self.period.s])
+        return self._short
 
     def __hash__(self):
-        return hash(self.short)
+        return self._hash
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, str):
             return self.short == other
         elif isinstance(other, CRangePeriod):
@@ -0,0 +1,219 @@
+"""
+Rolling statistics and Laplace distribution over plain numpy arrays.
+
+The results are the same as pandas.Series.rolling(window) with min_periods=window
+(NaN until the window is filled or while it contains NaN).
+"""
+import numpy as np
+import pandas as pd
+
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Iterable, Optional, Tuple
+
+# これ以下の窓はずらした配列を足し合わせる（累積和の差より誤差が小さく、NaN もそのまま伝播する）
+SMALL_WINDOW = 16
+
+# sliding_window_view に対して一度に計算する要素数の上限
+ROLLING_CHUNK_ELEMENTS = 1 << 22
+
+def _check_window(window: int):
+    if window <= 0:
+        raise ValueError(f"window must be positive but actual {window}.")
+
+def _windows(x: np.ndarray, window: int, function) -> np.ndarray:
+    """
+    Apply function(view, axis=1) to each full window in chunks and pad the head with NaN.
+    """
+    ret = np.full(len(x), np.nan)
+    if len(x) < window:
+        return ret
+
+    view = sliding_window_view(x, window)
+    size = max(1, ROLLING_CHUNK_ELEMENTS // window)
+    for i in range(0, len(view), size):
+        ret[window - 1 + i:window - 1 + i + size] = function(view[i:i + size], axis=1)
+    return ret
+
+def _shifted(x: np.ndarray, window: int):
+    """
+    Yield the k-th element of each full window as an array for k in range(window).
+    """
+    n = len(x)
+    for k in range(window):
+        yield x[k:n - window + 1 + k]
+
+def _padded(x: np.ndarray, window: int, values: np.ndarray) -> np.ndarray:
+    ret = np.full(len(x), np.nan)
+    ret[window - 1:] = values
+    return ret
+
+def _nan_count(x: np.ndarray, window: int) -> np.ndarray:
+    c = np.cumsum(np.isnan(x), dtype=np.int64)
+    ret = c.copy()
+    ret[window:] -= c[:-window]
+    return ret
+
+def rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    _check_window(window)
+    x = np.asarray(x, dtype=float)
+    if len(x) < window:
+        return np.full(len(x), np.nan)
+
+    if window <= SMALL_WINDOW:
+        ys = _shifted(x, window)
+        acc = next(ys).copy()
+        for y in ys:
+            acc += y
+        return _padded(x, window, acc)
+
+    nan = np.isnan(x)
+    has_nan = nan.any()
+    c = np.cumsum(np.where(nan, 0.0, x) if has_nan else x)
+    ret = np.empty_like(c)
+    ret[window - 1] = c[window - 1]
+    np.subtract(c[window:], c[:-window], out=ret[window:])
+    ret[:window - 1] = np.nan
+    if has_nan:
+        ret[_nan_count(x, window) > 0] = np.nan
+    return ret
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    return rolling_sum(x, window) / window
+
+def rolling_var(x: np.ndarray, window: int, ddof: int=1) -> np.ndarray:
+    _check_window(window)
+    x = np.asarray(x, dtype=float)
+
+    if len(x) < window:
+        return np.full(len(x), np.nan)
+
+    if window <= SMALL_WINDOW:
+        # 窓ごとの平均からの偏差の二乗和（2 パス）
+        mean = rolling_sum(x, window)[window - 1:] / window
+        acc = np.zeros_like(mean)
+        for y in _shifted(x, window):
+            d = y - mean
+            acc += d * d
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return _padded(x, window, acc / (window - ddof))
+
+    # 桁落ちを抑えるために全体の平均を引いてから二乗和を取る
+    center = np.nanmean(x) if np.isfinite(x).any() else 0.0
+    y = x - center
+    s1 = rolling_sum(y, window)
+    s2 = rolling_sum(y * y, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = (s2 - s1 * s1 / window) / (window - ddof)
+    return np.maximum(ret, 0.0)
+
+def rolling_std(x: np.ndarray, window: int, ddof: int=1) -> np.ndarray:
+    return np.sqrt(rolling_var(x, window, ddof=ddof))
+
+def rolling_median(x: np.ndarray, window: int) -> np.ndarray:
+    _check_window(window)
+    return _windows(np.asarray(x, dtype=float), window, np.median)
+
+def laplace_mle(x: np.ndarray) -> Tuple[float, float]:
+    """
+    Maximum likelihood estimate (loc, scale) of Laplace distribution, ignoring NaN.
+    Same as analysis.estimate_laplace_param.
+    """
+    x = np.asarray(x, dtype=float)
+    loc = np.nanmedian(x)
+    return loc, np.nanmean(np.abs(x - loc))
+
+def laplace_cdf(x: np.ndarray, loc: float=0.0, scale: float=1.0) -> np.ndarray:
+    """
+    Same as scipy.stats.laplace.cdf.
+    """
+    z = (np.asarray(x, dtype=float) - loc) / scale
+    return np.where(z < 0, 0.5 * np.exp(np.minimum(z, 0)), 1 - 0.5 * np.exp(-np.maximum(z, 0)))
+
+def laplace_probability(x: np.ndarray, loc: float=0.0, scale: float=1.0) -> np.ndarray:
+    """
+    Probability that a value farther from loc than x occurs,
+    2 * laplace.cdf(-|x - loc|, scale=scale) = exp(-|x - loc| / scale).
+    """
+    return np.exp(-np.abs(np.asarray(x, dtype=float) - loc) / scale)
+
+def index_step(index: Iterable) -> pd.Timedelta:
+    """
+    Given an equally spaced time index, return the interval.
+    Raise ValueError if the intervals are not the same.
+    """
+    ts = pd.DatetimeIndex(index).values.astype('datetime64[ns]').view('int64')
+    dts = np.diff(ts)
+    if (len(dts) == 0) or (dts != dts[0]).any():
+        raise ValueError("all timedelta must be the same")
+    return pd.Timedelta(int(dts[0]), unit='ns')
+
+class LogReturns:
+    """
+    log10 price and its first-order difference of a price series, computed once
+    and shared by the Laplace estimation and the probability of each window.
+    """
+    def __init__(self, xs: pd.Series):
+        self._xs = xs
+        self._index = xs.index
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._log = np.log10(xs.to_numpy(dtype=float))
+        self._diff = np.empty_like(self._log)
+        self._diff[:1] = np.nan
+        np.subtract(self._log[1:], self._log[:-1], out=self._diff[1:])
+        self._step = None
+        self._laplace = None
+
+    def __repr__(self):
+        return f"LogReturns(name={self._xs.name}, length={len(self._log)})"
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def log(self) -> np.ndarray:
+        return self._log
+
+    @property
+    def diff(self) -> np.ndarray:
+        return self._diff
+
+    @property
+    def step(self) -> pd.Timedelta:
+        if self._step is None:
+            self._step = index_step(self._index)
+        return self._step
+
+    def laplace_param(self) -> Tuple[float, float]:
+        if self._laplace is None:
+            self._laplace = laplace_mle(self._diff)
+        return self._laplace
+
+    def brown_param(self) -> float:
+        """
+        Scale of the Brownian motion per second, same as analysis.estimate_brown_param.
+        """
+        return self.laplace_param()[1] / np.sqrt(self.step.total_seconds())
+
+    def probability(self, window: int=1, loc: Optional[float]=None, scale: Optional[float]=None) -> np.ndarray:
+        """
+        Same as analysis.estimate_probability(diff, window, loc, scale).
+        """
+        ys = rolling_sum(self._diff, window)
+        if loc is None:
+            loc = np.nanmedian(ys)
+        if scale is None:
+            scale = self.brown_param() * np.sqrt((window * self.step).total_seconds())
+        return laplace_probability(ys, loc, scale)
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Same as analysis.analyze.
+        """
+        df = pd.DataFrame(index=self._index)
+        df['dt'] = self._index - self._index[0]
+        df[self._xs.name] = self._xs
+        df['log'] = self._log
+        df['diff'] = self._diff
+        df['prob'] = self.probability()
+        return df
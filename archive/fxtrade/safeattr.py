@@ -128,7 +128,53 @@ def immutable(value, type_=None, *, f=None, optional=False, copy=False):
 def protected(value, type_=None, *, f=None, optional=False, copy=False):
     return Protected(value, type_, f=f, optional=optional, copy=copy)
 
+class ArgSelector:
+    """
+    Descriptor of the method 'arg_x' which returns the argument if given, or the attribute 'x'.
+    It is installed once on the class when 'x' is first managed.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._hidden_name = '_safeattr_' + name
+
+    def __repr__(self):
+        return f"ArgSelector({self._name})"
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return MethodType(self._select, obj)
+
+    def _select(self, obj, x=None, f=None, typecheck=True):
+        if x is None:
+            return getattr(obj, self._name)
+
+        attr = getattr(obj, self._hidden_name)
+        if f is not None:
+            # 型キャストが指定されていれば適用
+            x = f(x)
+        elif attr.f is not None:
+            # 定義時に指定されたキャストあれば適用
+            x = attr.f(x)
+
+        # 必要なキャストは行われているはずなので f=None でよい
+        if typecheck:
+            return attr._typecheck(x, attr.type, f=None, optional=attr.optional)
+
+        return x
+
 class SafeAttrABC(ABC):
+    """
+    Base class whose attributes assigned with typed, immutable or protected are managed.
+
+    For a managed attribute 'x', the Typed is kept in '_safeattr_x' and its value is
+    stored as plain instance attributes 'x' and '_x'. Reading them is an ordinary attribute
+    access with no overhead, and only assignments go through __setattr__:
+
+    - typed: 'x' and '_x' can be rewritten with type checking
+    - protected: only '_x' can be rewritten with type checking
+    - immutable: neither can be rewritten
+    """
     @staticmethod
     def typed(x, type_=None, *, f=None, optional=False, copy=False):
         return Typed(x, type_, f=f, optional=optional, copy=copy)
@@ -140,168 +186,73 @@ class SafeAttrABC(ABC):
     @staticmethod
     def protected(x, type_=None, *, f=None, optional=False, copy=False):
         return Protected(x, type_, f=f, optional=optional, copy=copy)
-    
-    def _safeattr_derive(self):
-        if self.is_safeattr_derived_class:
-            return
-        
+
+    def _safeattr_store(self, name, attr):
+        # 値はふつうのインスタンス属性として持つので読み出しは通常の属性アクセスと同じ速さになる
+        # （__dict__ を直接触るとインスタンス属性の最適化が効かなくなるので object.__setattr__ を使う）
+        object.__setattr__(self, '_safeattr_' + name, attr)
+        self._safeattr_update(name, attr)
+
+    def _safeattr_update(self, name, attr):
+        value = attr._value
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_' + name, value)
+
+    def _safeattr_register(self, name, attr):
         cls = self.__class__
-        super().__setattr__('_is_safeattr_derived_class', True)
-        super().__setattr__('__class__', type(cls.__name__, (cls,), {}))
-    
-    def __init__(self):
-        self._safeattr_derive()
-    
-    @property
-    def is_safeattr_derived_class(self):
-        if not hasattr(self, '_is_safeattr_derived_class'):
-            return False
-        return self._is_safeattr_derived_class
-    
-    def __getattribute__(self, name):
-        if not name.startswith('_') or name.startswith('_safeattr_'):
-            # 隠蔽されたメンバに対するアクセスではないか、
-            # 隠蔽されたメンバの実体に対する直アクセス
-            return super().__getattribute__(name)
-        
-        # ユーザが隠蔽されたメンバ '_x' にアクセスするときは '_safeattr_x' が実体になる
-        try:
-            # 実体を探してみて存在すればそこから読み取って返す
-            hidden_name = '_safeattr' + name
-            ret = super().__getattribute__(hidden_name)
-            if isinstance(ret, Typed):
-                return ret.value
-            return ret
-        except AttributeError:
-            # なければ '_x' というメンバにアクセスしてみる
-            return super().__getattribute__(name)
+        if not isinstance(cls.__dict__.get('arg_' + name), ArgSelector):
+            # クラスごとに一度だけ arg_x を追加する
+            setattr(cls, 'arg_' + name, ArgSelector(name))
+        self._safeattr_store(name, attr)
 
     def __setattr__(self, name, value):
-        # 隠蔽されていないメンバに対するアクセスで Typed を使わない
-        if not name.startswith('_') and not isinstance(value, Typed):
-            # 通常通りの挙動
-            # または管理下にあるものの場合は property の setter が呼び出される
-            super().__setattr__(name, value)
-            return
-        
-        # name が '_x' の形式か、value が Typed のインスタンス
-
         if name.startswith('_safeattr_'):
             # SafeAttr の管理下にあることを示す予約変数名
             # そのままのアクセスを許すが、
             # ユーザが直に書き換えてもそれだけでは管理対象とはならない
-            super().__setattr__(name, value)
+            object.__setattr__(self, name, value)
+            return
 
         if name.startswith('_'):
             # ユーザがアクセスしようとしているメンバは隠蔽されており、
             # SafeAttr の管理下にあるかもしれない
-            hidden_name = '_safeattr' + name
-            if not hasattr(self, hidden_name):
+            attr = getattr(self, '_safeattr' + name, None)
+            if attr is None:
                 # SafeAttrABC の管理下にない '_x' という名前の変数名である
-                super().__setattr__(name, value)
+                object.__setattr__(self, name, value)
+            elif isinstance(attr, Immutable):
+                # 書き換え不能なメンバを書き換えようとしている
+                raise AttributeError(f"immutable attribute '{name}' cannot be rewritten.")
+            elif isinstance(attr, Typed):
+                # 型付きのメンバを書き換えようとしているので書き換えを試行する（型チェックが入る）
+                attr.value = value
+                self._safeattr_update(name[1:], attr)
             else:
-                # SafeAttrABC の管理下にあるかもしれない
-                # 少なくとも '_safeattr_x' という名前のメンバが存在している
-                attr = getattr(self, hidden_name)
-                if isinstance(attr, Immutable):
-                    # 書き換え不能なメンバを書き換えようとしている
-                    raise AttributeError(f"immutable attribute '{name}' cannot be rewritten.")
-                elif isinstance(attr, Typed):
-                    # 型付きのメンバを書き換えようとしているので書き換えを試行する（型チェックが入る）
-                    attr.value = value
-                else:
-                    # 存在するものの Typed で管理していないメンバにアクセスしようとしている
-                    super().__setattr__(hidden_name, value)
+                # 存在するものの Typed で管理していないメンバにアクセスしようとしている
+                object.__setattr__(self, '_safeattr' + name, value)
             return
-        
-        # 変数名が '_x' という形式である可能性はここまでで省いた
+
         # ここから変数名は 'x' のように '_' で始まらない形式である
-        # ユーザは通常のメンバを SafeAttrABC の管理下に置こうとしている
+        attr = getattr(self, '_safeattr_' + name, None)
+        if isinstance(attr, Immutable):
+            # immutable を書き換えようとしたからエラー
+            raise AttributeError(f"immutable attribute '{name}' cannot be rewritten.")
+        elif isinstance(attr, Protected):
+            # protected に通常の名前でアクセスして書き換えようとしたのでエラー
+            raise AttributeError(f"protected attribute '{name}' cannot be rewritten.")
+        elif isinstance(attr, Typed):
+            # typed は書き込みを許可する（Typed が渡されたら unwrap される）
+            attr.value = value
+            self._safeattr_update(name, attr)
+        elif isinstance(value, Typed):
+            # ユーザは通常のメンバを SafeAttrABC の管理下に置こうとしている
+            self._safeattr_register(name, value)
+        else:
+            # 通常通りの挙動
+            object.__setattr__(self, name, value)
 
-        # SafeAttrABC の管理下に置かれるメンバの本体は隠蔽される
-        hidden_name = '_safeattr_' + name
-        
-        if hasattr(self, hidden_name):
-            # 既に隠蔽されたメンバが存在している
-            attr = getattr(self, hidden_name)
-            if isinstance(attr, Immutable):
-                # immutable を書き換えようとしたからエラー
-                raise AttributeError(f"immutable attribute '{name}' cannot be rewritten.")
-            elif isinstance(attr, Protected):
-                # protected に通常の名前でアクセスして書き換えようとしたのでエラー
-                raise AttributeError(f"protected attribute '{name}' cannot be rewritten.")
-            elif isinstance(attr, Typed):
-                # typed は隠蔽されたメンバに対する書き込みは許可する
-                attr.value = value
-                return
-
-        # 隠蔽されたメンバは存在しなかった、
-        # あるいは隠蔽されたメンバは管理下になかったのでそのまま上書きするのだが、
-        # 上書きした時点で '_x' という名前のメンバは unreachable になるので消しておく
-        # （下手したらメモリリークとかするかもしれないので）
-        _name = '_' + name
-        if hasattr(self, _name):
-            super().__delattr__(_name)
-        super().__setattr__(hidden_name, value)
-        
-        # 管理のためのプロパティを追加する（これを行うことで管理下に入る）
-        
-        # プロパティの動的な追加はクラスを書き換えるしかないので、
-        # 同じ名前の子クラスを作って自身の親をその子クラスにする
-        self._safeattr_derive()
-        
-        # 取得に対してはラッピングを解除すればよい
-        def getter_of(name):
-            def getter(self):
-                value = getattr(self, '_safeattr_' + name)
-                return value.value
-            return getter
-        
-        # 上書きに対しては若干複雑になる
-        def setter_of(name):
-            def setter(self, value):
-                attr = getattr(self, '_safeattr_' + name)
-                if isinstance(attr, Immutable):
-                    # immutable を書き換えようとしているのでエラー
-                    raise AttributeError(f"immutable attribute '{name}' cannot be rewritten.")
-                elif isinstance(attr, Protected):
-                    # protected に通常の名前でアクセスして書き換えようとしていたのでエラー
-                    raise AttributeError(f"protected attribute '{name}' cannot be rewritten.")
-                
-                if not isinstance(attr, Typed):
-                    # 管理下にあるはずなのにここで Typed でなかったら
-                    # 直アクセスとかで変な値を入れられている
-                    raise RuntimeError(f"Unrecognized typed attribute: '{name}' of type {type(name)}.")
-                
-                # Typed の書き込みは許可する
-                attr.value = value                
-
-            return setter
-        
-        # getter と setter をセットする
-        setattr(self.__class__, name, property(getter_of(name), setter_of(name)))
-        
-        # メソッドの引数を優先して返す
-        def selector_of(name):
-            def arg_override(self, x=None, f=None, typecheck=True):
-                if x is None:
-                    return getattr(self, name)
-
-                attr = getattr(self, '_safeattr_' + name)
-                if f is not None:
-                    # 型キャストが指定されていれば適用
-                    x = f(x)
-                elif attr.f is not None:
-                    # 定義時に指定されたキャストあれば適用
-                    x = attr.f(x)
-                
-                # 必要なキャストは行われているはずなので f=None でよい
-                if typecheck:
-                    return attr._typecheck(x, attr.type, f=None, optional=attr.optional)
-                    
-                return x
-                
-            return arg_override
-        
-        # arg_override を追加する
-        super().__setattr__('arg_' + name, MethodType(selector_of(name), self))
+    def __delattr__(self, name):
+        key = name[1:] if name.startswith('_') else name
+        if hasattr(self, '_safeattr_' + key):
+            raise AttributeError(f"managed attribute '{name}' cannot be deleted.")
+        object.__delattr__(self, name)
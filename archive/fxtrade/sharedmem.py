@@ -0,0 +1,235 @@
+"""
+Read-only arrays shared between processes without pickling.
+
+The owner publishes arrays once into a multiprocessing.shared_memory block
+(or memory-mapped .npy files) and sends the small descriptor to the workers,
+which attach to the same memory as numpy views.
+"""
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Union
+
+# 各配列の先頭をキャッシュラインに揃える
+ALIGNMENT = 64
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+class SharedDescriptor:
+    """
+    Picklable description of SharedArrays, which is sent to the workers instead of the data.
+    entries maps each key to (dtype, shape, offset) in the shared memory block,
+    or to (dtype, shape, file name) for memory-mapped files.
+    """
+    def __init__(self,
+                 name: str,
+                 entries: Dict[str, Tuple[str, Tuple[int, ...], Union[int, str]]],
+                 frame: Optional[dict]=None,
+                 path: Optional[str]=None):
+        self.name = name
+        self.entries = entries
+        self.frame = frame
+        self.path = path
+
+    def __repr__(self):
+        return f"SharedDescriptor(name='{self.name}', keys={list(self.entries.keys())}, path={self.path})"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for dtype, shape, _ in self.entries.values())
+
+class SharedArrays:
+    """
+    Named read-only arrays in shared memory.
+
+    Use create (or from_frame) in the owner process and attach with the descriptor
+    in the workers. Only the owner unlinks the memory, on close or at the end of the with block.
+    """
+    @classmethod
+    def create(cls, arrays: Mapping[str, np.ndarray], path: Optional[Union[str, Path]]=None,
+               frame: Optional[dict]=None) -> 'SharedArrays':
+        """
+        Copy arrays into a new shared memory block, or into .npy files in path
+        which are memory-mapped by the workers.
+        """
+        arrays = { key: np.ascontiguousarray(value) for key, value in arrays.items() }
+
+        if path is not None:
+            path = Path(path)
+            path.mkdir(parents=True, exist_ok=True)
+            entries = {}
+            for i, (key, value) in enumerate(arrays.items()):
+                file_name = f"{i}.npy"
+                np.save(path / file_name, value)
+                entries[key] = (value.dtype.str, value.shape, file_name)
+            return cls(SharedDescriptor(path.name, entries, frame=frame, path=str(path)), owner=True)
+
+        entries = {}
+        size = 0
+        for key, value in arrays.items():
+            entries[key] = (value.dtype.str, value.shape, size)
+            size = _aligned(size + value.nbytes)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        descriptor = SharedDescriptor(shm.name, entries, frame=frame)
+        for key, value in arrays.items():
+            dtype, shape, offset = entries[key]
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = value
+
+        return cls(descriptor, shm=shm, owner=True)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, path: Optional[Union[str, Path]]=None) -> 'SharedArrays':
+        """
+        Publish a DataFrame with DatetimeIndex (or any numeric index) and numeric columns.
+        The columns of the same dtype are stored as one 2-D block so that to_frame
+        can rebuild the DataFrame without copying.
+        """
+        groups = {}
+        for column, dtype in df.dtypes.items():
+            if not (np.issubdtype(dtype, np.number) or np.issubdtype(dtype, np.bool_)):
+                raise TypeError(f"column '{column}' must be numeric but actual dtype '{dtype}'.")
+            groups.setdefault(np.dtype(dtype).str, []).append(column)
+
+        arrays = {}
+        blocks = []
+        for i, (dtype, columns) in enumerate(groups.items()):
+            arrays[f"__block{i}__"] = np.stack([ df[c].to_numpy(dtype=dtype) for c in columns ])
+            blocks.append(columns)
+
+        index = df.index
+        if isinstance(index, pd.DatetimeIndex):
+            # 単位（ns, us など）とタイムゾーンもそのまま戻す
+            arrays['__index__'] = index.values.view('int64')
+            index_dtype = index.values.dtype.str
+            tz = None if index.tz is None else str(index.tz)
+        else:
+            arrays['__index__'] = index.to_numpy()
+            index_dtype, tz = None, None
+
+        frame = {
+            'columns': list(df.columns),
+            'blocks': blocks,
+            'index_dtype': index_dtype,
+            'index_tz': tz,
+            'index_name': index.name,
+        }
+        return cls.create(arrays, path=path, frame=frame)
+
+    @classmethod
+    def attach(cls, descriptor: SharedDescriptor) -> 'SharedArrays':
+        if descriptor.path is not None:
+            return cls(descriptor)
+        return cls(descriptor, shm=shared_memory.SharedMemory(name=descriptor.name))
+
+    def __init__(self, descriptor: SharedDescriptor, shm: Optional[shared_memory.SharedMemory]=None, owner: bool=False):
+        self._descriptor = descriptor
+        self._shm = shm
+        self._owner = owner
+        self._arrays = {}
+
+        for key, (dtype, shape, location) in descriptor.entries.items():
+            if descriptor.path is not None:
+                value = np.load(Path(descriptor.path) / location, mmap_mode='r')
+            else:
+                value = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=location)
+                value.setflags(write=False)
+            self._arrays[key] = value
+
+    def __repr__(self):
+        return f"SharedArrays(descriptor={self._descriptor}, owner={self._owner})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self._arrays[key]
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def keys(self):
+        return [ key for key in self._arrays.keys() if not key.startswith('__') ]
+
+    @property
+    def descriptor(self) -> SharedDescriptor:
+        return self._descriptor
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Rebuild the DataFrame published by from_frame as views of the shared memory.
+        """
+        frame = self._descriptor.frame
+        if frame is None:
+            raise ValueError("arrays are not published by from_frame.")
+
+        values = self._arrays['__index__']
+        if frame['index_dtype'] is not None:
+            index = pd.DatetimeIndex(values.view(frame['index_dtype']), name=frame['index_name'])
+            if frame['index_tz'] is not None:
+                index = index.tz_localize('UTC').tz_convert(frame['index_tz'])
+        else:
+            index = pd.Index(values, name=frame['index_name'])
+
+        parts = [ pd.DataFrame(self._arrays[f"__block{i}__"].T, index=index, columns=columns, copy=False)
+                  for i, columns in enumerate(frame['blocks']) ]
+        if len(parts) == 0:
+            return pd.DataFrame(index=index)
+
+        df = parts[0] if len(parts) == 1 else pd.concat(parts, axis=1, copy=False)
+        if list(df.columns) != frame['columns']:
+            # dtype ごとの並びが元の列順と違う場合だけは並べ替えでコピーされる
+            df = df[frame['columns']]
+        return df
+
+    def close(self):
+        """
+        Detach, and release the memory if this is the owner.
+        """
+        self._arrays = {}
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # to_frame などのビューが残っている間は閉じられないので、参照が消えたときに解放される
+                pass
+            if self._owner:
+                self._shm.unlink()
+            self._shm = None
+        elif self._owner and (self._descriptor.path is not None):
+            path = Path(self._descriptor.path)
+            for _, _, file_name in self._descriptor.entries.values():
+                (path / file_name).unlink(missing_ok=True)
+            if path.exists() and not any(path.iterdir()):
+                path.rmdir()
+        self._owner = False
+
+# ワーカープロセスで attach したもの
+_attached = {}
+
+def _attach(descriptor: SharedDescriptor):
+    _attached['arrays'] = SharedArrays.attach(descriptor)
+
+def _call(function, x):
+    return function(_attached['arrays'], x)
+
+def map_shared(function: Callable[[SharedArrays, Any], Any],
+               shared: SharedArrays,
+               xs: Iterable[Any],
+               max_workers: Optional[int]=None) -> Iterator[Any]:
+    """
+    Return function(arrays, x) for each x computed in worker processes,
+    where arrays is attached to shared in each worker.
+    function must be picklable (defined at the top level of a module).
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=(shared.descriptor, )) as executor:
+        yield from executor.map(partial(_call, function), xs)
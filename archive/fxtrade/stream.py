@@ -0,0 +1,392 @@
+"""
+Incremental indicators which are updated in O(1) per new bar.
+
+Each operator has the same semantics as the batch version in analysis,
+so that a live strategy can keep the state instead of recomputing
+the whole chart history every time a bar arrives.
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from .analysis import estimate_laplace_param
+
+def _is_nan(x) -> bool:
+    return (x is None) or (isinstance(x, float) and math.isnan(x))
+
+def _to_time(t):
+    return None if t is None else pd.Timestamp(t)
+
+def _from_time(t):
+    return None if t is None else pd.Timestamp(t).isoformat()
+
+class Operator(ABC):
+    """
+    Stateful indicator. update(t, *xs) consumes one bar and returns the current value.
+    """
+    @abstractmethod
+    def update(self, t, *xs) -> float:
+        pass
+
+    @property
+    def value(self):
+        return self._value
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return JSON serializable state.
+        """
+        pass
+
+    @abstractmethod
+    def restore(self, state: Dict[str, Any]) -> 'Operator':
+        pass
+
+class Log10(Operator):
+    def __init__(self):
+        self._value = np.nan
+
+    def __repr__(self):
+        return "Log10()"
+
+    def update(self, t, x):
+        self._value = np.nan if _is_nan(x) else math.log10(x)
+        return self._value
+
+    def snapshot(self):
+        return {'value': self._value}
+
+    def restore(self, state):
+        self._value = state['value']
+        return self
+
+class Diff(Operator):
+    """
+    Same as pandas.Series.diff().
+    """
+    def __init__(self):
+        self._prev = np.nan
+        self._value = np.nan
+
+    def __repr__(self):
+        return "Diff()"
+
+    def update(self, t, x):
+        self._value = x - self._prev
+        self._prev = x
+        return self._value
+
+    def snapshot(self):
+        return {'prev': self._prev, 'value': self._value}
+
+    def restore(self, state):
+        self._prev = state['prev']
+        self._value = state['value']
+        return self
+
+class LogDiff(Operator):
+    """
+    Difference of log10 from the previous bar.
+    """
+    def __init__(self):
+        self._log = Log10()
+        self._diff = Diff()
+        self._value = np.nan
+
+    def __repr__(self):
+        return "LogDiff()"
+
+    def update(self, t, x):
+        self._value = self._diff.update(t, self._log.update(t, x))
+        return self._value
+
+    def snapshot(self):
+        return {'log': self._log.snapshot(), 'diff': self._diff.snapshot()}
+
+    def restore(self, state):
+        self._log.restore(state['log'])
+        self._diff.restore(state['diff'])
+        self._value = self._diff.value
+        return self
+
+class EMA(Operator):
+    """
+    Time-decayed exponential moving average, same as analysis.emaverage.
+    NaN inputs are skipped (the value is kept).
+    """
+    def __init__(self, alpha: float, dt: pd.Timedelta):
+        self._alpha = alpha
+        self._dt = pd.Timedelta(dt)
+        self._molecule = 0.0
+        self._denominator = 0.0
+        self._last = None
+        self._value = np.nan
+
+    def __repr__(self):
+        return f"EMA(alpha={self._alpha}, dt={self._dt})"
+
+    def update(self, t, x):
+        if _is_nan(x):
+            return self._value
+
+        t = pd.Timestamp(t)
+        if self._last is None:
+            beta = 0.0
+        else:
+            beta = self._alpha ** ((t - self._last) / self._dt)
+
+        self._molecule = self._molecule * beta + x
+        self._denominator = self._denominator * beta + 1
+        self._last = t
+
+        self._value = self._molecule / self._denominator
+        return self._value
+
+    def snapshot(self):
+        return {
+            'molecule': self._molecule,
+            'denominator': self._denominator,
+            'last': _from_time(self._last),
+            'value': self._value,
+        }
+
+    def restore(self, state):
+        self._molecule = state['molecule']
+        self._denominator = state['denominator']
+        self._last = _to_time(state['last'])
+        self._value = state['value']
+        return self
+
+class RollingSum(Operator):
+    """
+    Same as pandas.Series.rolling(window).sum(), NaN until window values without NaN are given.
+    """
+    def __init__(self, window: int):
+        if window <= 0:
+            raise ValueError(f"window must be positive but actual {window}.")
+        self._window = window
+        self._xs = deque(maxlen=window)
+        self._sum = 0.0
+        self._n_nan = 0
+        self._value = np.nan
+
+    def __repr__(self):
+        return f"RollingSum(window={self._window})"
+
+    def update(self, t, x):
+        if len(self._xs) == self._window:
+            old = self._xs[0]
+            if _is_nan(old):
+                self._n_nan -= 1
+            else:
+                self._sum -= old
+
+        self._xs.append(x)
+        if _is_nan(x):
+            self._n_nan += 1
+        else:
+            self._sum += x
+
+        if (len(self._xs) < self._window) or (self._n_nan > 0):
+            self._value = np.nan
+        else:
+            # 誤差が溜まらないように窓が小さいときは足し直す
+            self._value = math.fsum(self._xs) if self._window <= 16 else self._sum
+        return self._value
+
+    def snapshot(self):
+        return {'window': self._window, 'xs': list(self._xs), 'value': self._value}
+
+    def restore(self, state):
+        self.__init__(state['window'])
+        for x in state['xs']:
+            self.update(None, x)
+        self._value = state['value']
+        return self
+
+class LaplaceProbability(Operator):
+    """
+    Probability that the input occurs under Laplace distribution,
+    same as analysis.estimate_probability with fixed loc and scale.
+    Use fit to estimate them from the warm-up history.
+    """
+    @classmethod
+    def fit(cls, xs: pd.Series, window: int=1) -> 'LaplaceProbability':
+        """
+        Estimate loc and scale as estimate_probability(xs, window) does.
+        xs is the series before taking the rolling sum.
+        """
+        xs = xs.dropna()
+        _, b = estimate_laplace_param(xs)
+        ys = xs.rolling(window).sum()
+        return LaplaceProbability(loc=ys.median(), scale=b * np.sqrt(window))
+
+    def __init__(self, loc: float, scale: float):
+        self._loc = float(loc)
+        self._scale = float(scale)
+        self._value = np.nan
+
+    def __repr__(self):
+        return f"LaplaceProbability(loc={self._loc}, scale={self._scale})"
+
+    @property
+    def loc(self):
+        return self._loc
+
+    @property
+    def scale(self):
+        return self._scale
+
+    def update(self, t, y):
+        # 2 * laplace.cdf(-|y - loc|, scale=scale) = exp(-|y - loc| / scale)
+        self._value = np.nan if _is_nan(y) else math.exp(-abs(y - self._loc) / self._scale)
+        return self._value
+
+    def snapshot(self):
+        return {'loc': self._loc, 'scale': self._scale, 'value': self._value}
+
+    def restore(self, state):
+        self._loc = state['loc']
+        self._scale = state['scale']
+        self._value = state['value']
+        return self
+
+class Apply(Operator):
+    """
+    Stateless function of the inputs.
+    """
+    def __init__(self, function):
+        self._function = function
+        self._value = np.nan
+
+    def __repr__(self):
+        return f"Apply({getattr(self._function, '__name__', self._function)})"
+
+    def update(self, t, *xs):
+        self._value = self._function(*xs)
+        return self._value
+
+    def snapshot(self):
+        return {'value': self._value}
+
+    def restore(self, state):
+        self._value = state['value']
+        return self
+
+class LastTrue(Operator):
+    """
+    The last time at which the input was True (or satisfied predicate).
+    """
+    def __init__(self, predicate=None):
+        self._predicate = predicate
+        self._value = None
+
+    def __repr__(self):
+        return "LastTrue()"
+
+    def update(self, t, x):
+        if _is_nan(x):
+            return self._value
+
+        hit = self._predicate(x) if self._predicate is not None else x
+        if bool(hit):
+            self._value = pd.Timestamp(t)
+        return self._value
+
+    def snapshot(self):
+        return {'value': _from_time(self._value)}
+
+    def restore(self, state):
+        self._value = _to_time(state['value'])
+        return self
+
+class Pipeline:
+    """
+    Operators composed by name. Each step is (name, operator, inputs)
+    where inputs is a name or a tuple of names of the previous steps, or 'x' for the new bar.
+    """
+    def __init__(self, steps: Iterable[Tuple[str, Operator, Union[str, Tuple[str, ...]]]]):
+        self._steps = []
+        names = {'x'}
+        for name, operator, inputs in steps:
+            if isinstance(inputs, str):
+                inputs = (inputs, )
+            for i in inputs:
+                if i not in names:
+                    raise KeyError(f"input '{i}' of step '{name}' is not defined before.")
+            if name in names:
+                raise KeyError(f"step '{name}' is already defined.")
+            names.add(name)
+            self._steps.append((name, operator, tuple(inputs)))
+        self._last = None
+
+    def __repr__(self):
+        return f"Pipeline(steps={[ name for name, _, _ in self._steps ]})"
+
+    def __getitem__(self, name):
+        for n, operator, _ in self._steps:
+            if n == name:
+                return operator
+        raise KeyError(name)
+
+    @property
+    def last(self):
+        """
+        Time of the last bar consumed.
+        """
+        return self._last
+
+    @property
+    def values(self) -> Dict[str, Any]:
+        return { name: operator.value for name, operator, _ in self._steps }
+
+    def update(self, t, x) -> Dict[str, Any]:
+        values = {'x': x}
+        for name, operator, inputs in self._steps:
+            values[name] = operator.update(t, *[ values[i] for i in inputs ])
+        self._last = pd.Timestamp(t)
+        del values['x']
+        return values
+
+    def run(self, xs: pd.Series) -> pd.DataFrame:
+        """
+        Consume all bars of xs newer than the last one and return the values per bar.
+        """
+        if self._last is not None:
+            if xs.index.is_monotonic_increasing:
+                xs = xs.iloc[xs.index.searchsorted(self._last, side='right'):]
+            else:
+                xs = xs.loc[xs.index > self._last]
+
+        rows = [ self.update(t, x) for t, x in zip(xs.index, xs.to_numpy()) ]
+        return pd.DataFrame(rows, index=xs.index, columns=[ name for name, _, _ in self._steps ])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'last': _from_time(self._last),
+            'steps': { name: operator.snapshot() for name, operator, _ in self._steps },
+        }
+
+    def restore(self, state: Dict[str, Any]) -> 'Pipeline':
+        self._last = _to_time(state['last'])
+        for name, operator, _ in self._steps:
+            operator.restore(state['steps'][name])
+        return self
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def load(self, path: Union[str, Path]) -> 'Pipeline':
+        with open(path, 'r') as f:
+            return self.restore(json.load(f))
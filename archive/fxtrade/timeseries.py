@@ -6,7 +6,7 @@ import numpy as np
 import pandas as pd
 
 from datetime import datetime, timedelta
-from typing import Union, Optional, Iterable
+from typing import Union, Optional, Iterable, Tuple
 
 from .period import is_divisor, to_period_str, parse, DIVISORS
 
@@ -224,16 +224,7 @@ def add_years(t, dy):
     return datetime(t.year+dy, t.month, t.day)
 
 def year_sections(begin, end):
-    if begin >= end:
-        raise ValueError("begin must be before than end")
-    
-    b = this_year_first(begin)
-    e = next_year_first(end)
-    
-    for i in range(count_years(b, e)):
-        x = add_years(b, i)
-        y = add_years(b, i+1)
-        yield (x, y)
+    yield from _sections(year_boundaries(begin, end))
 
 def this_month_first(t):
     return datetime(t.year, t.month, 1)
@@ -260,16 +251,7 @@ def add_months(t, dm):
     return datetime(year, month, t.day)
 
 def month_sections(begin, end):
-    if begin >= end:
-        raise ValueError("begin must be before than end")
-    
-    b = this_month_first(begin)
-    e = next_month_first(end)
-    
-    for i in range(count_months(b, e)):
-        x = add_months(b, i)
-        y = add_months(b, i+1)
-        yield (x, y)
+    yield from _sections(month_boundaries(begin, end))
         
 def this_day_first(t):
     return datetime(t.year, t.month, t.day)
@@ -284,13 +266,71 @@ def add_days(t, dd):
     return t + timedelta(days=dd)
 
 def day_sections(begin, end):
-    if begin >= end:
-        raise ValueError("begin must be before than end")
-    
-    b = this_day_first(begin)
-    e = next_day_first(end)
-    
-    for i in range(count_days(b, e)):
-        x = add_days(b, i)
-        y = add_days(b, i+1)
-        yield (x, y)
\ No newline at end of file
+    yield from _sections(day_boundaries(begin, end))
+
+def _wall_clock(t) -> np.datetime64:
+    t = pd.Timestamp(t)
+    if t.tz is not None:
+        t = t.tz_localize(None)
+    return t.to_datetime64()
+
+def _calendar_boundaries(begin, end, unit: str) -> np.ndarray:
+    """
+    Boundaries of the calendar sections (unit is 'Y', 'M' or 'D') which cover [begin, end],
+    from the first of the section containing begin to the first of the section after end,
+    as datetime64[ns] array.
+    """
+    # 1 行だけのときは begin == end になる
+    if begin > end:
+        raise ValueError("begin must not be after end")
+
+    b = _wall_clock(begin).astype(f'datetime64[{unit}]')
+    e = _wall_clock(end).astype(f'datetime64[{unit}]') + 1
+    return np.arange(b, e + 1).astype('datetime64[ns]')
+
+def year_boundaries(begin, end) -> np.ndarray:
+    return _calendar_boundaries(begin, end, 'Y')
+
+def month_boundaries(begin, end) -> np.ndarray:
+    return _calendar_boundaries(begin, end, 'M')
+
+def day_boundaries(begin, end) -> np.ndarray:
+    return _calendar_boundaries(begin, end, 'D')
+
+def _sections(boundaries: np.ndarray):
+    # 以前と同じく datetime の組を返す
+    ts = boundaries.astype('datetime64[us]').tolist()
+    return zip(ts[:-1], ts[1:])
+
+# 区切りを配列で直接計算できるイテレータ
+SECTION_BOUNDARIES = {
+    year_sections: year_boundaries,
+    month_sections: month_boundaries,
+    day_sections: day_boundaries,
+}
+
+def section_bounds(save_iterator, begin, end) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (begins, ends) of the sections yielded by save_iterator(begin, end)
+    as datetime64[ns] arrays. The calendar iterators are computed without iteration.
+    """
+    boundaries = SECTION_BOUNDARIES.get(save_iterator)
+    if boundaries is not None:
+        xs = boundaries(begin, end)
+        return xs[:-1], xs[1:]
+
+    sections = list(save_iterator(begin, end))
+    begins = np.array([ _wall_clock(b) for b, _ in sections ], dtype='datetime64[ns]')
+    ends = np.array([ _wall_clock(e) for _, e in sections ], dtype='datetime64[ns]')
+    return begins, ends
+
+def split_sections(values: np.ndarray, begins: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Given sorted datetime64 values, return the positions (lo, hi) such that
+    values[lo[i]:hi[i]] are in [begins[i], ends[i]).
+    Each section is a slice, so the frame can be split without copy in one pass.
+    """
+    values = np.asarray(values).astype('datetime64[ns]')
+    lo = np.searchsorted(values, np.asarray(begins, dtype='datetime64[ns]'), side='left')
+    hi = np.searchsorted(values, np.asarray(ends, dtype='datetime64[ns]'), side='left')
+    return lo, np.maximum(lo, hi)
\ No newline at end of file
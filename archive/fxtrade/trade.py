@@ -364,21 +364,26 @@ class TradePair:
     def __repr__(self):
         return f"TradePair({self.before.x} -> {self.before.y} -> {self.after.y})"
     
+    def as_list(self) -> list:
+        """Convert to a list of values in the order of TradePair.columns.
+        """
+        return [
+            self.before.id,
+            self.after.id,
+            self.before.t,
+            self.after.t,
+            self.before.x.q,
+            self.before.y.q,
+            self.after.y.q,
+            self.before.x.code,
+            self.before.y.code,
+            self.after.y.code,
+            self.before.rate.r,
+            self.after.rate.r,
+            (self.before.rate * self.after.rate).r,
+        ]
+
     def as_series(self):
         """Convert to pandas.Series.
         """
-        return pd.Series([
-                            self.before.id,
-                            self.after.id,
-                            self.before.t,
-                            self.after.t,
-                            self.before.x.q,
-                            self.before.y.q,
-                            self.after.y.q,
-                            self.before.x.code,
-                            self.before.y.code,
-                            self.after.y.code,
-                            self.before.rate.r,
-                            self.after.rate.r,
-                            (self.before.rate * self.after.rate).r,
-                         ], index=TradePair.columns)
+        return pd.Series(self.as_list(), index=TradePair.columns)
@@ -116,14 +116,20 @@ class Trader(SafeAttrABC):
     def load_chart(self, t=None, crange_period: Union[str, Iterable[str]]=None, data_dir=None):
         return self.chart.load(t=t, crange_period=crange_period, data_dir=data_dir)
 
-    def download_chart(self, t=None, crange_period: Union[str, Iterable[str]]=None):
-        return self.chart.download(t=t, crange_period=crange_period)
-
-    def update_chart(self, t=None, crange_period=None, interval=None, force=False):
-        return self.chart.update(t=t, crange_period=crange_period, interval=interval, force=force)
+    def download_chart(self, t=None, crange_period: Union[str, Iterable[str]]=None,
+                       max_workers: Optional[int]=None, return_summary: bool=False):
+        return self.chart.download(t=t, crange_period=crange_period,
+                                   max_workers=max_workers, return_summary=return_summary)
+
+    def update_chart(self, t=None, crange_period=None, interval=None, force=False,
+                     max_workers: Optional[int]=None, return_summary: bool=False):
+        return self.chart.update(t=t, crange_period=crange_period, interval=interval, force=force,
+                                 max_workers=max_workers, return_summary=return_summary)
     
-    def sync_chart(self, t=None, crange_period=None, data_dir=None, interval=None, force=False):
-        return self.chart.sync(t=t, crange_period=crange_period, data_dir=data_dir, interval=interval, force=force)
+    def sync_chart(self, t=None, crange_period=None, data_dir=None, interval=None, force=False,
+                   max_workers: Optional[int]=None, return_summary: bool=False):
+        return self.chart.sync(t=t, crange_period=crange_period, data_dir=data_dir, interval=interval, force=force,
+                               max_workers=max_workers, return_summary=return_summary)
 
     # Trader api wrapper
     def minimum_order_quantity(self):
@@ -6,8 +6,9 @@ from pathlib import Path
 from typing import Callable, Union, Iterable, List, Tuple
 
 from .core import type_checked, is_instance_list
-from .period import Period
-from .timeseries import year_sections, month_sections, day_sections
+from .partition import Manifest
+from .period import Period, to_period_str
+from .timeseries import year_sections, month_sections, day_sections, section_bounds, split_sections
 
 def standardize(df: pd.DataFrame):
     """
@@ -29,6 +30,10 @@ def standardize(df: pd.DataFrame):
     else:
         columns = ohlc_col
 
+    # 既に整形済みでソートされていればコピーせずにそのまま返す
+    if (list(df.columns) == columns) and df.index.is_monotonic_increasing:
+        return df
+
     return df[columns].sort_index()
 
 def normalize(df: pd.DataFrame, dt: timedelta):
@@ -40,21 +45,172 @@ def normalize(df: pd.DataFrame, dt: timedelta):
     if not isinstance(df.index, pd.DatetimeIndex):
         raise TypeError(f"df.index must be {pd.DatetimeIndex}.")
 
-    # TODO
+    return regularize(df, Period(to_period_str(dt)))
 
-    return df
+def find_gaps(index, period: Period, begin=None, end=None) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Return the missing bars on the grid of period as a list of
+    (first missing, last missing) ranges, both ends inclusive.
+    begin and end extend the range to be checked beyond the index.
+    """
+    period = Period(period)
+    step = _period_ns(period)
+    values = np.unique(_grid_values(index))
+    values = values[period.is_aligned(values)]
+
+    # 範囲の両端を番兵として加える
+    lower = None if begin is None else _grid_values([begin])[0]
+    upper = None if end is None else _grid_values([end])[0]
+    if lower is not None:
+        lower = period.ceil(lower).view('int64')
+        values = np.concatenate([[lower - step], values[values >= lower]])
+    if upper is not None:
+        upper = period.floor(upper).view('int64')
+        values = np.concatenate([values[values <= upper], [upper + step]])
+
+    if len(values) < 2:
+        return []
+
+    diff = np.diff(values)
+    pos = np.flatnonzero(diff > step)
+
+    firsts = (values[pos] + step).view('datetime64[ns]')
+    lasts = (values[pos + 1] - step).view('datetime64[ns]')
+
+    return [ (pd.Timestamp(f), pd.Timestamp(l)) for f, l in zip(firsts, lasts) ]
+
+def regularize(df: pd.DataFrame, period: Period, begin=None, end=None, policy: str='ffill') -> pd.DataFrame:
+    """
+    Reindex df onto the grid of period and fill the missing bars.
+
+    policy:
+        'ffill': open, high, low and close are the previous close, volume is zero.
+        'nan': leave the missing bars as NaN.
+    """
+    if policy not in ('ffill', 'nan'):
+        raise ValueError(f"policy must be one of ('ffill', 'nan') but actual '{policy}'.")
+
+    period = Period(period)
+    step = _period_ns(period)
+    df = df.sort_index()
+    df = df.loc[~df.index.duplicated(keep='last')]
+
+    values = _grid_values(df.index)
+    aligned = period.is_aligned(values)
+    df = df.loc[aligned]
+    values = values[aligned]
+
+    lower = values[0] if begin is None else _grid_values([begin])[0]
+    upper = values[-1] if end is None else _grid_values([end])[0]
+    lower = period.ceil(lower).view('int64')
+    upper = period.floor(upper).view('int64')
+
+    grid = np.arange(lower, upper + step, step, dtype='int64')
+    # 元の行の位置 (欠損は -1)
+    pos = np.searchsorted(values, grid)
+    pos[pos >= len(values)] = len(values) - 1
+    found = values[pos] == grid
+    pos[~found] = -1
+
+    index = pd.DatetimeIndex(grid.view('datetime64[ns]'), name=df.index.name)
+    if df.index.tz is not None:
+        index = index.tz_localize(df.index.tz)
+
+    ret = df.reindex(index)
+    if policy == 'nan' or found.all():
+        return ret
+
+    # 直前に存在する行の位置で前方補完する
+    prev = np.maximum.accumulate(np.where(found, np.arange(len(grid)), -1))
+    has_prev = prev >= 0
+    missing = (~found) & has_prev
+
+    src = pos[prev[missing]]
+    close = df['close'].to_numpy()[src]
+    for column in ['open', 'high', 'low', 'close']:
+        ret.loc[missing, column] = close
+    if 'volume' in ret.columns:
+        ret.loc[missing, 'volume'] = 0
+    if 'timestamp' in ret.columns:
+        elapsed = (grid[missing] - grid[prev[missing]]) // 1_000_000_000
+        ret.loc[missing, 'timestamp'] = df['timestamp'].to_numpy()[src] + elapsed
+        if not ret['timestamp'].isna().any():
+            ret['timestamp'] = ret['timestamp'].astype(df['timestamp'].dtype)
+
+    return ret
+
+_TIMES = (datetime, np.datetime64)
+
+def _time_range(t):
+    """
+    Interpret t as (begin, end) where None means unbounded:
+        datetime: (None, t)
+        (datetime, ): (t[0], None)
+        (datetime, datetime): (t[0], t[1])
+    """
+    # よく使う datetime とタプルを先に判定する
+    if isinstance(t, _TIMES):
+        return None, t
+    elif isinstance(t, (tuple, list)):
+        if len(t) == 2 and isinstance(t[0], _TIMES) and isinstance(t[1], _TIMES):
+            return t[0], t[1]
+        elif len(t) == 1 and isinstance(t[0], _TIMES):
+            return t[0], None
+    raise TypeError(f"t must be instance of datetime or Tuple[datetime, datetime] but actual type '{type(t)}'.")
+
+def _slice_mask(idx, begin, end, include_end=True) -> np.ndarray:
+    mask = np.ones(len(idx), dtype=bool)
+    if begin is not None:
+        mask &= np.asarray(idx >= begin)
+    if end is not None:
+        mask &= np.asarray(idx <= end) if include_end else np.asarray(idx < end)
+    return mask
+
+def _slice_positions(idx, begin, end, include_end=True) -> Tuple[int, int]:
+    lo = 0 if begin is None else idx.searchsorted(begin, side='left')
+    hi = len(idx) if end is None else idx.searchsorted(end, side='right' if include_end else 'left')
+    return lo, max(lo, hi)
+
+def _take(df: pd.DataFrame, idx, t, include_end=True, copy=False) -> pd.DataFrame:
+    """
+    Rows of df whose idx is in the range of t.
+    A slice (view) is taken by binary search if idx is sorted, otherwise a boolean mask is used.
+    """
+    if t is None:
+        return df.copy() if copy else df
+
+    begin, end = _time_range(t)
+    if idx.is_monotonic_increasing:
+        lo, hi = _slice_positions(idx, begin, end, include_end)
+        df = df.iloc[lo:hi]
+        return df.copy() if copy else df
+
+    return df.loc[_slice_mask(idx, begin, end, include_end)]
+
+def time_slice(df: pd.DataFrame, t, include_end=True, copy=False) -> pd.DataFrame:
+    """
+    ソート済みの DatetimeIndex を二分探索して t の範囲を切り出す
+    copy=False のときはコピーせずにスライス（ビュー）を返す
+    """
+    return _take(df, df.index, t, include_end=include_end, copy=copy)
+
+def focus(x, t, fstring=None, column=None, include_end=True, copy=True):
+    """
+    Select the elements of x in the range of t.
 
-def focus(x, t, fstring=None, column=None, include_end=True):
+    x is DataFrame (by the index or column), datetime, str and Path (with fstring), or list of them.
+    For DataFrame, a sorted index or column is sliced by binary search and
+    the result is a view unless copy is True.
+    """
     def _focus(s, t):
         if t is None:
             return True
-        elif isinstance(t, (datetime, np.datetime64)):
-            return s <= t if include_end else s < t
-        elif is_instance_list(t, (datetime, np.datetime64), n=1):
-            return s >= t[0]
-        elif is_instance_list(t, (datetime, np.datetime64), n=2):
-            return (t[0] <= s <= t[1]) if include_end else (t[0] <= s < t[1])
-        raise TypeError(f"t must be instance of datetime or Tuple[datetime, datetime] but actual type '{type(t)}'.")
+        begin, end = _time_range(t)
+        if begin is not None and s < begin:
+            return False
+        if end is not None:
+            return s <= end if include_end else s < end
+        return True
     
     def _apply_format(t, fstring):
         return datetime.strptime(t.strftime(fstring), fstring)
@@ -70,6 +226,9 @@ def focus(x, t, fstring=None, column=None, include_end=True):
     if isinstance(x, pd.DataFrame):
         df = x
 
+        if column is None and isinstance(df.index, pd.DatetimeIndex):
+            return _take(df, df.index, t, include_end=include_end, copy=copy)
+
         if column is not None:
             idx = df[column]
 
@@ -82,22 +241,11 @@ def focus(x, t, fstring=None, column=None, include_end=True):
         else:
             idx = df.index
 
-            if not isinstance(idx, pd.DatetimeIndex):
-                if fstring is None:
-                    raise ValueError(f"fstring must be specified when index is not instance of {pd.DatetimeIndex}.")
-                idx = pd.DatetimeIndex([ datetime.strptime(s, fstring) for s in idx ])
+            if fstring is None:
+                raise ValueError(f"fstring must be specified when index is not instance of {pd.DatetimeIndex}.")
+            idx = pd.DatetimeIndex([ datetime.strptime(s, fstring) for s in idx ])
 
-        if t is None:
-            return df.copy()
-        elif isinstance(t, (datetime, np.datetime64)):
-            return df[idx <= t].copy() if include_end else df[idx <= t].copy()
-        elif is_instance_list(t, (datetime, np.datetime64), n=1):
-            return df[(idx >= t[0])].copy()
-        elif is_instance_list(t, (datetime, np.datetime64), n=2):
-            return df[(idx >= t[0]) & (idx <= t[1])].copy() if include_end \
-                else df[(idx >= t[0]) & (idx < t[1])].copy()
-        else:
-            raise TypeError()
+        return _take(df, idx, t, include_end=include_end, copy=copy)
 
     elif isinstance(x, datetime):
         return _focus(x, t)
@@ -144,28 +292,119 @@ def focus(x, t, fstring=None, column=None, include_end=True):
     
 #     return df
 
-def default_timestamp_filter(period: Period):
-    return {
-        Period('1d'): lambda x: (x.hour == 0) and (x.minute == 0) \
-                            and (x.second == 0) and (x.nanosecond == 0),
-        Period('15m'): lambda x: (x.minute % 15 == 0) \
-                            and (x.second == 0) and (x.nanosecond == 0),
-        Period('1m'): lambda x: (x.second == 0) and (x.nanosecond == 0),
-    }[period]
+def _grid_values(index) -> np.ndarray:
+    """
+    Return wall-clock time of index as int64 nanoseconds.
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    # 解像度が秒やマイクロ秒のこともあるのでナノ秒に揃える
+    return index.values.astype('datetime64[ns]').view('int64')
+
+def _period_ns(period: Period) -> int:
+    period = Period(period)
+    if period.ns <= 0:
+        raise ValueError(f"period must be regular but actual '{period}'.")
+    return period.ns
+
+def is_aligned(index, period: Period) -> np.ndarray:
+    """
+    Return boolean array which is True where the timestamp is on the grid of period.
+    """
+    return Period(period).is_aligned(_grid_values(index))
+
+def snap(index, period: Period) -> pd.DatetimeIndex:
+    """
+    Floor each timestamp onto the grid of period.
+    """
+    index = pd.DatetimeIndex(index)
+    values = Period(period).floor(_grid_values(index))
+
+    ret = pd.DatetimeIndex(values, name=index.name)
+    if index.tz is not None:
+        ret = ret.tz_localize(index.tz)
+    return ret
+
+class TimestampFilter:
+    """
+    Grid-alignment check of the bars for the period.
+
+    policy:
+        'drop': drop misaligned bars.
+        'snap': floor misaligned bars onto the grid,
+                the first bar is kept if several bars fall on the same grid.
+        'reject': raise ValueError if any bar is misaligned.
+
+    Calling the filter with a single timestamp is kept for compatibility.
+    """
+    POLICIES = ('drop', 'snap', 'reject')
+
+    def __init__(self, period: Period, policy: str='drop'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES} but actual '{policy}'.")
+
+        self._period = Period(period)
+        # 不正な周期はここで弾く
+        _period_ns(self._period)
+        self._policy = policy
+
+    @property
+    def period(self):
+        return self._period
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def __repr__(self):
+        return f"TimestampFilter(period='{self.period}', policy='{self.policy}')"
+
+    def __call__(self, x) -> bool:
+        return bool(self.mask(pd.DatetimeIndex([x]))[0])
+
+    def mask(self, index) -> np.ndarray:
+        return self._period.is_aligned(_grid_values(index))
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the policy to df whose index is DatetimeIndex.
+        """
+        mask = self.mask(df.index)
+        if mask.all():
+            return df
+
+        if self.policy == 'drop':
+            return df.loc[mask]
+        elif self.policy == 'snap':
+            df = df.copy()
+            df.index = snap(df.index, self.period)
+            # 同じグリッドに落ちたものは先頭 (整列済みのもの) を残す
+            return df.loc[~df.index.duplicated(keep='first')]
+        
+        n = int((~mask).sum())
+        raise ValueError(f"{n} bars are not aligned to the period '{self.period}': first at {df.index[~mask][0]}.")
+
+def default_timestamp_filter(period: Period, policy: str='drop'):
+    return TimestampFilter(period, policy)
+
+DEFAULT_SAVE_FSTRINGS = {
+        Period('1d'): '%Y.csv',
+        Period('15m'): '%Y-%m.csv',
+        Period('1m'): '%Y-%m-%d.csv',
+}
+
+DEFAULT_SAVE_ITERATORS = {
+        Period('1d'): year_sections,
+        Period('15m'): month_sections,
+        Period('1m'): day_sections,
+}
 
 def default_save_fstring(period: Period):
-    return {
-            Period('1d'): '%Y.csv',
-            Period('15m'): '%Y-%m.csv',
-            Period('1m'): '%Y-%m-%d.csv',
-    }[period]
+    return DEFAULT_SAVE_FSTRINGS[period]
 
 def default_save_iterator(period: Period):
-    return {
-            Period('1d'): year_sections,
-            Period('15m'): month_sections,
-            Period('1m'): day_sections,
-    }[period]
+    return DEFAULT_SAVE_ITERATORS[period]
 
 def merge(df_prev: pd.DataFrame, df: pd.DataFrame, left_on=None, right_on=None, sort_on=None) -> pd.DataFrame:
     # TODO: 結合のキーにする列を指定できるようにする
@@ -232,21 +471,32 @@ def default_save_function(
 
     if len(df) == 0:
        raise ValueError(f"dataframe size is zero: no data to save.")
+
+    # インデックスが時刻のときはパーティションの情報を記録する
+    manifest = Manifest.load(save_dir) if column is None else None
     
     df = df.sort_index()
 
     if column is None:
-        idx = pd.Series(df.index)
+        values = _grid_values(df.index)
     else:
-        idx = df[column]
+        values = _grid_values(df[column])
+        if not (np.diff(values) >= 0).all():
+            df = df.iloc[np.argsort(values, kind='stable')]
+            values = np.sort(values, kind='stable')
+    values = values.view('datetime64[ns]')
+
+    # 期間の区切りを配列で求め、ソート済みの時刻から各期間の行の範囲を一度に求める
+    begins, ends = section_bounds(save_iterator, pd.Timestamp(values[0]), pd.Timestamp(values[-1]))
+    los, his = split_sections(values, begins, ends)
 
     # 期間ごとに小分けにしてイテレート
-    for begin, end in save_iterator(idx.iloc[0], idx.iloc[-1]):
+    for begin, lo, hi in zip(begins.astype('datetime64[us]').tolist(), los, his):
         save_name = begin.strftime(save_fstring)
         path = save_dir / save_name
         
-        # 小分けにしたデータフレーム
-        df_part = focus(df, (begin, end), column=column, include_end=False)
+        # 小分けにしたデータフレーム（コピーせずにスライスする）
+        df_part = df.iloc[lo:hi]
 
         # 過去に同期間が保存されていれば読み込んでマージ
         if path.exists():
@@ -254,11 +504,19 @@ def default_save_function(
             df_part = default_merge_function(df_prev, df_part)
         
         # 保存するデータを選択する
-        if timestamp_filter is not None:
+        if isinstance(timestamp_filter, TimestampFilter):
+            df_part = timestamp_filter.apply(df_part)
+        elif timestamp_filter is not None:
             save_idx = pd.Series(df_part.index).apply(timestamp_filter)
             df_part = df_part.loc[save_idx.values]
         
         # 保存する
         df_part.to_csv(path, index=True)
+
+        if manifest is not None:
+            manifest.update(path, df_part)
+
+    if manifest is not None:
+        manifest.save()
     
     return save_dir
@@ -1,14 +1,37 @@
 import copy
+import os
+
+import numpy as np
 import pandas as pd
 
 from fractions import Fraction
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, List, Optional, Union
 
 from .api import CodePair
 from .core import is_instance_list, is_instance_dict
+from .fixed import SCALE, to_units, to_units_array
 from .stock import Numeric, Stock
 
+def _read_last_line(path: Path, block: int=4096) -> str:
+    """
+    Return the last non-empty line of a text file without reading the whole file.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        while end > 0:
+            begin = max(0, end - block)
+            f.seek(begin)
+            data = f.read(end - begin) + data
+            end = begin
+            lines = data.rstrip(b'\r\n').splitlines()
+            if (len(lines) >= 2) or (end == 0):
+                break
+    lines = data.rstrip(b'\r\n').splitlines()
+    return lines[-1].decode() if len(lines) != 0 else ''
+
 class Wallet:
     @staticmethod
     def read_csv(path):
@@ -147,11 +170,36 @@ class Wallet:
 
         path = Path(path)
         if append and path.exists():
+            line = df.to_csv(header=False, index=True)
+            if self._can_append_csv(path, df, line):
+                # 列と時刻の書式が同じで時刻も最後の行以降なら、末尾に 1 行書き足すだけでよい
+                with open(path, 'a') as f:
+                    f.write(line)
+                return None
             df_old = self.read_csv(path)
             df = pd.concat([df_old, df], axis=0).sort_index()
         
         return df.to_csv(path, index=True)
 
+    @staticmethod
+    def _can_append_csv(path: Path, df: pd.DataFrame, line: str) -> bool:
+        columns = pd.read_csv(path, index_col=0, nrows=0).columns
+        if list(columns) != list(df.columns):
+            return False
+
+        last = _read_last_line(path).split(',')[0]
+        new = line.split(',')[0]
+        if last == '':
+            # ヘッダしかない
+            return True
+        if len(last) != len(new):
+            # 日付だけの行などが混ざると read_csv で日時として読めなくなる
+            return False
+        try:
+            return pd.Timestamp(last) <= df.index[-1]
+        except ValueError:
+            return False
+
     def join(self, x: str):
         if x is None:
             return self
@@ -219,4 +267,201 @@ class Wallet:
         return self.add(x)
     
     def __isub__(self, x):
-        return self.sub(x)
\ No newline at end of file
+        return self.sub(x)
+
+class SnapshotStore:
+    """
+    Append-only time series of wallet snapshots.
+
+    The times and the quantities (integers in units of fixed.SCALE, one column per code)
+    are kept in growable arrays, so appending a snapshot is amortized O(1).
+    Codes added later are filled with 0 for the earlier snapshots.
+    """
+    def __init__(self, codes: Optional[Iterable[str]]=None, capacity: int=1024):
+        self._codes = []
+        self._t = np.empty(capacity, dtype=np.int64)
+        self._units = np.zeros((capacity, 0), dtype=np.int64)
+        self._n = 0
+        # 最後に CSV に書き出した行数と列
+        self._flushed = 0
+        self._flushed_codes = None
+
+        for code in (codes if codes is not None else []):
+            self._column(code)
+
+    def __repr__(self):
+        return f"SnapshotStore(codes={self._codes}, n_snapshots={self._n})"
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def codes(self) -> List[str]:
+        return list(self._codes)
+
+    def _column(self, code: str) -> int:
+        if code not in self._codes:
+            self._codes.append(code)
+            self._units = np.concatenate([self._units, np.zeros((len(self._units), 1), dtype=np.int64)], axis=1)
+        return self._codes.index(code)
+
+    def _reserve(self, m: int):
+        if self._n + m <= len(self._t):
+            return
+        capacity = max(2 * len(self._t), self._n + m)
+        t = np.empty(capacity, dtype=np.int64)
+        t[:self._n] = self._t[:self._n]
+        units = np.zeros((capacity, self._units.shape[1]), dtype=np.int64)
+        units[:self._n] = self._units[:self._n]
+        self._t, self._units = t, units
+
+    def append(self, t, units: np.ndarray, codes: Optional[List[str]]=None):
+        """
+        Append a snapshot. units are the quantities in units of fixed.SCALE
+        in the order of codes (the codes of the store if None).
+        """
+        units = np.asarray(units, dtype=np.int64)
+        if codes is None:
+            codes = self._codes
+        if len(units) != len(codes):
+            raise ValueError("units and codes must have the same length.")
+        if (codes is not self._codes) and (list(codes) != self._codes):
+            columns = [ self._column(code) for code in codes ]
+        else:
+            columns = slice(0, len(codes))
+
+        self._reserve(1)
+        self._t[self._n] = pd.Timestamp(t).value
+        self._units[self._n, columns] = units
+        self._n += 1
+        return self
+
+    def to_dataframe(self, begin: int=0) -> pd.DataFrame:
+        """
+        Return the snapshots (from the begin-th) as a dataframe of Fraction like Wallet.read_csv.
+        """
+        index = pd.DatetimeIndex(self._t[begin:self._n].view('datetime64[ns]'))
+        values = [ [ Fraction(int(u), SCALE) for u in row ] for row in self._units[begin:self._n].tolist() ]
+        return pd.DataFrame(values, index=index, columns=self._codes)
+
+    def to_csv(self, path: Union[str, Path]):
+        """
+        Write the snapshots not yet written to path. The rows are appended to the file
+        unless the codes have changed since the last call, when the file is rewritten.
+        """
+        path = Path(path)
+        if (self._flushed_codes == self._codes) and path.exists():
+            df = self.to_dataframe(self._flushed)
+            df.to_csv(path, mode='a', header=False, index=True)
+        else:
+            self.to_dataframe().to_csv(path, index=True)
+        self._flushed = self._n
+        self._flushed_codes = list(self._codes)
+        return path
+
+class ArrayWallet:
+    """
+    Wallet backed by an array of quantities indexed by code.
+
+    The quantities are integers in units of fixed.SCALE, so the stocks of many trades
+    can be added or subtracted at once, and the state can be recorded to a SnapshotStore every tick.
+    """
+    @classmethod
+    def from_wallet(cls, wallet: Wallet):
+        ret = ArrayWallet(wallet.codes)
+        for code in wallet.codes:
+            ret._units[ret._index[code]] = to_units(wallet[code].q)
+        return ret
+
+    def __init__(self, codes: Optional[Iterable[str]]=None, store: Optional[SnapshotStore]=None):
+        self._index = {}
+        self._units = np.zeros(0, dtype=np.int64)
+        self.store = store if store is not None else SnapshotStore()
+
+        for code in (codes if codes is not None else []):
+            self._column(code)
+
+    def __repr__(self):
+        return f"ArrayWallet({ {code: float(self._units[i]) / SCALE for code, i in self._index.items()} })"
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, code):
+        return code in self._index
+
+    def __getitem__(self, code: str) -> Stock:
+        if code not in self._index:
+            raise KeyError(code)
+        return Stock(code, Fraction(int(self._units[self._index[code]]), SCALE))
+
+    @property
+    def codes(self) -> List[str]:
+        return list(self._index.keys())
+
+    @property
+    def units(self) -> np.ndarray:
+        return self._units.copy()
+
+    def _column(self, code: str) -> int:
+        i = self._index.get(code)
+        if i is None:
+            i = len(self._index)
+            self._index[code] = i
+            self._units = np.append(self._units, np.int64(0))
+        return i
+
+    def _columns(self, codes) -> np.ndarray:
+        if isinstance(codes, str):
+            return np.int64(self._column(codes))
+        codes, uniques = pd.factorize(np.asarray(codes, dtype=object))
+        return np.array([ self._column(c) for c in uniques ], dtype=np.int64)[codes]
+
+    def add(self, code: Union[str, Iterable[str]], q) -> 'ArrayWallet':
+        """
+        Add the quantities q to the codes. Both may be arrays to add many stocks at once.
+        """
+        columns = self._columns(code)
+        np.add.at(self._units, columns, to_units_array(q))
+        return self
+
+    def sub(self, code: Union[str, Iterable[str]], q) -> 'ArrayWallet':
+        columns = self._columns(code)
+        np.subtract.at(self._units, columns, to_units_array(q))
+        return self
+
+    def apply(self, code_x, q_x, code_y, q_y) -> 'ArrayWallet':
+        """
+        Apply trades which convert q_x of code_x into q_y of code_y (arrays for many trades).
+        """
+        return self.sub(code_x, q_x).add(code_y, q_y)
+
+    def apply_trades(self, trades) -> 'ArrayWallet':
+        """
+        Apply a list of trade.Trade or fixed.FixedTrade.
+        """
+        code_x = [ x.x.code for x in trades ]
+        code_y = [ x.y.code for x in trades ]
+        if all(hasattr(x.x, 'units') for x in trades):
+            units_x = np.array([ x.x.units for x in trades ], dtype=np.int64)
+            units_y = np.array([ x.y.units for x in trades ], dtype=np.int64)
+        else:
+            units_x = np.array([ to_units(x.x.q) for x in trades ], dtype=np.int64)
+            units_y = np.array([ to_units(x.y.q) for x in trades ], dtype=np.int64)
+        columns_x = self._columns(code_x)
+        columns_y = self._columns(code_y)
+        np.subtract.at(self._units, columns_x, units_x)
+        np.add.at(self._units, columns_y, units_y)
+        return self
+
+    def record(self, t=None) -> 'ArrayWallet':
+        """
+        Append the current quantities to the store in O(1).
+        """
+        if t is None:
+            t = pd.Timestamp.now().round('S')
+        self.store.append(t, self._units, self.codes)
+        return self
+
+    def to_wallet(self) -> Wallet:
+        return Wallet([ self[code] for code in self._index ])
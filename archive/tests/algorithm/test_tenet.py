@@ -0,0 +1,129 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.algorithm.tenet import Tenet, calc_zpc, calc_best_alpha
+from fxtrade.analysis import emaverage, infinite_trade_result, sell_buy_timing_ratio, switch_count
+
+def make_series(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='15min')
+    idx = idx[rng.random(n) > 0.1]
+
+    # 丸めて EMA と等しくなる点も作る
+    xs = np.round(6.5 + np.cumsum(rng.normal(0, 1e-3, len(idx))), 3)
+    return pd.Series(xs, index=idx)
+
+def test_calc_zpc():
+    xs = make_series()
+    dt = pd.Timedelta(minutes=15)
+    alphas = np.linspace(0.1, 1, 10)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = []
+        for a in alphas:
+            gmeans = emaverage(xs, alpha=a, dt=dt)
+            expected.append([
+                infinite_trade_result(xs, gmeans),
+                sell_buy_timing_ratio(xs, gmeans),
+                switch_count(xs, gmeans),
+            ])
+    expected = np.array(expected)
+
+    for n_jobs in [1, 3]:
+        zpc = calc_zpc(xs, dt, alphas=alphas, n_jobs=n_jobs)
+
+        assert list(zpc.columns) == ['alpha', 'z', 'p', 'c', 'zp', 'zp/c']
+        assert np.allclose(zpc['z'], expected[:, 0])
+        assert np.allclose(zpc['p'], expected[:, 1], equal_nan=True)
+        assert (zpc['c'] == expected[:, 2]).all()
+
+def test_calc_best_alpha():
+    xs = make_series()
+    dt = pd.Timedelta(minutes=15)
+    alphas = [0.5, 0.8, 0.9]
+
+    best = calc_best_alpha(xs, dt, alphas=alphas)
+    assert best['alpha'] in alphas
+
+def test_Tenet_make_pipeline():
+    xs = 3.7e6 * 10 ** (make_series() - 6.5)
+    dt = pd.Timedelta(minutes=15)
+    tenet = Tenet('max-15m', dt)
+
+    pipeline = tenet.make_pipeline(xs.iloc[:1000])
+    out = pipeline.run(xs)
+
+    gmeans = emaverage(xs.apply(np.log10), alpha=tenet.alpha, dt=dt)
+    trend = emaverage(gmeans.diff(), alpha=tenet.alpha, dt=dt)
+    uptrend = trend.loc[(((trend > 0).astype(float)).diff() > 0).values]
+
+    assert np.allclose(out['gmeans'], gmeans.iloc[1000:])
+    assert np.allclose(out['trend'], trend.loc[out.index])
+    assert pipeline['uptrend'].value == uptrend.index[-1]
+
+def test_calc_zpc_fixed():
+    # 手計算した値 (alpha=0.5, dt=1m)
+    # [1, 3, 1, 3]: EMA = [1, 7/3, 11/7, 7/3], 売り [3, 3] 買い [1] で z=5, p=2, c=2
+    # [3, 1, 3, 1]: EMA = [3, 5/3, 17/7, 5/3], 売り [3] 買い [1, 1] で z=1, p=0.5, c=2
+    idx = pd.date_range('2022-02-01', periods=4, freq='1min')
+    dt = pd.Timedelta(minutes=1)
+
+    zpc = calc_zpc(pd.Series([1.0, 3.0, 1.0, 3.0], index=idx), dt, alphas=[0.5])
+    assert list(zpc.iloc[0][['z', 'p', 'c']]) == [5.0, 2.0, 2.0]
+
+    zpc = calc_zpc(pd.Series([3.0, 1.0, 3.0, 1.0], index=idx), dt, alphas=[0.5])
+    assert list(zpc.iloc[0][['z', 'p', 'c']]) == [1.0, 0.5, 2.0]
+
+class ChartFX:
+    """
+    fx.chart[crange_interval] だけを持つ FX の代わり
+    """
+    def __init__(self, df):
+        self.chart = {'max-15m': df}
+
+def test_Tenet_latest():
+    rng = np.random.default_rng(1)
+    idx = pd.date_range('2022-02-01', periods=1500, freq='15min')
+    low = pd.Series(3.7e6 * np.exp(np.cumsum(rng.laplace(0, 3e-3, len(idx)))), index=idx)
+    df = pd.DataFrame({'low': low, 'high': low * 1.001})
+    dt = pd.Timedelta(minutes=15)
+
+    def expected(fx):
+        batch = Tenet('max-15m', dt)
+        batch.analyze(fx)
+        return {
+            'now': batch.df_low.index[-1],
+            'rise': batch.rise.index[-1],
+            'fall': batch.fall.index[-1],
+            'uptrend': batch.uptrend.index[-1],
+            'downtrend': batch.downtrend.index[-1],
+            'gmeans': batch.gmeans.iloc[-1],
+            'log': batch.df_low['log'].iloc[-1],
+        }
+
+    # 全履歴で温めた直後は一括計算と一致する
+    fx = ChartFX(df)
+    tenet = Tenet('max-15m', dt)
+    tenet.update(fx)
+    state, batch = tenet.latest(), expected(fx)
+    assert state.keys() == batch.keys()
+    for key in ['now', 'rise', 'fall', 'uptrend', 'downtrend']:
+        assert state[key] == batch[key]
+    assert np.isclose(state['gmeans'], batch['gmeans'])
+    assert np.isclose(state['log'], batch['log'])
+
+    # 途中まで温めてから新しい足だけを流し込んでも、EMA とトレンドは一括計算と一致する
+    fx = ChartFX(df.iloc[:1000])
+    tenet = Tenet('max-15m', dt)
+    tenet.update(fx)
+    for n in [1001, 1002, 1200, 1500]:
+        fx.chart['max-15m'] = df.iloc[:n]
+        tenet.update(fx)
+        state, batch = tenet.latest(), expected(fx)
+        assert state['now'] == batch['now'] == df.index[n - 1]
+        assert np.isclose(state['gmeans'], batch['gmeans'])
+        assert state['uptrend'] == batch['uptrend']
+        assert state['downtrend'] == batch['downtrend']
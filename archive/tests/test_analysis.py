@@ -0,0 +1,98 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.analysis import emaverage, emaverages, infinite_trade_result, sell_buy_timing_ratio, \
+    signal_metrics, switch_count, switch_ratio, _ema_loop
+
+def make_series(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='1min')
+
+    # 不規則な間隔と大きな欠損を入れる
+    idx = idx[rng.random(n) > 0.2]
+    idx = idx.append(pd.DatetimeIndex(['2022-03-01', '2022-03-01 00:03']))
+
+    return pd.Series(np.cumsum(rng.normal(0, 1, len(idx))), index=idx)
+
+def reference(xs, alpha, dt):
+    xs = xs.dropna()
+    t = np.r_[0.0, np.diff(xs.index.values).astype('timedelta64[ns]').astype(float) / (dt.total_seconds() * 1e9)]
+    return _ema_loop(xs.values, t, alpha)
+
+def test_emaverage():
+    xs = make_series()
+    xs.iloc[10] = np.nan
+    dt = pd.Timedelta(minutes=1)
+
+    for alpha in [0.5, 0.9, 0.999, 1.0]:
+        ema = emaverage(xs, alpha, dt)
+        assert len(ema) == len(xs) - 1
+        assert np.allclose(ema.values, reference(xs, alpha, dt), rtol=1e-10, atol=1e-10)
+
+    assert len(emaverage(pd.Series([], dtype=float, index=pd.DatetimeIndex([])), 0.9, dt)) == 0
+
+def test_emaverages():
+    xs = make_series()
+    dt = pd.Timedelta(minutes=1)
+    alphas = [0.0, 0.5, 0.8, 0.9]
+
+    df = emaverages(xs, alphas, dt)
+
+    assert df.shape == (len(xs), len(alphas))
+    for alpha in alphas:
+        assert np.allclose(df[alpha].values, reference(xs, alpha, dt), rtol=1e-10, atol=1e-10)
+
+def reference_metrics(low, low_base, high, high_base):
+    # 以前の pandas による実装
+    time_to_sell = low > low_base
+    time_to_buy = high < high_base
+
+    profit = low[time_to_sell].sum() - high[time_to_buy].sum()
+    ratio = np.nan if time_to_buy.sum() == 0 else time_to_sell.sum() / time_to_buy.sum()
+
+    timings = pd.Series(np.zeros(len(low)), index=low.index, dtype=int)
+    timings[time_to_buy] = 1
+    timings[time_to_sell] = -1
+    timings = timings[timings != 0]
+    count = np.sum(np.diff(timings > 0))
+
+    return profit, ratio, count, count / (len(low) - 1)
+
+def test_signal_metrics():
+    xs = make_series()
+    low, high = xs - 0.5, xs + 0.5
+    low_base = emaverages(xs, [0.9], pd.Timedelta(minutes=1))[0.9]
+    high_base = low_base + 0.3
+
+    metrics = signal_metrics(low, low_base, high, high_base)
+    assert np.allclose(metrics[:4], reference_metrics(low, low_base, high, high_base))
+    assert metrics.overlap == 0
+
+    assert np.isclose(infinite_trade_result(low, low_base, high, high_base), metrics.profit)
+    assert np.isclose(sell_buy_timing_ratio(low, low_base, high, high_base), metrics.timing_ratio)
+    assert switch_count(low, low_base, high, high_base) == metrics.switch_count
+    assert np.isclose(switch_ratio(low, low_base, high, high_base), metrics.switch_ratio)
+
+    # 売りと買いが重なると警告し、売りを優先する
+    high_base = low_base + 2.0
+    with pytest.warns(UserWarning):
+        count = switch_count(low, low_base, high, high_base)
+    assert count == reference_metrics(low, low_base, high, high_base)[2]
+    assert signal_metrics(low, low_base, high, high_base).overlap > 0
+
+def test_signal_metrics_2d():
+    xs = make_series()
+    alphas = [0.5, 0.8, 0.9, 0.99]
+    bases = emaverages(xs, alphas, pd.Timedelta(minutes=1))
+
+    metrics = signal_metrics(xs, bases)
+    assert metrics.profit.shape == (len(alphas), )
+
+    for i, alpha in enumerate(alphas):
+        expected = reference_metrics(xs, bases[alpha], xs, bases[alpha])
+        assert np.allclose([ m[i] for m in metrics[:4] ], expected)
+
+    # 1 行しかないと switch_ratio は定義できない
+    assert np.isnan(signal_metrics(xs.iloc[:1], bases.iloc[:1, 0]).switch_ratio)
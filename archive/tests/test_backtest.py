@@ -0,0 +1,59 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.backtest import backtest, signals_to_target
+
+def make_price(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='1min')
+    return pd.Series(3.7e6 * np.exp(np.cumsum(rng.normal(0, 1e-3, n))), index=idx)
+
+def test_signals_to_target():
+    signal = [0, 1, 0, np.nan, -1, 0, 1]
+    assert list(signals_to_target(signal)) == [0, 1, 1, 1, 0, 0, 1]
+
+def test_backtest_units():
+    price = make_price()
+    target = (price > price.rolling(30).mean()).astype(float) * 0.5
+
+    result = backtest(price, target, capital=1e7, commission=0.001, lag=1, mode='units')
+
+    # 素朴なループと一致する
+    units, cash = 0.0, 1e7
+    equity = []
+    held = np.r_[0.0, target.to_numpy()[:-1]]
+    for p, u in zip(price.to_numpy(), held):
+        cash -= (u - units) * p + abs(u - units) * p * 0.001
+        units = u
+        equity.append(cash + units * p)
+
+    assert np.allclose(result.equity, equity)
+    assert result.metrics['n_trades'] == (np.diff(held, prepend=0) != 0).sum()
+
+def test_backtest_fraction():
+    price = make_price()
+    target = (price > price.rolling(30).mean()).astype(float)
+
+    result = backtest(price, target, capital=1e7, commission=0.0, lag=1)
+
+    # 手数料がなければ保有中の値動きだけが資産に効く
+    held = np.r_[0.0, target.to_numpy()[:-1]]
+    ratio = np.r_[1.0, price.to_numpy()[1:] / price.to_numpy()[:-1]]
+    growth = np.cumprod(np.where(np.r_[0.0, held[:-1]] > 0, ratio, 1.0))
+    assert np.allclose(result.equity, 1e7 * growth)
+
+    result_fee = backtest(price, target, capital=1e7, commission=0.001, lag=1)
+    assert result_fee.metrics['final_equity'] < result.metrics['final_equity']
+    assert result_fee.metrics['fees'] > 0
+
+    # 全額を買っても現金は負にならない
+    assert (result_fee.df['cash'] > -1e-6).all()
+
+    metrics = result.metrics
+    assert metrics['max_drawdown'] <= 0
+    assert 0 <= metrics['exposure'] <= 1
+
+    with pytest.raises(ValueError):
+        backtest(price, target, mode='xxx')
@@ -1,8 +1,23 @@
 import pytest
+import numpy as np
 import pandas as pd
 
+from datetime import datetime, timedelta
+
 from fxtrade.api import CodePair, CRangePeriod
-from fxtrade.chart import ChartDummyAPI, Board, Chart
+from fxtrade.chart import ChartDummyAPI, ChartEmulatorAPI, ChartCursor, Board, Chart
+from fxtrade.pseudo import pseudo
+from fxtrade.utils import standardize, focus
+from fxtrade.partition import Manifest
+
+class SourceAPI(ChartDummyAPI):
+    def __init__(self, df):
+        self.df = df
+        self.requests = []
+
+    def download(self, code_pair, crange_period=None, t=None):
+        self.requests.append(t)
+        return focus(self.df, t)
 
 def test_ChartDummyAPI():
     api = ChartDummyAPI()
@@ -35,6 +50,125 @@ def test_Board_dummy():
     assert len(board.df) == 0
     assert board.interval is None
 
+def test_Board_sync_incremental(tmp_path):
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 4), timedelta(minutes=1)))
+    api = SourceAPI(df.loc[:datetime(2022, 2, 2, 12)])
+
+    board = Board(api=api,
+                  code_pair=CodePair('BTC', 'JPY'),
+                  crange_period=CRangePeriod('max', '1m'),
+                  data_dir=tmp_path)
+    api = board.api
+
+    # 初回は全部取得する
+    board.sync()
+    assert api.requests == [None]
+    assert len(board.read()) == len(api.df)
+
+    # 末尾以降だけを取得して、最新のパーティションだけを書き換える
+    mtime = (tmp_path / '2022-02-01.csv').stat().st_mtime_ns
+    api.df = df.drop(df.index[3000:3010])
+    df_new = board.sync()
+
+    assert api.requests[-1] == (datetime(2022, 2, 2, 12, 1), )
+    assert df_new.index[0] == datetime(2022, 2, 2, 12, 1)
+    assert (tmp_path / '2022-02-01.csv').stat().st_mtime_ns == mtime
+    assert board.gaps() == [(df.index[3000], df.index[3009])]
+
+    # 欠損と末尾を別々にリクエストする
+    api.df = df
+    df_new = board.sync()
+    assert api.requests[-2:] == [(df.index[3000], df.index[3009]), (df.index[-1] + timedelta(minutes=1), )]
+    assert len(df_new) == 10
+    assert board.gaps() == []
+
+    df_read = board.read()
+    assert len(df_read) == len(df)
+    assert np.allclose(df_read['close'].values, df['close'].values)
+
+    assert board.sync() is None
+
+def test_Board_sync_unfilled_gap(tmp_path):
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 3), timedelta(minutes=1)))
+    # メンテナンスで取引所にも存在しない期間
+    api = SourceAPI(df.drop(df.index[100:110]))
+
+    board = Board(api=api,
+                  code_pair=CodePair('BTC', 'JPY'),
+                  crange_period=CRangePeriod('max', '1m'),
+                  data_dir=tmp_path)
+    api = board.api
+
+    api.df = api.df.loc[:datetime(2022, 2, 2)]
+    board.sync()
+    assert board.gaps() == [(df.index[100], df.index[109])]
+
+    # 欠損を取り直しても何も返らなければ解決済みとして記録する
+    api.df = df.drop(df.index[100:110]).loc[:datetime(2022, 2, 2, 0, 5)]
+    df_new = board.sync()
+    assert api.requests[-2:] == [(df.index[100], df.index[109]), (datetime(2022, 2, 2, 0, 1), )]
+    assert len(df_new) == 5
+    assert board.gaps() == []
+    assert Manifest.load(tmp_path).resolved == [(df.index[100], df.index[109])]
+
+    # 以降は末尾だけを取得する
+    api.df = df.drop(df.index[100:110]).loc[:datetime(2022, 2, 2, 0, 10)]
+    df_new = board.sync()
+    assert api.requests[-1] == (datetime(2022, 2, 2, 0, 6), )
+    assert len(df_new) == 5
+
+def test_Board_sync_one_bar(tmp_path):
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 2), timedelta(minutes=1)))
+    api = SourceAPI(df.iloc[:-1])
+
+    board = Board(api=api,
+                  code_pair=CodePair('BTC', 'JPY'),
+                  crange_period=CRangePeriod('max', '1m'),
+                  data_dir=tmp_path)
+    api = board.api
+    board.sync()
+
+    # 1 分ごとの同期では新しい行は 1 本だけになる
+    api.df = df
+    df_new = board.sync()
+    assert len(df_new) == 1
+    assert df_new.index[0] == df.index[-1]
+
+    df_read = board.read()
+    assert len(df_read) == len(df)
+    assert df_read.index[-1] == df.index[-1]
+
+def test_Chart_sync_concurrent(tmp_path):
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 2), timedelta(minutes=1)))
+
+    chart = Chart(code_pair=CodePair('BTC', 'JPY'),
+                  api=SourceAPI(df),
+                  data_dir=tmp_path,
+                  crange_period=['max-1m', 'max-15m'])
+
+    ret, summary = chart.sync(data_dir=tmp_path, max_workers=2, return_summary=True)
+
+    assert set(ret.keys()) == {'max-1m', 'max-15m'}
+    assert summary.loc['max-1m', 'rows'] == 24 * 60
+    assert summary['error'].isna().all()
+    assert len(chart.read(data_dir=tmp_path)['max-15m']) == 24 * 4
+
+    ret, summary = chart.update(force=True, return_summary=True)
+    assert summary.loc['max-1m', 'rows'] == 0
+
+    # ダウンロードはボードに結合しないので、ボードにない行だけを数える
+    ret, summary = chart.download(return_summary=True)
+    assert len(ret['max-1m']) == 24 * 60
+    assert summary.loc['max-1m', 'rows'] == 0
+
+    chart.clear()
+    ret, summary = chart.download(return_summary=True)
+    assert summary.loc['max-1m', 'rows'] == 24 * 60
+    assert len(chart['max-1m'].df) == 0
+
+    ret, summary = chart.update(force=True, return_summary=True)
+    assert summary.loc['max-1m', 'rows'] == 24 * 60
+
 def test_Chart_make_crange_period_list():
     chart = Chart(
         code_pair=CodePair('BTC', 'JPY'),
@@ -176,4 +310,67 @@ def test_Chart_dummy():
 
 # def test_SingleChart():
 #     print(glob('tests/emulator/*'))
-#     #assert False
\ No newline at end of file
+#     #assert False
+
+def test_ChartCursor():
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 2), timedelta(minutes=1)))
+    cursor = ChartCursor(df)
+    assert len(cursor) == 0
+
+    for t in [datetime(2022, 2, 1, 0, 30), datetime(2022, 2, 1, 0, 30, 30), datetime(2022, 2, 1, 12)]:
+        frame = cursor.advance(t).frame
+        expected = focus(df, t)
+        assert len(frame) == len(expected)
+        assert frame.index[-1] == expected.index[-1]
+        # コピーせずに元のデータフレームを参照する
+        assert np.shares_memory(frame['close'].to_numpy(), df['close'].to_numpy())
+        assert np.array_equal(cursor.column('close'), expected['close'].to_numpy())
+
+    # 位置が変わらなければ同じビューを返す
+    assert cursor.advance(datetime(2022, 2, 1, 12, 0, 30)).frame is frame
+    assert len(cursor.window(5)) == 5
+    assert cursor.window(5).index[-1] == datetime(2022, 2, 1, 12)
+
+    with pytest.raises(ValueError):
+        cursor.advance(datetime(2022, 2, 1))
+
+    with pytest.raises(ValueError):
+        ChartCursor(df.iloc[::-1])
+
+def test_ChartEmulatorAPI_cursor(tmp_path):
+    class EmulatedAPI(SourceAPI):
+        @property
+        def code_pairs(self):
+            return [CodePair('BTC', 'JPY')]
+
+    code_pair, crange_period = CodePair('BTC', 'JPY'), CRangePeriod('max', '1m')
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 2), timedelta(minutes=1)))
+    Board(code_pair=code_pair, crange_period=crange_period, api=EmulatedAPI(df), df=df,
+          data_dir=tmp_path / code_pair.short / crange_period.short).save()
+
+    api = ChartEmulatorAPI(api=EmulatedAPI(df), source_dir=tmp_path, on_memory=True)
+
+    ts = [datetime(2022, 2, 1, 1), datetime(2022, 2, 1, 5), datetime(2022, 2, 1, 3)]
+    for t in ts:
+        ret = api.download(code_pair, crange_period, t=t)
+        assert len(ret) == len(focus(df, t))
+        assert ret.index[-1] == t
+
+    # 時刻が戻ったときは切り出しに戻り、カーソルは動かない
+    cursor = api.cursor(code_pair, crange_period)
+    assert cursor.t == ts[1]
+
+    ret = api.download(code_pair, crange_period, t=(ts[2], ts[1]))
+    assert len(ret) == len(focus(df, (ts[2], ts[1])))
+
+    # Board からの読み込みもカーソルのビューをそのまま持つ
+    board = Board(code_pair=code_pair, crange_period=crange_period, api=api)
+    # Board は api を複製して持つので、複製されたエミュレータのカーソルと比べる
+    base = board.api.cursor(code_pair, crange_period).column('close')
+    for t in [datetime(2022, 2, 1, 6), datetime(2022, 2, 1, 7)]:
+        assert np.shares_memory(board.download(t)['close'].to_numpy(), base)
+
+        board.update(t=t, force=True)
+        assert board.df.index[-1] == t
+        assert len(board.df) == len(focus(df, t))
+        assert np.shares_memory(board.df['close'].to_numpy(), base)
@@ -0,0 +1,80 @@
+import pickle
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from fractions import Fraction
+
+from fxtrade.fixed import FixedRate, FixedStock, FixedTrade, SCALE, to_units, to_units_array
+from fxtrade.stocks import JPY, BTC
+from fxtrade.trade import Trade
+
+def test_to_units():
+    assert to_units(1) == SCALE
+    assert to_units('0.006') == 600000
+    assert to_units(0.006) == 600000
+    assert to_units(Fraction(1, 4)) == SCALE // 4
+
+    with pytest.raises(ValueError):
+        to_units('0.000000001')
+
+    assert to_units_array([0.006, 1.5]).tolist() == [600000, 150000000]
+    assert to_units_array(np.array(['0.1', '2'], dtype=object)).tolist() == [10000000, 200000000]
+
+def test_FixedStock():
+    x = FixedStock('BTC', '0.006')
+
+    assert not hasattr(x, '__dict__')
+    assert x.q == Fraction('0.006')
+    assert x.code is FixedStock('BTC', 1).code
+
+    with pytest.raises(AttributeError):
+        x.units = 1
+
+    assert x + FixedStock('BTC', '0.004') == FixedStock('BTC', '0.01')
+    assert x - '0.001' == '0.005'
+    assert x > 0
+    assert x * 2 == FixedStock('BTC', '0.012')
+
+    with pytest.raises(TypeError):
+        x + FixedStock('JPY', 1)
+
+    assert FixedStock.from_stock(BTC('0.006')) == x
+    assert x.to_stock() == BTC('0.006')
+    assert pickle.loads(pickle.dumps(x)) == x
+
+def test_FixedRate():
+    x = FixedStock('JPY', 25000)
+    y = FixedStock('BTC', '0.005')
+    r = FixedRate.from_stocks(x, y)
+
+    assert r.r == Fraction(1, 5000000)
+    assert r * x == y
+    assert ~r * y == x
+    assert r == FixedRate('JPY', 'BTC', '0.0000002')
+
+def test_FixedTrade():
+    t = pd.Timestamp(2022, 4, 1)
+    trade = Trade(x=JPY('25000'), y=BTC('0.005'), id='JOR000001', t=t)
+
+    fixed = FixedTrade.from_trade(trade)
+    assert fixed.t == t.value
+    assert fixed.rate.to_rate() == trade.rate
+
+    back = fixed.to_trade()
+    assert (back.x, back.y, back.t, back.id) == (trade.x, trade.y, trade.t, trade.id)
+
+    with pytest.raises(TypeError):
+        FixedTrade(fixed.x, fixed.y, None)
+
+    n = 1000
+    ts = pd.date_range('2022-04-01', periods=n, freq='1min')
+    trades = FixedTrade.from_arrays(ts, 'JPY', np.arange(n) + 20000, ['BTC'] * n, np.full(n, 0.005),
+                                    id=[ f'JOR{i:06d}' for i in range(n) ])
+
+    assert len(trades) == n
+    assert trades[10].t == ts[10].value
+    assert trades[10].x == FixedStock('JPY', 20010)
+    assert trades[10].y.code is trades[20].y.code
+    assert pickle.loads(pickle.dumps(trades[10])).y == trades[10].y
@@ -1,10 +1,17 @@
 import pytest
 
+import numpy as np
+
+from datetime import datetime, timedelta
+
 from fxtrade.stock import Stock
 from fxtrade.wallet import Wallet
 from fxtrade.chart import ChartDummyAPI
 from fxtrade.trader import TraderDummyAPI, Trader
 from fxtrade.fx import FX
+from fxtrade.backtest import backtest
+from fxtrade.pseudo import pseudo
+from fxtrade.utils import standardize, focus
 
 def test_FX():
     chart_api = ChartDummyAPI()
@@ -55,4 +62,43 @@ def test_FX():
 #         "    data_dir='None',\n" + \
 #         "    markets={\n" + \
 #         "    }\n" + \
-#         ")"
\ No newline at end of file
+#         ")"
+
+
+def test_FX_back_test_vectorized(tmp_path):
+    fx = FX(name='trader1',
+            origin='JPY',
+            chart_api=ChartDummyAPI(),
+            trader_api=TraderDummyAPI(),
+            data_dir=tmp_path)
+    fx.generate_client('BTC', crange_period=['max-15m'])
+
+    trader = fx['BTC']
+    trader.wallet.add(Stock('JPY', 10000000))
+
+    df = standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 8), timedelta(minutes=15)))
+    trader.chart[trader.chart.crange_period[0]]._df = df
+
+    def function(df):
+        return (df['close'] > df['close'].rolling(8).mean()).astype(float).to_numpy()
+
+    result = fx.back_test_vectorized(function)
+
+    # 包んでいるエンジンを同じ足と目標で呼んだ結果と一致し、資金は財布の JPY になる
+    expected = backtest(df['close'], function(df), capital=1e7)
+    assert np.allclose(result.equity, expected.equity)
+    assert np.allclose(result.metrics, expected.metrics)
+    assert result.metrics['n_trades'] > 0
+
+    # 手数料なしなら保有中の値動きだけが資産に効く
+    price = df['close'].to_numpy()
+    # lag=1 で i 本目の終値で建てた建玉は i+1 本目から i+2 本目の値動きを受ける
+    held = np.r_[0.0, 0.0, function(df)[:-2]]
+    ratio = np.r_[1.0, price[1:] / price[:-1]]
+    growth = np.cumprod(np.where(held > 0, ratio, 1.0))
+    assert np.isclose(result.metrics['final_equity'], 1e7 * growth[-1])
+
+    # t で範囲を絞れる
+    t = datetime(2022, 2, 3)
+    result = fx.back_test_vectorized(function, t=t)
+    assert len(result.equity) == len(focus(df, t))
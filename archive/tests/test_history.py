@@ -1,11 +1,12 @@
 import pytest
 
+import numpy as np
 import pandas as pd
 
 from fractions import Fraction
 
 from fxtrade.stock import Stock, Rate
-from fxtrade.stocks import JPY, BTC
+from fxtrade.stocks import JPY, BTC, USD
 from fxtrade.trade import Trade
 from fxtrade.history import History
 
@@ -149,4 +150,89 @@ def test_close():
     
     desc = new_hist.describe('JPY', 'BTC')
     assert desc['position'] == Fraction('0')
-    
\ No newline at end of file
+    
+def reference_add(df, trades):
+    # 以前の実装（毎回全体を連結して正規化する）
+    new = pd.DataFrame([ t.as_series() for t in trades ])
+    return History.normalize(pd.concat([df, new]).reset_index(drop=True))
+
+def test_ledger():
+    trades = [
+        Trade(x=JPY(str(20000 + i)), y=BTC('0.005'), id=f'JOR{i:06d}', t=pd.Timestamp(2022, 4, 1) + pd.Timedelta(hours=(7 * i) % 40))
+        for i in range(40)
+    ]
+    trades[5].info['memo'] = 'x'
+
+    hist = History()
+    expected = History.empty()
+    for i in range(0, 40, 3):
+        hist.add(trades[i:i + 3])
+        expected = reference_add(expected, trades[i:i + 3])
+
+        pd.testing.assert_frame_equal(hist.df, expected, check_index_type=False)
+
+    assert list(hist.df.columns) == list(Trade.columns) + ['memo']
+    assert hist.n_trades == 40
+    assert hist.first_timestamp == pd.Timestamp(2022, 4, 1)
+    assert hist.last_timestamp == pd.Timestamp(2022, 4, 2, 15)
+
+    # drop はラベルを保ち、次の add で振り直す
+    hist.drop([0, 7])
+    expected = expected.drop([0, 7])
+    pd.testing.assert_frame_equal(hist.df, expected, check_index_type=False)
+
+    with pytest.raises(KeyError):
+        hist.drop([0])
+
+    hist.add(trades[0])
+    expected = reference_add(expected, trades[:1])
+    pd.testing.assert_frame_equal(hist.df, expected, check_index_type=False)
+
+    # copy は独立している
+    other = hist.copy()
+    other.add(trades[1])
+    assert other.n_trades == hist.n_trades + 1
+
+    hist.add(expected.iloc[:2])
+    assert hist.n_trades == 41
+
+def reference_describe(df, code_from, code_to):
+    # 以前の History.describe
+    df = df[(df['from'] == code_from) & (df['to'] == code_to)]
+    rate_mean = np.nan if df['X(t)'].sum() == 0 else df['Y(t+dt)'].sum() / df['X(t)'].sum()
+    mins = df[df['R(yt/xt)'] == df['R(yt/xt)'].min()]
+    maxs = df[df['R(yt/xt)'] == df['R(yt/xt)'].max()]
+    return [
+        code_from, code_to, 0, 0, df['X(t)'].sum(), df['Y(t+dt)'].sum(), rate_mean,
+        mins['X(t)'].sum(), mins['Y(t+dt)'].sum(), df['R(yt/xt)'].min(),
+        maxs['X(t)'].sum(), maxs['Y(t+dt)'].sum(), df['R(yt/xt)'].max(),
+    ]
+
+def test_summarize():
+    rng = np.random.default_rng(0)
+    codes = [ (JPY, BTC), (BTC, JPY), (JPY, USD), (USD, JPY) ]
+    trades = []
+    for i in range(200):
+        x, y = codes[rng.integers(len(codes))]
+        q = Fraction(int(rng.integers(1, 5)), 1000)
+        trades.append(Trade(x=x(q * 4000000) if x is JPY else x(q), y=y(q) if x is JPY else y(q * 4100000),
+                            id=f'JOR{i:06d}', t=pd.Timestamp(2022, 4, 1) + pd.Timedelta(minutes=i)))
+
+    hist = History(trades)
+    new_hist, report = hist.close()
+    ret = hist.summarize().set_index(['capital', 'via'])
+
+    # 決済済みの組と未決済の組が全て含まれる
+    keys = set(zip(report.df['code_X'], report.df['code_Y'])) | set(zip(new_hist.df['from'], new_hist.df['to']))
+    assert set(ret.index) == keys
+
+    for code_from, code_to in keys:
+        expected = reference_describe(new_hist.df, code_from, code_to)[4:]
+        actual = ret.loc[(code_from, code_to)].iloc[2:].tolist()
+        assert all((a == e) or (pd.isna(a) and pd.isna(e)) for a, e in zip(actual, expected))
+
+        rep = report.df[(report.df['code_X'] == code_from) & (report.df['code_Y'] == code_to)]
+        assert ret.loc[(code_from, code_to), 'used'] == float(rep['X(s)'].sum())
+
+    groups = hist.group_by_code()
+    assert set(groups.groups) == { f'{x}-{y}' for x, y in zip(hist.df['from'], hist.df['to']) }
@@ -0,0 +1,118 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.stocks import JPY, BTC
+from fxtrade.trade import Trade
+from fxtrade.history import History, Report
+from fxtrade.matching import LotMatcher
+
+def make_trades(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    trades = []
+    for i in range(n):
+        t = pd.Timestamp(2022, 4, 1) + pd.Timedelta(minutes=i)
+        jpy = JPY(str(int(rng.integers(20000, 30000))))
+        btc = BTC(str(int(rng.integers(1, 10)) / 1000))
+        if rng.random() < 0.5:
+            trades.append(Trade(x=jpy, y=btc, id=f'JOR{i:06d}', t=t))
+        else:
+            trades.append(Trade(x=btc, y=jpy, id=f'JOR{i:06d}', t=t))
+    return trades
+
+def reference_close(hist):
+    # 取引ごとに History.settle する版（settle も LotMatcher を使うので一貫性の確認にとどまる。
+    # 正しさは test_close_by_hand で確認する）
+    trades = hist.as_trade_list(sort_by='t', ascending=True)
+
+    ret = History()
+    ret.add(trades.pop(0))
+
+    report = Report()
+    for trade in trades:
+        ret, settled = ret.settle(trade)
+        if settled is None:
+            ret.add(trade)
+        else:
+            report.add(settled)
+
+    return ret, report
+
+def test_close_by_hand():
+    # 手計算した FIFO の決済
+    #   L1: 20000 JPY -> 0.004 BTC, L2: 30000 JPY -> 0.005 BTC
+    #   S1: 0.002 BTC -> 14000 JPY ... L1 の方が大きいので L1 を分割 (10000 JPY 分)
+    #   S2: 0.004 BTC -> 28000 JPY ... L1 の残り 0.002 BTC より大きいので S2 を分割し、
+    #       残りの 0.002 BTC で L2 を分割 (12000 JPY 分)
+    trades = [
+        Trade(x=JPY('20000'), y=BTC('0.004'), id='L1', t=pd.Timestamp(2022, 4, 1)),
+        Trade(x=JPY('30000'), y=BTC('0.005'), id='L2', t=pd.Timestamp(2022, 4, 2)),
+        Trade(x=BTC('0.002'), y=JPY('14000'), id='S1', t=pd.Timestamp(2022, 4, 3)),
+        Trade(x=BTC('0.004'), y=JPY('28000'), id='S2', t=pd.Timestamp(2022, 4, 4)),
+    ]
+
+    hist, report = History(trades).close(method='fifo')
+
+    rows = [ (r['before_id'], r['after_id'], float(r['X(s)']), float(r['Z(t+dt)'])) for _, r in report.df.iterrows() ]
+    assert rows == [
+        ('L1', 'S1', 10000.0, 14000.0),
+        ('L1', 'S2', 10000.0, 14000.0),
+        ('L2', 'S2', 12000.0, 14000.0),
+    ]
+
+    lots = hist.as_trade_list()
+    assert len(lots) == 1
+    assert lots[0].id == 'L2'
+    assert lots[0].x == JPY('18000')
+    assert lots[0].y == BTC('0.003')
+
+def totals(df, group, columns):
+    return { k: tuple(sum(v) for v in zip(*x[columns].to_numpy())) for k, x in df.groupby(group) }
+
+def test_close():
+    hist = History(make_trades())
+
+    expected_hist, expected_report = reference_close(hist)
+    new_hist, report = hist.close()
+
+    assert len(report.df) == len(expected_report.df)
+    assert totals(report.df, 'code_X', ['X(s)', 'Z(t+dt)']) == totals(expected_report.df, 'code_X', ['X(s)', 'Z(t+dt)'])
+    assert totals(new_hist.df, 'from', ['X(t)', 'Y(t+dt)']) == totals(expected_hist.df, 'from', ['X(t)', 'Y(t+dt)'])
+
+def test_LotMatcher():
+    lots = [
+        Trade(x=JPY('20000'), y=BTC('0.006'), id='JOR000001', t=pd.Timestamp(2022, 4, 1)),
+        Trade(x=JPY('25000'), y=BTC('0.006'), id='JOR000002', t=pd.Timestamp(2022, 4, 2)),
+        Trade(x=JPY('23000'), y=BTC('0.006'), id='JOR000003', t=pd.Timestamp(2022, 4, 3)),
+    ]
+    sell = Trade(x=BTC('0.008'), y=JPY('40000'), id='JOR000004', t=pd.Timestamp(2022, 4, 4))
+
+    expected = {
+        'fifo': ['JOR000001', 'JOR000002'],
+        'lifo': ['JOR000003', 'JOR000002'],
+        'rate': ['JOR000002', 'JOR000003'],
+    }
+    for method, ids in expected.items():
+        matcher = LotMatcher(method=method)
+        for lot in lots:
+            matcher.push(lot)
+
+        pairs, rest = matcher.settle(sell)
+        assert rest is None
+        assert [ p.before.id for p in pairs ] == ids
+        assert sum(p.before.y.q for p in pairs) == sell.x.q
+
+        # 一部だけ決済されたロットが残る
+        assert matcher.n_lots == 2
+        assert sum(lot.y.q for lot in matcher.lots()) == 3 * lots[0].y.q - sell.x.q
+
+    # 持っている量より多く売ると残りが返る
+    matcher = LotMatcher(method='fifo')
+    matcher.push(lots[0])
+    pairs, rest = matcher.settle(sell)
+    assert len(pairs) == 1
+    assert rest.x.q == sell.x.q - lots[0].y.q
+
+    with pytest.raises(ValueError):
+        LotMatcher(method='average')
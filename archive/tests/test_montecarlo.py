@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+from fxtrade.brownian import Brownian, simulate_paths
+from fxtrade.montecarlo import monte_carlo
+from fxtrade.pseudo import pseudo
+
+def hold(df):
+    return np.ones(len(df))
+
+def test_simulate_paths():
+    chunks = list(simulate_paths(0.0, 1e-3, n_paths=10, n_steps=100, x0=6.5, seed=0, chunk_size=4))
+
+    assert [ len(c) for c in chunks ] == [4, 4, 2]
+    assert all(c.shape[1] == 101 for c in chunks)
+    assert all((c[:, 0] == 6.5).all() for c in chunks)
+
+    # 同じ seed なら同じパス
+    again = np.concatenate(list(simulate_paths(0.0, 1e-3, 10, 100, x0=6.5, seed=0, chunk_size=4)))
+    assert np.array_equal(np.concatenate(chunks), again)
+
+    # 正規分布はラプラス分布と分散を揃える
+    dx = np.diff(np.concatenate(list(simulate_paths(0.0, 1e-3, 200, 500, seed=1, distribution='gaussian'))))
+    assert np.isclose(dx.std(), np.sqrt(2) * 1e-3, rtol=0.05)
+
+def test_Brownian_simulate():
+    df = pseudo(datetime(2022, 2, 1), datetime(2022, 2, 8), timedelta(minutes=1))
+    brownian = Brownian(df).fit()
+
+    loc, scale = brownian.params(timedelta(minutes=4))
+    assert np.isclose(scale, brownian.params()[1] * 2)
+
+    paths = np.concatenate(list(brownian.simulate(20, 60, seed=0)))
+    assert paths.shape == (20, 61)
+    assert np.allclose(paths[:, 0], np.log10(df['close'].sort_index().iloc[-1]))
+
+def test_monte_carlo():
+    df = pseudo(datetime(2022, 2, 1), datetime(2022, 2, 3), timedelta(minutes=1))
+    brownian = Brownian(df).fit()
+
+    kwargs = dict(n_paths=12, n_steps=200, seed=0, chunk_size=5, capital=1e6, lag=0)
+    ret = monte_carlo(hold, brownian, **kwargs)
+
+    assert len(ret) == 12
+    assert ret.index.name == 'path'
+
+    # 全額保有し続けると最終資産は価格の比になる
+    paths = np.concatenate(list(brownian.simulate(12, 200, seed=0, chunk_size=5)))
+    assert np.allclose(ret['final_equity'], 1e6 * 10 ** (paths[:, -1] - paths[:, 0]))
+
+    pd.testing.assert_frame_equal(ret, monte_carlo(hold, brownian, n_jobs=2, **kwargs))
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from fxtrade.optimize import Optimizer, evaluate, grid, random_search, rolling_splits, walk_forward_splits
+
+def make_chart(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='15min')
+    close = 3.7e6 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    return pd.DataFrame({'close': close}, index=idx)
+
+def crossover(window):
+    def strategy(df):
+        return (df['close'] > df['close'].rolling(window).mean()).astype(float)
+    return strategy
+
+def broken(window):
+    raise ValueError('broken')
+
+def test_grid():
+    assert list(grid({'a': [1, 2], 'b': ['x']})) == [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}]
+
+def test_random_search():
+    space = {'window': (5, 50), 'alpha': (0.01, 1.0, 'log'), 'mode': ['a', 'b']}
+    xs = list(random_search(space, 20, seed=0))
+
+    assert xs == list(random_search(space, 20, seed=0))
+    assert all(isinstance(x['window'], int) and 5 <= x['window'] <= 50 for x in xs)
+    assert all(0.01 <= x['alpha'] <= 1.0 for x in xs)
+    assert { x['mode'] for x in xs } <= {'a', 'b'}
+
+def test_splits():
+    assert walk_forward_splits(10, 4, 2) == [(0, 4, 4, 6), (0, 6, 6, 8), (0, 8, 8, 10)]
+    assert rolling_splits(10, 4, 2, step=3) == [(0, 4, 4, 6), (3, 7, 7, 9)]
+
+def test_Optimizer(tmp_path):
+    df = make_chart()
+    splits = rolling_splits(len(df), 1000, 500)
+    params = list(grid({'window': [10, 20, 40]}))
+
+    path = tmp_path / 'results.csv'
+    streamed = []
+    results = Optimizer(crossover, df, splits=splits, n_jobs=2, commission=0.001) \
+        .run(params, path=path, callback=streamed.append)
+
+    assert len(results) == len(params) * len(splits)
+    assert len(streamed) == len(results)
+    assert len(pd.read_csv(path)) == len(results)
+    assert results['error'].isna().all()
+
+    # 並列でも 1 つずつ計算したものと一致する
+    row = results[(results['window'] == 20) & (results['split'] == 1)].iloc[0]
+    expected = evaluate(crossover, df, {'window': 20}, splits[1], commission=0.001)
+    assert np.isclose(row['sharpe'], expected['sharpe'])
+
+    best = Optimizer(crossover, df, splits=splits).best(results)
+    assert list(best.index) == sorted(best.index, key=lambda w: -best.loc[w, 'mean'])
+    assert (best['count'] == len(splits)).all()
+
+def test_Optimizer_error():
+    df = make_chart(n=100)
+    results = Optimizer(broken, df).run([{'window': 10}])
+
+    assert results['error'].iloc[0] == "ValueError('broken')"
+    assert np.isnan(results['sharpe'].iloc[0])
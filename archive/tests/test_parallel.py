@@ -0,0 +1,39 @@
+import pytest
+import time
+
+from fxtrade.parallel import RateLimiter, run_tasks, raise_first_error
+
+def test_RateLimiter():
+    limiter = RateLimiter(calls=2, period=0.2)
+
+    begin = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.monotonic() - begin
+
+    # 2 回ずつしか通さないので 2 周期は待たされる
+    assert elapsed >= 0.4
+
+    with pytest.raises(ValueError):
+        RateLimiter(calls=0)
+
+def test_run_tasks():
+    def fail():
+        raise RuntimeError('failed')
+
+    tasks = [
+        ('a', lambda: [1, 2, 3]),
+        ('b', fail),
+        ('c', lambda: None),
+    ]
+
+    ret, summary = run_tasks(tasks, max_workers=3)
+
+    assert ret == {'a': [1, 2, 3], 'c': None}
+    assert list(summary.index) == ['a', 'b', 'c']
+    assert list(summary['rows']) == [3, 0, 0]
+    assert (summary['elapsed'] >= 0).all()
+    assert isinstance(summary.loc['b', 'error'], RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        raise_first_error(summary)
@@ -0,0 +1,123 @@
+import pytest
+
+import pandas as pd
+from datetime import datetime, timedelta
+
+from fxtrade.api import CodePair, CRangePeriod
+from fxtrade.chart import Board
+from fxtrade.partition import Manifest, MANIFEST_NAME
+from fxtrade.pseudo import pseudo
+from fxtrade.utils import standardize, default_read_function, default_restore_function
+
+def make_board(data_dir, s, t):
+    df = standardize(pseudo(s, t, timedelta(minutes=1)))
+
+    return Board(code_pair=CodePair('BTC', 'JPY'),
+                 crange_period=CRangePeriod('max', '1m'),
+                 data_dir=data_dir,
+                 df=df)
+
+def test_Manifest(tmp_path):
+    board = make_board(tmp_path, datetime(2022, 2, 1), datetime(2022, 2, 4))
+    board.save()
+
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+    manifest = Manifest.load(tmp_path)
+
+    assert manifest.names == ['2022-02-01.csv', '2022-02-02.csv', '2022-02-03.csv']
+
+    entry = manifest['2022-02-02.csv']
+    assert entry['rows'] == 24 * 60
+    assert pd.Timestamp(entry['min']) == datetime(2022, 2, 2)
+    assert pd.Timestamp(entry['max']) == datetime(2022, 2, 2, 23, 59)
+    assert manifest.verify(tmp_path / '2022-02-02.csv')
+
+    paths = sorted(tmp_path.glob('*.csv'))
+    assert manifest.select(paths, (datetime(2022, 2, 2, 12), datetime(2022, 2, 2, 13))) \
+        == [tmp_path / '2022-02-02.csv']
+    assert len(manifest.select(paths, datetime(2022, 2, 2))) == 2
+    assert len(manifest.select(paths, (datetime(2022, 2, 2, 0, 1), ))) == 2
+
+def test_Manifest_refresh(tmp_path):
+    board = make_board(tmp_path, datetime(2022, 2, 1), datetime(2022, 2, 3))
+    board.save()
+
+    (tmp_path / MANIFEST_NAME).unlink()
+    (tmp_path / '2022-02-01.csv').unlink()
+
+    manifest = Manifest.load(tmp_path)
+    assert len(manifest) == 0
+
+    paths = sorted(tmp_path.glob('*.csv'))
+    assert manifest.refresh(paths, default_read_function)
+    assert manifest.names == ['2022-02-02.csv']
+    assert not manifest.refresh(paths, default_read_function)
+
+def test_Manifest_empty_partition(tmp_path):
+    df = standardize(pseudo(datetime(2022, 1, 1), datetime(2022, 1, 4), timedelta(minutes=1)))
+    df = df.loc[(df.index < datetime(2022, 1, 2)) | (df.index >= datetime(2022, 1, 3))]
+    board = Board(code_pair=CodePair('BTC', 'JPY'),
+                  crange_period=CRangePeriod('max', '1m'),
+                  data_dir=tmp_path,
+                  df=df)
+    board.save()
+
+    # 行の無い日のファイルも空のパーティションとして記録される
+    manifest = Manifest.load(tmp_path)
+    assert manifest.names == ['2022-01-01.csv', '2022-01-02.csv', '2022-01-03.csv']
+    assert manifest['2022-01-02.csv']['rows'] == 0
+
+    paths = sorted(tmp_path.glob('*.csv'))
+    assert not manifest.refresh(paths, default_read_function)
+    assert manifest.select(paths) == [tmp_path / '2022-01-01.csv', tmp_path / '2022-01-03.csv']
+
+    # 作り直しても 2 回目以降は変更なし
+    (tmp_path / MANIFEST_NAME).unlink()
+    manifest = Manifest.load(tmp_path)
+    assert manifest.refresh(paths, default_read_function)
+    manifest.save()
+    manifest = Manifest.load(tmp_path)
+    assert not manifest.refresh(paths, default_read_function)
+    assert manifest.bounds == (df.index[0], df.index[-1])
+
+def test_Board_read_prunes_partitions(tmp_path):
+    board = make_board(tmp_path, datetime(2022, 2, 1), datetime(2022, 2, 10))
+    board.save()
+
+    opened = []
+    def restore_function(paths):
+        opened.extend(paths)
+        return default_restore_function(paths)
+
+    t = (datetime(2022, 2, 5, 10), datetime(2022, 2, 5, 11))
+    df = board.read(t=t, restore_function=restore_function)
+
+    assert [ p.name for p in opened ] == ['2022-02-05.csv']
+    assert df.index[0] == datetime(2022, 2, 5, 10)
+    assert df.index[-1] == datetime(2022, 2, 5, 11)
+    assert len(df) == 61
+
+    with pytest.raises(FileNotFoundError):
+        board.read(t=(datetime(2023, 1, 1), datetime(2023, 1, 2)))
+
+def test_Board_gaps(tmp_path):
+    board = make_board(tmp_path, datetime(2022, 2, 1), datetime(2022, 2, 3))
+    board._df = board.df.drop(board.df.index[60:120])
+    board.save()
+
+    assert board.find_gaps() == [(pd.Timestamp(2022, 2, 1, 1), pd.Timestamp(2022, 2, 1, 1, 59))]
+    assert board.gaps() == board.find_gaps()
+
+    # 欠損部分を埋めて保存すると記録からも消える
+    board_next = make_board(tmp_path, datetime(2022, 2, 1), datetime(2022, 2, 1, 3))
+    board_next.save()
+    assert board.gaps() == []
+
+    # 保存済みの末尾から離れたデータを保存すると間が欠損になる
+    board_far = make_board(tmp_path, datetime(2022, 2, 5), datetime(2022, 2, 6))
+    board_far.save()
+    assert board.gaps() == [(pd.Timestamp(2022, 2, 3), pd.Timestamp(2022, 2, 4, 23, 59))]
+
+    assert len(board.regularize()) == 2 * 24 * 60
+    assert board.find_gaps() == []
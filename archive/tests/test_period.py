@@ -1,5 +1,8 @@
 import pytest
 
+import numpy as np
+import pandas as pd
+
 from datetime import timedelta
 
 from fxtrade.period import to_seconds, to_period_str, is_divisor, Period, CRange, CRangePeriod
@@ -86,4 +89,50 @@ def test_CRangePeriod():
     
     xs = {}
     xs[CRangePeriod('max', '1m')] = 5
-    assert xs[CRangePeriod('max', '1m')] == 5
\ No newline at end of file
+    assert xs[CRangePeriod('max', '1m')] == 5
+
+
+def test_Period_interned():
+    assert Period('1h') is Period('1h')
+    assert Period(Period('1h')) is Period('1h')
+    assert CRange('1h') is not Period('1h')
+    assert CRangePeriod('max', '1m') is CRangePeriod(CRange('max'), Period('1m'))
+    assert Period('1h').copy() is Period('1h')
+
+    # 等しい周期は hash も等しい
+    assert Period('1d') == Period('24h')
+    assert hash(Period('1d')) == hash(Period('24h'))
+    assert Period('24h') in { Period('1d') }
+    assert 'max-1m' in { CRangePeriod('max', '1m') }
+
+    with pytest.raises(AttributeError):
+        Period('1h')._seconds = 60
+
+    with pytest.raises(TypeError):
+        Period(3600)
+
+def test_Period_grid():
+    p = Period('15m')
+    assert p.ns == 15 * 60 * 10**9
+    assert p.origin == 0
+    assert p.timedelta == pd.Timedelta(minutes=15)
+    assert Period('max').ns == -1
+
+    ts = pd.DatetimeIndex(['2022-04-01 00:00', '2022-04-01 00:07', '2022-04-01 00:15:00.5'])
+    values = ts.values
+
+    assert (p.floor(values) == pd.DatetimeIndex(['2022-04-01 00:00', '2022-04-01 00:00', '2022-04-01 00:15']).values).all()
+    assert (p.ceil(values) == pd.DatetimeIndex(['2022-04-01 00:00', '2022-04-01 00:15', '2022-04-01 00:30']).values).all()
+    assert list(p.is_aligned(ts)) == [True, False, False]
+
+    ids = p.bucket_id(values)
+    assert ids[0] == ids[1] == ids[2] - 1
+    assert (p.floor(values) == pd.DatetimeIndex(ts).floor('15min').values).all()
+    assert (p.ceil(values) == pd.DatetimeIndex(ts).ceil('15min').values).all()
+
+    # 秒単位の配列や単一の Timestamp も扱える
+    assert p.floor(values.astype('datetime64[s]'))[1] == np.datetime64('2022-04-01T00:00')
+    assert p.bucket_id(pd.Timestamp('2022-04-01 00:07')) == ids[1]
+
+    with pytest.raises(ValueError):
+        Period('max').floor(values)
@@ -0,0 +1,71 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+from scipy.stats import laplace
+
+from fxtrade.analysis import analyze, estimate_probability
+from fxtrade.rolling import LogReturns, index_step, laplace_cdf, laplace_mle, \
+    rolling_mean, rolling_median, rolling_std, rolling_sum, rolling_var
+
+def make_series(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='1min')
+    xs = pd.Series(3.7e6 * np.exp(np.cumsum(rng.laplace(0, 1e-3, n))), index=idx, name='close')
+    return xs
+
+def test_rolling():
+    xs = make_series().apply(np.log10).diff()
+    xs.iloc[100:103] = np.nan
+    x = xs.to_numpy()
+
+    for window in [1, 3, 20, 100]:
+        r = xs.rolling(window)
+        assert np.allclose(rolling_sum(x, window), r.sum(), equal_nan=True)
+        assert np.allclose(rolling_mean(x, window), r.mean(), equal_nan=True)
+        assert np.allclose(rolling_var(x, window), r.var(), equal_nan=True)
+        assert np.allclose(rolling_std(x, window), r.std(), equal_nan=True)
+        assert np.allclose(rolling_median(x, window), r.median(), equal_nan=True)
+
+    assert np.isnan(rolling_sum(x[:2], 3)).all()
+
+    with pytest.raises(ValueError):
+        rolling_sum(x, 0)
+
+def test_laplace():
+    x = np.random.default_rng(0).laplace(0.1, 2.0, 10000)
+
+    loc, scale = laplace_mle(x)
+    assert np.isclose(loc, np.median(x))
+    assert np.isclose(scale, np.abs(x - loc).mean())
+
+    ys = np.linspace(-10, 10, 101)
+    assert np.allclose(laplace_cdf(ys, loc, scale), laplace.cdf(ys, loc=loc, scale=scale))
+
+def test_index_step():
+    xs = make_series(n=10)
+    assert index_step(xs.index) == pd.Timedelta(minutes=1)
+
+    with pytest.raises(ValueError):
+        index_step(xs.index.delete(3))
+
+def test_LogReturns():
+    xs = make_series()
+    returns = LogReturns(xs)
+
+    # 以前の pandas と scipy による実装と一致する
+    log = xs.apply(np.log10)
+    diff = log.diff()
+    loc, b = diff.median(), np.abs(diff - diff.median()).mean()
+    for window in [1, 3]:
+        ys = diff.rolling(window).sum()
+        expected = laplace.cdf(-np.abs(ys - ys.median()), loc=0, scale=b * np.sqrt(window)) * 2
+
+        assert np.allclose(returns.probability(window), expected, equal_nan=True)
+        assert np.allclose(estimate_probability(diff, window), expected, equal_nan=True)
+
+    df = analyze(xs)
+    assert list(df.columns) == ['dt', 'close', 'log', 'diff', 'prob']
+    assert np.allclose(df['log'], log)
+    assert np.allclose(df['diff'], diff, equal_nan=True)
+    assert np.isclose(returns.brown_param(), b / np.sqrt(60))
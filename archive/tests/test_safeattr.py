@@ -0,0 +1,74 @@
+import copy
+import pickle
+import pytest
+
+from pathlib import Path
+
+from fxtrade.safeattr import SafeAttrABC, immutable, protected, typed
+
+class Item(SafeAttrABC):
+    def __init__(self):
+        self.name = immutable('item', str)
+        self.data_dir = immutable('./data', Path, f=Path, optional=True)
+        self.values = protected([1, 2], list)
+        self.count = typed(0, int)
+        self._cache = None
+
+def test_SafeAttrABC():
+    item = Item()
+
+    assert item.name == 'item'
+    assert item._name == 'item'
+    assert item.data_dir == Path('./data')
+
+    with pytest.raises(AttributeError):
+        item.name = 'other'
+    with pytest.raises(AttributeError):
+        item._name = 'other'
+
+    # protected は '_x' からだけ書き換えられる
+    with pytest.raises(AttributeError):
+        item.values = [3]
+    item._values = [3]
+    assert item.values == [3]
+    with pytest.raises(TypeError):
+        item._values = 3
+
+    # typed はどちらからでも書き換えられる
+    item.count = 5
+    assert item._count == 5
+    item._count = 6
+    assert item.count == 6
+    with pytest.raises(TypeError):
+        item.count = 'a'
+    assert item.count == 6
+
+    # 管理下にないメンバはふつうの属性
+    item._cache = {}
+    assert item._cache == {}
+
+    with pytest.raises(AttributeError):
+        del item.name
+
+def test_arg_selector():
+    item = Item()
+
+    assert item.arg_data_dir() == Path('./data')
+    assert item.arg_data_dir('./other') == Path('./other')
+
+    with pytest.raises(TypeError):
+        item.arg_count('a')
+
+def test_copy():
+    item = Item()
+
+    # インスタンスごとにクラスを作らないので pickle できる
+    assert type(item) is Item
+    other = pickle.loads(pickle.dumps(item))
+    assert other.values == [1, 2]
+
+    other = copy.deepcopy(item)
+    other._values = [4]
+    assert item.values == [1, 2]
+    with pytest.raises(AttributeError):
+        other.name = 'other'
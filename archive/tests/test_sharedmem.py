@@ -0,0 +1,59 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+from fxtrade.pseudo import pseudo
+from fxtrade.sharedmem import SharedArrays, map_shared
+from fxtrade.utils import standardize
+
+def make_chart():
+    return standardize(pseudo(datetime(2022, 2, 1), datetime(2022, 2, 3), timedelta(minutes=1)))
+
+def column_sum(arrays, key):
+    return float(arrays[key].sum())
+
+def close_mean(arrays, n):
+    return float(arrays.to_frame()['close'].iloc[:n].mean())
+
+def test_SharedArrays():
+    xs = np.arange(10, dtype=float)
+    ys = np.arange(7, dtype=np.int32)
+
+    with SharedArrays.create({'xs': xs, 'ys': ys}) as shared:
+        attached = SharedArrays.attach(shared.descriptor)
+
+        assert attached.keys() == ['xs', 'ys']
+        assert np.array_equal(attached['xs'], xs)
+        assert np.array_equal(attached['ys'], ys)
+        assert attached['ys'].dtype == np.int32
+
+        with pytest.raises(ValueError):
+            attached['xs'][0] = 1
+
+        assert list(map_shared(column_sum, shared, ['xs', 'ys'], max_workers=2)) == [45.0, 21.0]
+        attached.close()
+
+def test_SharedArrays_from_frame(tmp_path):
+    df = make_chart()
+
+    for path in [None, tmp_path / 'shared']:
+        with SharedArrays.from_frame(df, path=path) as shared:
+            attached = SharedArrays.attach(shared.descriptor)
+            ret = attached.to_frame()
+
+            pd.testing.assert_frame_equal(ret, df, check_index_type=False)
+            assert ret.index.equals(df.index)
+
+            # コピーせずに共有メモリを参照している
+            assert np.shares_memory(ret['close'].to_numpy(), attached['__block1__'])
+
+            assert list(map_shared(close_mean, shared, [10], max_workers=1)) == [df['close'].iloc[:10].mean()]
+            del ret
+            attached.close()
+
+    assert not (tmp_path / 'shared').exists()
+
+    with pytest.raises(TypeError):
+        SharedArrays.from_frame(pd.DataFrame({'a': ['x']}))
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from fxtrade.analysis import analyze, emaverage, estimate_probability
+from fxtrade.stream import Pipeline, Diff, EMA, LaplaceProbability, LastTrue, Log10, LogDiff, RollingSum
+
+def make_series(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2022-02-01', periods=n, freq='15min')
+    return pd.Series(3.7e6 * np.exp(np.cumsum(rng.normal(0, 1e-3, n))), index=idx, name='low')
+
+def make_pipeline(xs, window=3):
+    return Pipeline([
+        ('log', Log10(), 'x'),
+        ('diff', Diff(), 'log'),
+        ('dif', RollingSum(window), 'diff'),
+        ('prob', LaplaceProbability.fit(xs.apply(np.log10).diff(), window), 'dif'),
+        ('gmeans', EMA(0.87, pd.Timedelta(minutes=15)), 'log'),
+        ('rise', LastTrue(lambda p: p < 0.4), 'prob'),
+    ])
+
+def test_operators():
+    xs = make_series()
+    dt = pd.Timedelta(minutes=15)
+
+    df = analyze(xs)
+    out = make_pipeline(xs).run(xs)
+
+    assert np.allclose(out['log'], df['log'])
+    assert np.allclose(out['diff'], df['diff'], equal_nan=True)
+    assert np.allclose(out['dif'], df['diff'].rolling(3).sum(), equal_nan=True)
+    assert np.allclose(out['prob'], estimate_probability(df['diff'], 3), equal_nan=True)
+    assert np.allclose(out['gmeans'], emaverage(df['log'], 0.87, dt))
+
+    prob = estimate_probability(df['diff'], 3)
+    assert out['rise'].iloc[-1] == prob[prob < 0.4].index[-1]
+
+    logdiff = LogDiff()
+    ys = [ logdiff.update(t, x) for t, x in xs.items() ]
+    assert np.allclose(ys, df['diff'], equal_nan=True)
+
+def test_Pipeline_snapshot(tmp_path):
+    xs = make_series()
+
+    pipeline = make_pipeline(xs)
+    out = pipeline.run(xs)
+
+    # 途中から再開しても同じ結果になる
+    resumed = make_pipeline(xs)
+    resumed.run(xs.iloc[:600])
+    path = resumed.save(tmp_path / 'state.json')
+
+    restored = make_pipeline(xs).load(path)
+    assert restored.last == xs.index[599]
+
+    out_resumed = restored.run(xs)
+    assert len(out_resumed) == 400
+    assert np.allclose(out_resumed['gmeans'], out['gmeans'].iloc[600:])
+    assert np.allclose(out_resumed['dif'], out['dif'].iloc[600:])
+    assert (out_resumed['rise'] == out['rise'].iloc[600:]).all()
@@ -1,8 +1,12 @@
 import pytest
 
-from datetime import datetime
+import numpy as np
+import pandas as pd
 
-from fxtrade.timeseries import get_first_timestamp
+from datetime import datetime, timedelta
+
+from fxtrade.timeseries import get_first_timestamp, \
+    year_sections, month_sections, day_sections, section_bounds, split_sections
 
 def test_delta():
     pass
@@ -30,4 +34,46 @@ def test_get_first_timestamp():
     assert get_first_timestamp(t, '15s') == datetime(2023, 3, 14, 15, 9, 15)
     assert get_first_timestamp(t, '10s') == datetime(2023, 3, 14, 15, 9, 20)
     assert get_first_timestamp(t, '5s') == datetime(2023, 3, 14, 15, 9, 25)
-    assert get_first_timestamp(t, '1s') == datetime(2023, 3, 14, 15, 9, 26)
\ No newline at end of file
+    assert get_first_timestamp(t, '1s') == datetime(2023, 3, 14, 15, 9, 26)
+
+def test_sections():
+    begin, end = datetime(2022, 11, 30, 12), datetime(2023, 2, 1, 3)
+
+    assert list(year_sections(begin, end)) == [
+        (datetime(2022, 1, 1), datetime(2023, 1, 1)),
+        (datetime(2023, 1, 1), datetime(2024, 1, 1)),
+    ]
+    assert list(month_sections(begin, end)) == [
+        (datetime(2022, 11, 1), datetime(2022, 12, 1)),
+        (datetime(2022, 12, 1), datetime(2023, 1, 1)),
+        (datetime(2023, 1, 1), datetime(2023, 2, 1)),
+        (datetime(2023, 2, 1), datetime(2023, 3, 1)),
+    ]
+    days = list(day_sections(begin, end))
+    assert len(days) == 64
+    assert days[0] == (datetime(2022, 11, 30), datetime(2022, 12, 1))
+    assert days[-1] == (datetime(2023, 2, 1), datetime(2023, 2, 2))
+    assert all(type(x) is datetime for x, _ in days)
+
+    with pytest.raises(ValueError):
+        list(day_sections(end, begin))
+
+    # 1 行だけのときは begin == end でもその区間を返す
+    assert list(day_sections(begin, begin)) == [(datetime(2022, 11, 30), datetime(2022, 12, 1))]
+
+def test_split_sections():
+    idx = pd.date_range('2022-12-30 22:00', periods=100, freq='1h')
+    values = idx.values
+
+    # カレンダーのイテレータは配列で、それ以外は列挙して区切りを求める
+    custom = lambda b, e: day_sections(b, e)
+    for iterator in [day_sections, custom]:
+        begins, ends = section_bounds(iterator, idx[0], idx[-1])
+        assert list(zip(begins.astype('datetime64[us]').tolist(), ends.astype('datetime64[us]').tolist())) \
+            == list(day_sections(idx[0], idx[-1]))
+
+        lo, hi = split_sections(values, begins, ends)
+        for b, e, i, j in zip(begins, ends, lo, hi):
+            expected = np.flatnonzero((b <= values) & (values < e))
+            assert list(range(i, j)) == list(expected)
+        assert hi[-1] == len(values)
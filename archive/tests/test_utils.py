@@ -1,5 +1,6 @@
 import pytest
 
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -7,7 +8,9 @@ from pathlib import Path
 from fxtrade.pseudo import pseudo
 from fxtrade.period import Period
 from fxtrade.utils import standardize, focus, \
-    default_timestamp_filter, default_save_fstring, default_save_iterator
+    default_timestamp_filter, default_save_fstring, default_save_iterator, \
+    is_aligned, snap, find_gaps, regularize, default_save_function
+from fxtrade.timeseries import day_sections
 
 def test_standardize():
     s = datetime(2022, 2, 1)
@@ -84,6 +87,34 @@ def test_focus():
     assert df_focus.index[0] == datetime(2022, 2, 2)
     assert df_focus.index[-1] == datetime(2022, 2, 3)
 
+def test_focus_slice():
+    idx = pd.date_range('2022-02-01', periods=10, freq='1h')
+    df = pd.DataFrame({'close': np.arange(10, dtype=float), 't': idx}, index=idx)
+    t2, t5 = idx[2], idx[5]
+
+    # include_end は単一の datetime にも効く
+    assert len(focus(df, t5)) == 6
+    assert len(focus(df, t5, include_end=False)) == 5
+    assert len(focus(df, (t2, t5), include_end=False)) == 3
+    assert len(focus(df, (t2, ))) == 8
+    assert len(focus(df, [t2, t5])) == 4
+    assert len(focus(df, np.datetime64(t5))) == 6
+
+    # 既定ではコピー、copy=False ではビューを返す
+    assert not np.shares_memory(focus(df, (t2, t5))['close'].to_numpy(), df['close'].to_numpy())
+    assert np.shares_memory(focus(df, (t2, t5), copy=False)['close'].to_numpy(), df['close'].to_numpy())
+    assert focus(df, None, copy=False) is df
+
+    # ソートされていなければマスクで元の順のまま抽出する
+    shuffled = df.iloc[[3, 0, 7, 5, 2, 9]]
+    assert list(focus(shuffled, (t2, t5))['close']) == [3.0, 5.0, 2.0]
+
+    # 列でも同じ
+    assert list(focus(df.reset_index(drop=True), (t2, t5), column='t')['close']) == [2.0, 3.0, 4.0, 5.0]
+
+    with pytest.raises(TypeError):
+        focus(df, 'hoge')
+
 def test_default_timestamp_filter():
     s = datetime(2022, 2, 1)
     t = datetime(2022, 2, 15)
@@ -116,6 +147,69 @@ def test_default_timestamp_filter():
     # 14 日分 * 24 時間 * 1 分おき
     assert len(df_f) == 14 * 24 * 60
 
+def test_timestamp_filter_policy():
+    s = datetime(2022, 2, 1)
+    t = datetime(2022, 2, 2)
+    dt = timedelta(minutes=5)
+
+    df = standardize(pseudo(s, t, dt))
+    df.index = df.index + pd.Timedelta(seconds=30) * (np.arange(len(df)) % 2)
+
+    assert is_aligned(df.index, Period('5m')).sum() == len(df) // 2
+    assert is_aligned(snap(df.index, Period('5m')), Period('5m')).all()
+
+    f = default_timestamp_filter(Period('5m'))
+    assert f(datetime(2022, 2, 1, 0, 5))
+    assert not f(datetime(2022, 2, 1, 0, 5, 30))
+    assert len(f.apply(df)) == len(df) // 2
+
+    f = default_timestamp_filter(Period('5m'), policy='snap')
+    df_snap = f.apply(df)
+    assert len(df_snap) == len(df)
+    assert df_snap.index[1] == datetime(2022, 2, 1, 0, 5)
+
+    f = default_timestamp_filter(Period('5m'), policy='reject')
+    with pytest.raises(ValueError):
+        f.apply(df)
+    assert len(f.apply(df_snap)) == len(df)
+
+def test_find_gaps():
+    s = datetime(2022, 2, 1)
+    t = datetime(2022, 2, 2)
+    dt = timedelta(minutes=1)
+
+    df = standardize(pseudo(s, t, dt))
+    df = df.drop(df.index[10:15]).drop(df.index[100:101])
+
+    gaps = find_gaps(df.index, Period('1m'))
+    assert gaps == [
+        (pd.Timestamp(2022, 2, 1, 0, 10), pd.Timestamp(2022, 2, 1, 0, 14)),
+        (pd.Timestamp(2022, 2, 1, 1, 40), pd.Timestamp(2022, 2, 1, 1, 40)),
+    ]
+
+    gaps = find_gaps(df.index, Period('1m'), end=datetime(2022, 2, 2, 0, 2))
+    assert gaps[-1] == (pd.Timestamp(2022, 2, 2), pd.Timestamp(2022, 2, 2, 0, 2))
+
+    assert find_gaps(df.index, Period('15m')) == []
+
+def test_regularize():
+    s = datetime(2022, 2, 1)
+    t = datetime(2022, 2, 2)
+    dt = timedelta(minutes=1)
+
+    df = standardize(pseudo(s, t, dt))
+    df_drop = df.drop(df.index[10:15])
+
+    df_reg = regularize(df_drop, Period('1m'))
+    assert len(df_reg) == len(df)
+    assert (df_reg.index == df.index).all()
+    assert (df_reg['timestamp'].values == df['timestamp'].values).all()
+    assert (df_reg.iloc[10:15][['open', 'high', 'low', 'close']] == df.iloc[9]['close']).all().all()
+    assert (df_reg.iloc[10:15]['volume'] == 0).all()
+
+    df_reg = regularize(df_drop, Period('1m'), policy='nan')
+    assert df_reg.iloc[10:15]['close'].isna().all()
+
 def test_default_save_fstring():
     fstring = default_save_fstring(Period('1d'))
     assert fstring == '%Y.csv'
@@ -148,5 +242,21 @@ def test_default_glob_function():
 def test_default_restore_function():
     pass
 
-def test_default_save_function():
-    pass
\ No newline at end of file
+def test_default_save_function(tmp_path):
+    idx = pd.date_range('2022-03-30 23:00', '2022-04-02 01:00', freq='15min', name='timestamp')
+    df = pd.DataFrame({'close': np.arange(len(idx), dtype=float)}, index=idx)
+
+    default_save_function(df, tmp_path, day_sections, '%Y-%m-%d.csv')
+
+    paths = sorted(tmp_path.glob('*.csv'))
+    assert [ p.name for p in paths ] == ['2022-03-30.csv', '2022-03-31.csv', '2022-04-01.csv', '2022-04-02.csv']
+    for path in paths:
+        day = pd.Timestamp(path.stem)
+        expected = focus(df, (day, day + pd.Timedelta(days=1)), include_end=False)
+        pd.testing.assert_frame_equal(pd.read_csv(path, index_col=0, parse_dates=True), expected, check_freq=False)
+
+    # 列で保存するときは列の順に分割する
+    df_col = df.reset_index().iloc[::-1].reset_index(drop=True)
+    default_save_function(df_col, tmp_path / 'column', day_sections, '%Y-%m-%d.csv', column='timestamp')
+    part = pd.read_csv(tmp_path / 'column' / '2022-03-30.csv', index_col=0)
+    assert sorted(part['timestamp']) == [ str(t) for t in idx[:4] ]
\ No newline at end of file
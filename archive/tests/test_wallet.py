@@ -1,10 +1,14 @@
 import pytest
+import numpy as np
 import pandas as pd
 
+from fractions import Fraction
 from pathlib import Path
 
 from fxtrade.stock import Stock
-from fxtrade.wallet import Wallet
+from fxtrade.stocks import JPY, BTC
+from fxtrade.trade import Trade
+from fxtrade.wallet import ArrayWallet, SnapshotStore, Wallet
 
 def test_join():
     w = Wallet()
@@ -111,4 +115,72 @@ def test_io():
 
     assert len(df) == 2
 
-    path.unlink(missing_ok=True)
\ No newline at end of file
+    path.unlink(missing_ok=True)
+
+def test_to_csv_append(tmp_path):
+    path = tmp_path / 'wallet.csv'
+    w = Wallet({'JPY': 1000, 'BTC': '0.5'})
+
+    ts = pd.date_range('2022-04-01', periods=5, freq='1min')
+    for i, t in enumerate(ts):
+        w += Stock('JPY', 10)
+        w.to_csv(path, t=t)
+
+    df = Wallet.read_csv(path)
+    assert len(df) == 5
+    assert df['JPY'].iloc[-1] == 1050
+    assert df['BTC'].iloc[-1] == Fraction(1, 2)
+
+    # 過去の時刻は全体を読み直して並べ替える
+    w.to_csv(path, t=ts[0] - pd.Timedelta(minutes=1))
+    df = Wallet.read_csv(path)
+    assert len(df) == 6
+    assert df.index.is_monotonic_increasing
+
+    # 日付だけの行（0 時ちょうど）が混ざっても日時として読める
+    w.to_csv(path, t=pd.Timestamp(2022, 4, 2))
+    df = Wallet.read_csv(path)
+    assert len(df) == 7
+    assert isinstance(df.index, pd.DatetimeIndex)
+
+def test_ArrayWallet(tmp_path):
+    w = ArrayWallet(['JPY', 'BTC'])
+
+    w.add('JPY', 100000)
+    w.add(['BTC', 'BTC', 'ETH'], [0.25, '0.5', 1])
+    assert w['JPY'] == 100000
+    assert w['BTC'] == Fraction(3, 4)
+    assert w.codes == ['JPY', 'BTC', 'ETH']
+
+    trades = [
+        Trade(x=JPY('20000'), y=BTC('0.005'), t=pd.Timestamp(2022, 4, 1)),
+        Trade(x=JPY('25000'), y=BTC('0.006'), t=pd.Timestamp(2022, 4, 2)),
+    ]
+    w.apply_trades(trades)
+    assert w['JPY'] == 55000
+    assert w['BTC'] == Fraction('0.761')
+
+    w.apply(np.array(['BTC']), [0.001], np.array(['JPY']), [4000])
+    assert w['JPY'] == 59000
+    assert w.to_wallet()['BTC'] == Stock('BTC', '0.76')
+    assert ArrayWallet.from_wallet(w.to_wallet()).units.tolist() == w.units.tolist()
+
+    path = tmp_path / 'snapshots.csv'
+    ts = pd.date_range('2022-04-01', periods=3000, freq='1s')
+    for t in ts[:2000]:
+        w.add('JPY', 1).record(t)
+    w.store.to_csv(path)
+    for t in ts[2000:]:
+        w.add('JPY', 1).record(t)
+    w.store.to_csv(path)
+
+    df = Wallet.read_csv(path)
+    assert len(df) == 3000
+    assert df['JPY'].iloc[-1] == 62000
+    pd.testing.assert_frame_equal(df, w.store.to_dataframe(), check_freq=False, check_dtype=False)
+
+    # 後から増えた通貨は過去の行を 0 で埋める
+    store = SnapshotStore(['JPY'])
+    store.append(ts[0], [1])
+    store.append(ts[1], [2, 3], codes=['JPY', 'USD'])
+    assert store.to_dataframe()['USD'].tolist() == [0, Fraction(3, 10 ** 8)]
@@ -0,0 +1,477 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+from bisect import insort
+from datetime import datetime, timedelta, timezone
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from pydantic import BaseModel
+
+from .interface.bitflyer import ChildOrder, TradingCommission
+from .utils import load_json_gzip
+
+# イベントの種類。同じ時刻では値の小さいものから処理されるので、
+# 同時刻に届いた注文は約定履歴と板を反映した後に処理される。
+EXECUTION = 0
+BOARD = 1
+ORDER = 2
+CANCEL = 3
+EXPIRE = 4
+
+BUY = 1
+SELL = -1
+
+# 数量の比較に使う許容誤差
+EPS = 1e-12
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_ns(t: datetime) -> int:
+    """naive な datetime は UTC とみなして UNIX 時間（ナノ秒）に変換する。"""
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    d = t - EPOCH
+    return (d.days * 86400 + d.seconds) * 1_000_000_000 + d.microseconds * 1000
+
+
+def from_ns(t: int) -> datetime:
+    return EPOCH + timedelta(microseconds=t // 1000)
+
+
+def _side(side: str) -> int:
+    # 板寄せの約定は side が空文字なので 0 にする
+    return BUY if side == "BUY" else SELL if side == "SELL" else 0
+
+
+def execution_events(exec_list: Iterable[dict | Any]) -> Iterator[tuple]:
+    """
+    /v1/executions の形式の約定履歴を id 順に (timestamp, EXECUTION, (side, price, size)) へ変換する。
+    side は taker の方向で、BUY なら 1, SELL なら -1, 板寄せなら 0。
+    """
+    xs = [x if isinstance(x, dict) else x.model_dump() for x in exec_list]
+    xs.sort(key=lambda x: x["id"])
+
+    for x in xs:
+        exec_date = x["exec_date"]
+        if isinstance(exec_date, str):
+            exec_date = datetime.fromisoformat(exec_date)
+        yield (
+            to_ns(exec_date),
+            EXECUTION,
+            (_side(x["side"]), float(x["price"]), float(x["size"])),
+        )
+
+
+def load_executions(paths: Iterable[Path]) -> Iterator[tuple]:
+    """save_as_json_gzip で保存した約定履歴を読み込んでイベントに変換する。"""
+    exec_list = []
+    for path in paths:
+        exec_list.extend(load_json_gzip(Path(path)))
+    return execution_events(exec_list)
+
+
+def _levels(xs: Iterable[dict | Any], reverse: bool) -> list[list[float]]:
+    ret = [
+        [float(x["price"]), float(x["size"])]
+        if isinstance(x, dict)
+        else [float(x.price), float(x.size)]
+        for x in xs
+    ]
+    ret.sort(key=lambda level: level[0], reverse=reverse)
+    return ret
+
+
+def board_events(snapshots: Iterable[tuple[datetime, dict | Any]]) -> Iterator[tuple]:
+    """
+    (時刻, 板) の組を時刻順に (timestamp, BOARD, (bids, asks)) へ変換する。
+    板は /v1/board の形式の dict か Board で、bids は価格の高い順、asks は安い順に並べ直す。
+    """
+    for t, board in snapshots:
+        if isinstance(board, dict):
+            bids, asks = board["bids"], board["asks"]
+        else:
+            bids, asks = board.bids, board.asks
+        yield (to_ns(t), BOARD, (_levels(bids, True), _levels(asks, False)))
+
+
+class EventQueue:
+    """
+    タイムスタンプ順にイベントを取り出すヒープ。
+    時刻順に並んだストリームは先頭のイベントだけをヒープに入れ、取り出したら次を補充するので、
+    ヒープの大きさはストリームの数と処理待ちの注文の数程度に保たれる。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, t: int, kind: int, data: Any):
+        heapq.heappush(self._heap, (t, kind, next(self._seq), data, None))
+
+    def add_stream(self, events: Iterable[tuple[int, int, Any]]):
+        it = iter(events)
+        for t, kind, data in it:
+            heapq.heappush(self._heap, (t, kind, next(self._seq), data, it))
+            break
+
+    def peek(self) -> int:
+        return self._heap[0][0]
+
+    def pop(self) -> tuple[int, int, Any]:
+        heap = self._heap
+        t, kind, _, data, it = heap[0]
+        if it is not None:
+            for nt, nkind, ndata in it:
+                heapq.heapreplace(heap, (nt, nkind, next(self._seq), ndata, it))
+                break
+            else:
+                heapq.heappop(heap)
+        else:
+            heapq.heappop(heap)
+        return t, kind, data
+
+
+class SimulatedOrder:
+    __slots__ = (
+        "child_order_acceptance_id",
+        "child_order_type",
+        "side",
+        "price",
+        "size",
+        "time_in_force",
+        "minute_to_expire",
+        "executed_size",
+        "queue_ahead",
+        "state",
+        "seq",
+    )
+
+    def __init__(self, acceptance_id: str, order: ChildOrder, seq: int):
+        self.child_order_acceptance_id = acceptance_id
+        self.child_order_type = order.child_order_type
+        self.side = BUY if order.side == "BUY" else SELL
+        self.price = None if order.price is None else float(order.price)
+        self.size = float(order.size)
+        self.time_in_force = order.time_in_force
+        self.minute_to_expire = order.minute_to_expire
+        self.executed_size = 0.0
+        # 同じ価格に先に並んでいる数量
+        self.queue_ahead = 0.0
+        # 'PENDING'（到着前）, 'ACTIVE', 'COMPLETED', 'CANCELED', 'EXPIRED'
+        self.state = "PENDING"
+        self.seq = seq
+
+    def __repr__(self):
+        return (
+            f"SimulatedOrder(child_order_acceptance_id='{self.child_order_acceptance_id}', "
+            f"side={'BUY' if self.side == BUY else 'SELL'}, price={self.price}, "
+            f"size={self.size}, executed_size={self.executed_size}, state='{self.state}')"
+        )
+
+    @property
+    def remaining(self) -> float:
+        return self.size - self.executed_size
+
+    def priority(self):
+        # 価格優先・時間優先。成行は価格を無限大とみなす
+        if self.side == BUY:
+            return (-self.price if self.price is not None else -float("inf"), self.seq)
+        return (self.price if self.price is not None else -float("inf"), self.seq)
+
+
+class Fill(BaseModel):
+    child_order_acceptance_id: str
+    side: str
+    price: float
+    size: float
+    commission: float  # 基軸通貨建て（BTC_JPY なら BTC）
+    exec_date: datetime
+    maker: bool
+
+
+class Simulator:
+    """
+    保存した約定履歴と板のスナップショットを時刻順に再生して、
+    ChildOrder の約定をシミュレーションするマッチングエンジン。
+
+    - taker として約定する分は直近の板を価格の良い順に消費する。
+    - 板に残った注文は、同じ価格に先に並んでいた数量（queue_ahead）が
+      約定履歴で消化されてから約定する。価格を突き抜けた約定があれば即座に約定する。
+    - 手数料は約定数量に commission_rate を掛けた基軸通貨建てで、
+      bitFlyer の現物と同じく受け取る（売りでは差し出す）数量から差し引く。
+    """
+
+    def __init__(
+        self,
+        commission: TradingCommission | Fraction | float = 0,
+        latency: timedelta = timedelta(0),
+    ):
+        if isinstance(commission, TradingCommission):
+            commission = commission.commission_rate
+        self.commission_rate = float(commission)
+        self.latency = latency // timedelta(microseconds=1) * 1000
+
+        self.now = 0
+        self.last_price = None
+        self.position = 0.0
+        self.cash = 0.0
+        self.fills: list[Fill] = []
+        self.orders: dict[str, SimulatedOrder] = {}
+
+        self._queue = EventQueue()
+        self._ids = itertools.count(1)
+        self._bids: list[list[float]] = []
+        self._asks: list[list[float]] = []
+        self._resting = {BUY: [], SELL: []}
+
+    def __repr__(self):
+        return (
+            f"Simulator(commission_rate={self.commission_rate}, "
+            f"position={self.position}, cash={self.cash}, n_fills={len(self.fills)})"
+        )
+
+    @property
+    def time(self) -> datetime:
+        return from_ns(self.now)
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        return self._bids[0][0] if self._bids else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        return self._asks[0][0] if self._asks else None
+
+    def add_executions(self, events: Iterable[tuple]):
+        """execution_events か load_executions の戻り値を追加する。"""
+        self._queue.add_stream(events)
+        return self
+
+    def add_boards(self, events: Iterable[tuple]):
+        """board_events の戻り値を追加する。"""
+        self._queue.add_stream(events)
+        return self
+
+    def send(self, order: ChildOrder, t: Optional[datetime] = None) -> str:
+        """
+        注文を受け付けて child_order_acceptance_id を返す。
+        注文は t（省略時は現在のシミュレーション時刻）から latency 後に取引所に到着する。
+        """
+        if order.child_order_type not in {"LIMIT", "MARKET"}:
+            raise ValueError(
+                f"child_order_type must be 'LIMIT' or 'MARKET' but actual '{order.child_order_type}'."
+            )
+        if order.side not in {"BUY", "SELL"}:
+            raise ValueError(f"side must be 'BUY' or 'SELL' but actual '{order.side}'.")
+        if order.time_in_force not in {"GTC", "IOC", "FOK"}:
+            raise ValueError(
+                f"time_in_force must be 'GTC', 'IOC' or 'FOK' but actual '{order.time_in_force}'."
+            )
+        if (order.child_order_type == "LIMIT") and (order.price is None):
+            raise ValueError("price must be specified when child_order_type == 'LIMIT'")
+
+        seq = next(self._ids)
+        acceptance_id = f"SIM{seq:010d}"
+        self.orders[acceptance_id] = SimulatedOrder(acceptance_id, order, seq)
+
+        t = self.now if t is None else to_ns(t)
+        self._queue.push(t + self.latency, ORDER, acceptance_id)
+        return acceptance_id
+
+    def cancel(self, acceptance_id: str, t: Optional[datetime] = None):
+        """
+        注文の取消を受け付ける。取消は t（省略時は現在のシミュレーション時刻）から latency 後に取引所に到着する。
+        send で受け付けていない acceptance_id は run の途中で落ちないようにここで KeyError にする。
+        """
+        if acceptance_id not in self.orders:
+            raise KeyError(acceptance_id)
+        t = self.now if t is None else to_ns(t)
+        self._queue.push(t + self.latency, CANCEL, acceptance_id)
+
+    def run(
+        self,
+        until: Optional[datetime] = None,
+        on_event: Optional[Callable[[Simulator, int, Any], None]] = None,
+    ) -> int:
+        """
+        until（省略時は最後）までイベントを処理して、処理したイベントの数を返す。
+        on_event(simulator, kind, data) は約定履歴と板のイベントのたびに呼ばれ、
+        その中から send や cancel を呼ぶことができる。
+        """
+        queue = self._queue
+        until = None if until is None else to_ns(until)
+        handlers = {
+            EXECUTION: self._on_execution,
+            BOARD: self._on_board,
+            ORDER: self._on_order,
+            CANCEL: self._on_cancel,
+            EXPIRE: self._on_expire,
+        }
+
+        n = 0
+        while len(queue) > 0:
+            if (until is not None) and (queue.peek() > until):
+                break
+            t, kind, data = queue.pop()
+            self.now = t
+            handlers[kind](t, data)
+            if (on_event is not None) and (kind <= BOARD):
+                on_event(self, kind, data)
+            n += 1
+
+        if until is not None:
+            self.now = max(self.now, until)
+
+        return n
+
+    def _fill(
+        self, t: int, order: SimulatedOrder, price: float, size: float, maker: bool
+    ):
+        order.executed_size += size
+        if order.remaining <= EPS:
+            order.state = "COMPLETED"
+
+        commission = size * self.commission_rate
+        if order.side == BUY:
+            self.position += size - commission
+            self.cash -= price * size
+        else:
+            self.position -= size + commission
+            self.cash += price * size
+
+        self.fills.append(
+            Fill(
+                child_order_acceptance_id=order.child_order_acceptance_id,
+                side="BUY" if order.side == BUY else "SELL",
+                price=price,
+                size=size,
+                commission=commission,
+                exec_date=from_ns(t),
+                maker=maker,
+            )
+        )
+
+    def _on_execution(self, t: int, data):
+        side, price, size = data
+        self.last_price = price
+        # SELL の taker は買い板を、BUY の taker は売り板を消化する
+        if (side <= 0) and self._resting[BUY]:
+            self._match_resting(t, BUY, price, size)
+        if (side >= 0) and self._resting[SELL]:
+            self._match_resting(t, SELL, price, size)
+
+    def _match_resting(self, t: int, side: int, price: float, size: float):
+        orders = self._resting[side]
+        for order in orders:
+            if size <= EPS:
+                break
+            if order.price is None:
+                crossed = True
+            else:
+                diff = (order.price - price) * side
+                if diff < 0:
+                    # 価格順に並んでいるので残りも約定しない
+                    break
+                crossed = diff > 0
+
+            if not crossed:
+                taken = min(size, order.queue_ahead)
+                order.queue_ahead -= taken
+                size -= taken
+                if size <= EPS:
+                    break
+
+            q = min(size, order.remaining)
+            size -= q
+            self._fill(
+                t, order, price if order.price is None else order.price, q, maker=True
+            )
+
+        self._resting[side] = [order for order in orders if order.state == "ACTIVE"]
+
+    def _on_board(self, t: int, data):
+        bids, asks = data
+        self._bids = [list(level) for level in bids]
+        self._asks = [list(level) for level in asks]
+
+        # 前に並んでいた注文が取り消されていれば順番が繰り上がる
+        for side, levels in ((BUY, self._bids), (SELL, self._asks)):
+            if not self._resting[side]:
+                continue
+            sizes = dict(levels)
+            for order in self._resting[side]:
+                if order.price is not None:
+                    order.queue_ahead = min(
+                        order.queue_ahead, sizes.get(order.price, 0.0)
+                    )
+
+    def _on_order(self, t: int, acceptance_id: str):
+        order = self.orders[acceptance_id]
+        if order.state != "PENDING":
+            # 到着前に取り消された
+            return
+        order.state = "ACTIVE"
+
+        book = self._asks if order.side == BUY else self._bids
+        limit = order.price
+
+        def takeable(level):
+            return (limit is None) or ((limit - level[0]) * order.side >= 0)
+
+        if order.time_in_force == "FOK":
+            available = 0.0
+            for level in book:
+                if not takeable(level):
+                    break
+                available += level[1]
+            if available < order.remaining - EPS:
+                order.state = "CANCELED"
+                return
+
+        while book and (order.remaining > EPS) and takeable(book[0]):
+            level = book[0]
+            q = min(level[1], order.remaining)
+            level[1] -= q
+            if level[1] <= EPS:
+                book.pop(0)
+            self._fill(t, order, level[0], q, maker=False)
+
+        if order.state != "ACTIVE":
+            return
+        if order.time_in_force != "GTC":
+            order.state = "CANCELED"
+            return
+
+        # 残りは板に並べる
+        if limit is not None:
+            own = self._bids if order.side == BUY else self._asks
+            order.queue_ahead = dict(own).get(limit, 0.0)
+        insort(self._resting[order.side], order, key=SimulatedOrder.priority)
+
+        if order.minute_to_expire is not None:
+            self._queue.push(
+                t + order.minute_to_expire * 60 * 1_000_000_000, EXPIRE, acceptance_id
+            )
+
+    def _remove(self, acceptance_id: str, state: str):
+        order = self.orders.get(acceptance_id)
+        if order is None:
+            raise KeyError(acceptance_id)
+        if order.state not in {"PENDING", "ACTIVE"}:
+            return
+        if order.state == "ACTIVE":
+            self._resting[order.side].remove(order)
+        order.state = state
+
+    def _on_cancel(self, t: int, acceptance_id: str):
+        self._remove(acceptance_id, "CANCELED")
+
+    def _on_expire(self, t: int, acceptance_id: str):
+        self._remove(acceptance_id, "EXPIRED")
@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fxtrade.interface.bitflyer import ChildOrder
+from fxtrade.simulator import (
+    BOARD,
+    EXECUTION,
+    EventQueue,
+    Simulator,
+    board_events,
+    execution_events,
+    from_ns,
+    to_ns,
+)
+
+T0 = datetime(2025, 1, 26, 7, 0, 0)
+
+
+def execution(id, seconds, side, price, size):
+    return {
+        "id": id,
+        "side": side,
+        "price": price,
+        "size": size,
+        "exec_date": (T0 + timedelta(seconds=seconds)).isoformat(),
+        "buy_child_order_acceptance_id": "",
+        "sell_child_order_acceptance_id": "",
+    }
+
+
+def board(bids, asks):
+    return {
+        "mid_price": (bids[0][0] + asks[0][0]) / 2,
+        "bids": [{"price": p, "size": s} for p, s in bids],
+        "asks": [{"price": p, "size": s} for p, s in asks],
+    }
+
+
+def make_simulator(executions, boards, **kwargs):
+    sim = Simulator(**kwargs)
+    sim.add_executions(execution_events(executions))
+    sim.add_boards(board_events([(T0 + timedelta(seconds=s), b) for s, b in boards]))
+    return sim
+
+
+def test_to_ns():
+    t = datetime(2025, 1, 26, 7, 33, 31, 740000)
+    assert from_ns(to_ns(t)) == t
+
+
+def test_EventQueue():
+    queue = EventQueue()
+    queue.add_stream([(1, EXECUTION, "a"), (3, EXECUTION, "c")])
+    queue.add_stream([(2, BOARD, "b"), (3, BOARD, "d")])
+    queue.push(0, BOARD, "z")
+
+    assert [queue.pop()[2] for _ in range(5)] == ["z", "a", "b", "c", "d"]
+    assert len(queue) == 0
+
+
+def test_Simulator_market():
+    sim = make_simulator(
+        [], [(0, board([(99, 1.0)], [(100, 0.5), (101, 1.0)]))], commission=0.001
+    )
+    sim.run(until=T0)
+
+    acceptance_id = sim.send(ChildOrder.market_buy("BTC_JPY", size=1.0))
+    sim.run()
+
+    assert [(f.price, f.size, f.maker) for f in sim.fills] == [
+        (100, 0.5, False),
+        (101, 0.5, False),
+    ]
+    assert sim.orders[acceptance_id].state == "COMPLETED"
+    assert sim.cash == -(100 * 0.5 + 101 * 0.5)
+    assert abs(sim.position - (1.0 - 0.001)) < 1e-12
+
+    # 消費した板は次のスナップショットまで残らない
+    assert sim.best_ask == 101
+
+
+def test_Simulator_time_in_force():
+    snapshot = board([(99, 1.0)], [(100, 0.5), (101, 1.0)])
+
+    sim = make_simulator([], [(0, snapshot)])
+    fok = sim.send(ChildOrder.limit_buy("BTC_JPY", 100, 1.0, time_in_force="FOK"), T0)
+    ioc = sim.send(ChildOrder.limit_buy("BTC_JPY", 100, 1.0, time_in_force="IOC"), T0)
+    sim.run()
+
+    assert sim.orders[fok].state == "CANCELED"
+    assert sim.orders[fok].executed_size == 0
+    assert sim.orders[ioc].state == "CANCELED"
+    assert sim.orders[ioc].executed_size == 0.5
+
+    sim = make_simulator([], [(0, snapshot)])
+    gtc = sim.send(ChildOrder.limit_buy("BTC_JPY", 100, 1.0), T0)
+    sim.run(until=T0 + timedelta(minutes=1))
+
+    assert sim.orders[gtc].state == "ACTIVE"
+    assert sim.orders[gtc].executed_size == 0.5
+
+
+def test_Simulator_queue_position():
+    executions = [
+        execution(1, 1, "SELL", 99, 0.3),
+        execution(2, 2, "SELL", 99, 0.5),
+        execution(3, 3, "SELL", 98, 1.0),
+    ]
+    sim = make_simulator(executions, [(0, board([(99, 0.6)], [(100, 1.0)]))])
+    sim.run(until=T0)
+
+    acceptance_id = sim.send(ChildOrder.limit_buy("BTC_JPY", 99, 0.5))
+    sim.run(until=T0 + timedelta(seconds=1))
+
+    order = sim.orders[acceptance_id]
+    assert order.queue_ahead == 0.6 - 0.3
+    assert order.executed_size == 0
+
+    # 前の 0.3 を消化した残りの 0.2 だけ約定する
+    sim.run(until=T0 + timedelta(seconds=2))
+    assert abs(order.executed_size - 0.2) < 1e-12
+    assert order.state == "ACTIVE"
+
+    # 価格を突き抜けた約定で残りも約定する
+    sim.run()
+    assert order.state == "COMPLETED"
+    assert [f.price for f in sim.fills] == [99, 99]
+    assert all(f.maker for f in sim.fills)
+
+
+def test_Simulator_cancel_and_expire():
+    sim = make_simulator(
+        [execution(1, 120, "SELL", 90, 1.0)],
+        [(0, board([(99, 1.0)], [(100, 1.0)]))],
+    )
+
+    canceled = sim.send(ChildOrder.limit_buy("BTC_JPY", 95, 1.0), T0)
+    expired = sim.send(ChildOrder.limit_buy("BTC_JPY", 95, 1.0, minute_to_expire=1), T0)
+    sim.run(until=T0 + timedelta(seconds=10))
+    sim.cancel(canceled)
+    sim.run()
+
+    assert sim.orders[canceled].state == "CANCELED"
+    assert sim.orders[expired].state == "EXPIRED"
+    assert len(sim.fills) == 0
+
+
+def test_Simulator_cancel_unknown():
+    sim = make_simulator(
+        [execution(1, 120, "SELL", 90, 1.0)],
+        [(0, board([(99, 1.0)], [(100, 1.0)]))],
+    )
+
+    accepted = sim.send(ChildOrder.limit_buy("BTC_JPY", 95, 1.0), T0)
+    with pytest.raises(KeyError):
+        sim.cancel("SIM9999999999")
+    sim.run()
+
+    # 不明な取消はキューに積まれないので run は最後まで進む
+    assert sim.orders[accepted].state == "COMPLETED"
+
+
+def test_Simulator_on_event():
+    executions = [execution(i, i, "BUY", 100 + i, 0.1) for i in range(1, 6)]
+    sim = make_simulator(executions, [(0, board([(99, 1.0)], [(100, 1.0)]))])
+
+    sent = []
+
+    def on_event(sim, kind, data):
+        # 最初の約定を見たら売り指値を出す
+        if (kind == EXECUTION) and not sent:
+            sent.append(sim.send(ChildOrder.limit_sell("BTC_JPY", 103, 0.15)))
+
+    assert sim.run(until=T0 + timedelta(seconds=5), on_event=on_event) == 5 + 1 + 1
+    assert sim.orders[sent[0]].state == "COMPLETED"
+    assert [f.price for f in sim.fills] == [103, 103]
+    assert abs(sim.fills[1].size - 0.05) < 1e-12